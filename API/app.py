@@ -1,80 +1,286 @@
-from flask import Flask, request, jsonify
-import boto3
+from flask import Flask, request, jsonify, stream_with_context, g
 import os
 import json
-from decimal import Decimal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from meff.columnar import decode_item
+from meff import metrics
+from meff.metrics import stage, capacity_kwargs, consumed_capacity
+from meff.storage import dynamodb_resource
+from meff import split_storage
+from meff.split_storage import DEFAULT_PRODUCT, table_name, index_key
+from options_index import SnapshotCache
+from response_cache import EncodedBody, ResponseCache
+import numpy as np
+from meff.svi import SVI_PARAMETERS, svi_iv
+from meff.history import AGGREGATES_TABLE_NAME, query_aggregates
+from meff.intraday import SNAPSHOT_TABLE_NAME, apply_snapshots, query_snapshots
+from snapshots import LatestSnapshots, state_to_item
+from formats import (MIMETYPES, TABULAR_FORMATS, MIN_COMPRESS_SIZE, negotiate_format, serialize_item,
+                     negotiate_encoding, decimal_to_float)
 
 app = Flask(__name__)
 #Configuration DynamoDB
 aws_access_key_id = os.environ.get("aws_access_key_id")
 aws_secret_access_key = os.environ.get("aws_secret_access_key")
 
-dynamodb = boto3.resource(
-    "dynamodb",
+dynamodb = dynamodb_resource(
     aws_access_key_id=aws_access_key_id,
     aws_secret_access_key=aws_secret_access_key,
     region_name="eu-central-1"
 )
-table = dynamodb.Table('MeffScrapping')
+# STORAGE_LAYOUT 'split' reads the layout with one item per (date, expiry, call/put) slice, see split_storage.py.
+table = dynamodb.Table(table_name())
+snapshot_table = dynamodb.Table(SNAPSHOT_TABLE_NAME)
+aggregates_table = dynamodb.Table(AGGREGATES_TABLE_NAME)
+latest_snapshots = LatestSnapshots()
+DATE_INDEX_KEY = 'INDEX#DATES'
+DATES_CACHE_TTL = float(os.environ.get("DATES_CACHE_TTL", 300))
+dates_cache = {'dates': set(), 'fetched_at': None, 'lock': threading.Lock()}
+SNAPSHOT_CACHE_MAX_BYTES = int(os.environ.get("SNAPSHOT_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+SNAPSHOT_CACHE_TODAY_TTL = float(os.environ.get("SNAPSHOT_CACHE_TODAY_TTL", 60))
+BATCH_GET_CHUNK_SIZE = int(os.environ.get("BATCH_GET_CHUNK_SIZE", 25))
+BATCH_GET_WORKERS = int(os.environ.get("BATCH_GET_WORKERS", 4))
+BATCH_GET_MAX_ATTEMPTS = int(os.environ.get("BATCH_GET_MAX_ATTEMPTS", 6))
+SMILE_POINTS = int(os.environ.get("SMILE_POINTS", 50))
+MAX_SMILE_POINTS = 1000
+snapshot_cache = SnapshotCache(lambda date: get_item(table, date), SNAPSHOT_CACHE_MAX_BYTES, SNAPSHOT_CACHE_TODAY_TTL)
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+RESPONSE_CACHE_TODAY_TTL = float(os.environ.get("RESPONSE_CACHE_TODAY_TTL", 60))
+# Days returned by /get_aggregates when no start date is given.
+AGGREGATES_DEFAULT_DAYS = int(os.environ.get("AGGREGATES_DEFAULT_DAYS", 180))
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_TODAY_TTL)
 
 #Functions
-def get_unique_dates(table):
+def scan_unique_dates(table):
     """
-    Fetches and returns the partition Key from a DynamoDB table, that uses "Date"
-    as a partition key.
+    Fetches the partition keys with a projection-only scan, used when the date index item
+    is missing.
 
     Args:
         table: A DynamoDB table.
 
     Returns:
-        set: A set containing the partition keys.
+        set: A set containing the partition keys of the default product.
     """
     unique_dates = set()
-    response = table.scan()
-    for item in response['Items']:
-        unique_dates.add(item['Date'])
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+    scan_kwargs = {'ProjectionExpression': '#d', 'ExpressionAttributeNames': {'#d': 'Date'}}
+    while True:
+        response = table.scan(**scan_kwargs)
         for item in response['Items']:
-            unique_dates.add(item['Date'])
+            # Index items and the '<product>#<date>' keys of other MEFF products contain a '#'.
+            if '#' not in item['Date']:
+                unique_dates.add(item['Date'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
     return unique_dates
 
 
-def get_item(table, date):
+def fetch_unique_dates(table):
+    """
+    Fetches the partition keys from the date index item maintained by the scraping Lambda,
+    falling back to a projection-only scan.
+
+    Args:
+        table: A DynamoDB table.
+
+    Returns:
+        set: A set containing the partition keys of the default product.
+    """
+    response = table.get_item(Key=index_key(DATE_INDEX_KEY))
+    item = response.get('Item')
+    if item and item.get('Dates'):
+        return set(item['Dates'])
+    return scan_unique_dates(table)
+
+
+def get_unique_dates(table):
+    """
+    Returns the partition keys of a DynamoDB table that uses "Date" as a partition key.
+
+    The list is kept in memory and refreshed after DATES_CACHE_TTL seconds; since stored dates
+    are never deleted, refreshes only add the new ones.
+
+    Args:
+        table: A DynamoDB table.
+
+    Returns:
+        set: A set containing the partition keys of the default product.
+    """
+    with dates_cache['lock']:
+        fetched_at = dates_cache['fetched_at']
+        if fetched_at is not None and time.monotonic() - fetched_at < DATES_CACHE_TTL:
+            return set(dates_cache['dates'])
+        dates_cache['dates'] |= fetch_unique_dates(table)
+        dates_cache['fetched_at'] = time.monotonic()
+        return set(dates_cache['dates'])
+
+
+def get_item(table, date, exp_date=None):
     """
     Retrieves an item from a DynamoDB table based on a given date.
 
     Args:
         table (boto3.resources.factory.dynamodb.Table): A DynamoDB table.
         date (str): The date for which to fetch the item.
+        exp_date (str, optional): Only return the options of this expiration date.
 
     Returns:
         dict: The item corresponding to the given date.
     """
-    response = table.get_item(
-        Key={
-            'Date': date
-        }
-    )
-    item = response.get('Item')
+    item = decode_item(split_storage.get_item(table, date, exp_date))
+    if item is not None and exp_date is not None:
+        item = dict(item, Options=[option for option in item['Options'] if option.get('EXP_DATE') == exp_date])
     return item
 
-def decimal_to_float(obj):
+
+def get_smiles(table, date):
+    """
+    Reads the SVI smiles fitted by the IV Lambda for a date, without reading its options.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): A DynamoDB table.
+        date (str): The date of the smiles.
+
+    Returns:
+        dict: The 'Futures' and 'Smiles' attributes of the item, or None if it does not exist.
+    """
+    with stage('dynamodb.get_smiles') as read:
+        response = table.get_item(Key=index_key(date), ProjectionExpression='Futures, Smiles', **capacity_kwargs())
+        read.set(capacity=consumed_capacity(response))
+    return response.get('Item')
+
+
+def batch_get_chunk(dynamodb, table_name, dates):
     """
-    Converts a Decimal object to a float.
+    Fetches the items of a list of dates with BatchGetItem, retrying unprocessed keys
+    with exponential backoff.
 
     Args:
-        obj (Decimal): The Decimal object to convert.
+        dynamodb (boto3.resources.factory.dynamodb.ServiceResource): The DynamoDB resource.
+        table_name (str): The name of the table.
+        dates (list): The dates to fetch, at most 100.
 
     Returns:
-        float: The float representation of the Decimal object.
+        tuple: The fetched items sorted by date, and the dates that could not be fetched.
+    """
+    if split_storage.STORAGE_LAYOUT == 'split':
+        # Slices can't be fetched by partition key alone, so each date is queried instead.
+        items = [decode_item(split_storage.get_item(dynamodb.Table(table_name), date)) for date in dates]
+        return [item for item in items if item is not None], []
+
+    items = []
+    request_items = {table_name: {'Keys': [{'Date': date} for date in dates]}}
+    for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        items.extend(decode_item(item) for item in response.get('Responses', {}).get(table_name, []))
+        request_items = response.get('UnprocessedKeys') or {}
+        if not request_items:
+            break
+        time.sleep(min(0.05 * 2 ** attempt, 2.0))
+    unprocessed = [key['Date'] for key in request_items.get(table_name, {}).get('Keys', [])]
+    return sorted(items, key=lambda item: item['Date']), unprocessed
+
+
+def iter_items(dynamodb, table_name, dates):
+    """
+    Yields the items of the given dates in date order, fetching chunks of
+    BATCH_GET_CHUNK_SIZE keys concurrently with at most BATCH_GET_WORKERS chunks in flight,
+    so only those chunks are held in memory at once.
+
+    Args:
+        dynamodb (boto3.resources.factory.dynamodb.ServiceResource): The DynamoDB resource.
+        table_name (str): The name of the table.
+        dates (list): The dates to fetch, sorted.
+
+    Yields:
+        tuple: The fetched items of a chunk, and the dates of the chunk that could not be fetched.
+    """
+    chunks = [dates[i:i + BATCH_GET_CHUNK_SIZE] for i in range(0, len(dates), BATCH_GET_CHUNK_SIZE)]
+    with ThreadPoolExecutor(max_workers=BATCH_GET_WORKERS) as executor:
+        pending = []
+        for chunk in chunks:
+            pending.append(executor.submit(batch_get_chunk, dynamodb, table_name, chunk))
+            if len(pending) >= BATCH_GET_WORKERS:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def load_item_body(date, exp_date, fmt):
+    """
+    Fetches and serializes an item for the response cache, compressed once with every
+    available encoding so that cache hits only pick the one the client accepts.
+
+    Args:
+        date (str): The date of the item.
+        exp_date (str): Only serialize the options of this expiration date, or None.
+        fmt (str): One of the keys of MIMETYPES.
+
+    Returns:
+        EncodedBody: The serialized item, with found set to False if it does not exist.
+    """
+    item = get_item(table, date, exp_date)
+    if item is None and fmt in TABULAR_FORMATS:
+        return EncodedBody(b'', found=False)
+    with stage('api.serialize_item', format=fmt) as serialize:
+        body = EncodedBody(serialize_item(item, fmt), found=item is not None).precompress()
+        serialize.set(bytes=len(body.body))
+    return body
 
-    Raises:
-        TypeError: If the object is not of type Decimal.
+
+def build_item_response(body, fmt, date):
+    """
+    Builds the response for a serialized item, compressing it when the client accepts it
+    and answering 304 when the client already holds the same representation.
+
+    Args:
+        body (bytes or EncodedBody): The serialized, uncompressed body, or a cached one.
+        fmt (str): The format the body was serialized in.
+        date (str): The date of the item, past dates are marked as immutable unless the
+            item was not found, since it may still be stored later.
+
+    Returns:
+        Response: A Flask Response object.
     """
-    if isinstance(obj, Decimal):
-        return float(obj)
-    raise TypeError("Type not serializable")
+    if not isinstance(body, EncodedBody):
+        body = EncodedBody(body)
+    encoding = negotiate_encoding(request.accept_encodings) if len(body.body) >= MIN_COMPRESS_SIZE else None
+    etag = body.etag + (f"-{encoding}" if encoding else "")
+    if body.found and date < datetime.today().strftime('%Y-%m-%d'):
+        cache_control = "public, max-age=31536000, immutable"
+    else:
+        cache_control = "no-cache"
+
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(response=body.encode(encoding), status=200, mimetype=MIMETYPES[fmt])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    return response
+
+if metrics.METRICS_ENABLED:
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        # Not set when an earlier before_request handler answered. Streamed responses are
+        # timed until their first chunk only.
+        start = g.get('request_start')
+        if start is not None:
+            metrics.record(f"api.{request.endpoint}", (time.perf_counter() - start) * 1000,
+                           status=response.status_code, bytes=response.content_length or 0)
+        return response
+
 
 #Routes
 @app.route("/", methods=["GET"])
@@ -99,8 +305,62 @@ def welcome():
 
     3. <strong>/get_item</strong>
         Method: GET
-        Parameters: date (format 'YYYY-MM-DD')
-        Description: Returns the item with the specified date in the DynamoDB table
+        Parameters: date (format 'YYYY-MM-DD'), exp_date (optional, format 'YYYY-MM-DD'),
+        format (optional: json, columns, csv, arrow, parquet)
+        Description: Returns the item with the specified date in the DynamoDB table,
+        optionally with only the options of one expiration date.
+        The format can also be chosen with the Accept header, responses are compressed
+        with gzip or br when accepted and support ETag / If-None-Match.
+        Serialized and compressed items are cached in memory: past dates until evicted,
+        today's for RESPONSE_CACHE_TODAY_TTL seconds.
+
+    4. <strong>/get_options</strong>
+        Method: GET
+        Parameters: date (format 'YYYY-MM-DD'), and optionally exp_date (format 'YYYY-MM-DD'),
+        call_put (CALL or PUT), strike_min, strike_max, moneyness_min, moneyness_max,
+        delta_min, delta_max, columns (comma separated list) and format (as in /get_item)
+        Description: Returns only the options of the item that match the filters.
+        Enriched options carry their IV and Black-76 Greeks: DELTA, GAMMA, VEGA (per IV point)
+        and THETA (per calendar day)
+
+    5. <strong>/get_items</strong>
+        Method: GET
+        Parameters: start and end (format 'YYYY-MM-DD', inclusive) or dates (comma separated list)
+        Description: Streams the items of every stored date in the range as newline-delimited
+        JSON, one {"item": ...} object per line
+
+    6. <strong>/get_snapshot</strong>
+        Method: GET
+        Parameters: date (format 'YYYY-MM-DD'), time (optional, format 'HH:MM:SS'), format (as in /get_item)
+        Description: Returns the intraday snapshot of a date at the given time, or the latest one
+
+    7. <strong>/get_snapshots</strong>
+        Method: GET
+        Parameters: date (format 'YYYY-MM-DD'), start and end (optional, format 'HH:MM:SS')
+        Description: Streams as newline-delimited JSON the full snapshot at start, as {"snapshot": ...},
+        followed by the changes of every later snapshot until end, as {"delta": ...}
+
+    8. <strong>/get_aggregates</strong>
+        Method: GET
+        Parameters: start and end (optional, format 'YYYY-MM-DD', by default the last
+        AGGREGATES_DEFAULT_DAYS days), product (optional)
+        Description: Returns the daily summaries of every expiration date: ATM implied volatility,
+        25-delta risk reversal and butterfly, and skew slope, read with a single query
+
+    9. <strong>/get_smile</strong>
+        Method: GET
+        Parameters: date (format 'YYYY-MM-DD'), exp_date (format 'YYYY-MM-DD'), call_put (CALL or PUT),
+        points (optional, number of strikes, by default SMILE_POINTS)
+        Description: Returns the SVI smile fitted to the implied volatilities of one expiration date:
+        its parameters, the fit error, and the IV evaluated on evenly spaced log-moneyness
+        between the lowest and highest quoted strikes
+
+    10. <strong>/metrics</strong>
+        Method: GET
+        Description: Returns the count, total, mean and max duration and the summed counters
+        (rows, bytes, consumed capacity) of every timed stage and route since the process
+        started, and the entries, bytes, hits and misses of the response cache.
+        Stages are only timed when METRICS_ENABLED is set to true.
 
     To use the endpoints, make an HTTP request using the specified method and route.
 
@@ -126,6 +386,17 @@ def ping():
     """
     return jsonify({"status": "ok"})
 
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Defines the /metrics route returning the totals of the timed stages of this process
+    and the state of the response cache.
+
+    Returns:
+        Response: A Flask Response object containing the JSON totals.
+    """
+    return jsonify(dict(metrics.snapshot(), response_cache=response_cache.stats()))
+
 @app.route('/get_partitions', methods=['GET'])
 def unique_dates():
     """
@@ -142,23 +413,227 @@ def unique_dates():
 def get_item_route():
     """
     Defines the /get_item route that fetches an item from the DynamoDB table based on a given date.
+    Serialized items are kept in the response cache, see RESPONSE_CACHE_MAX_BYTES.
 
     Returns:
-        Response: A Flask Response object containing a JSON with the fetched item.
+        Response: A Flask Response object containing the fetched item in the negotiated format.
         If the date parameter is not provided, returns a JSON with an error message.
     """
     date = request.args.get("date")
-    if date:
-        # Implementa la función para obtener el ítem según la fecha
-        item = get_item(table, date)
-        response = app.response_class(
-            response=json.dumps({"item": item}, indent=2, default=decimal_to_float),
-            status=200,
-            mimetype="application/json"
-        )
-        return response
+    if not date:
+        return jsonify({"error": "Date parameter is required"}), 400
+    fmt = negotiate_format(request.args.get("format"), request.accept_mimetypes)
+    if fmt is None:
+        return jsonify({"error": "Format not available"}), 406
+
+    exp_date = request.args.get("exp_date")
+    body = response_cache.get((date, exp_date, fmt), date, lambda: load_item_body(date, exp_date, fmt))
+    if not body.found and fmt in TABULAR_FORMATS:
+        return jsonify({"error": "Item not found"}), 404
+    return build_item_response(body, fmt, date)
+
+@app.route("/get_options", methods=["GET"])
+def get_options_route():
+    """
+    Defines the /get_options route that returns the options of a date matching the given
+    filters, served from the parsed and indexed snapshot cache.
+
+    Returns:
+        Response: A Flask Response object containing the matching options in the negotiated format.
+        If a parameter is missing or invalid, returns a JSON with an error message.
+    """
+    date = request.args.get("date")
+    if not date:
+        return jsonify({"error": "Date parameter is required"}), 400
+    fmt = negotiate_format(request.args.get("format"), request.accept_mimetypes)
+    if fmt is None:
+        return jsonify({"error": "Format not available"}), 406
+
+    filters = {}
+    for name in ("strike_min", "strike_max", "moneyness_min", "moneyness_max", "delta_min", "delta_max"):
+        value = request.args.get(name)
+        if value is not None:
+            try:
+                filters[name] = float(value)
+            except ValueError:
+                return jsonify({"error": f"{name} must be a number"}), 400
+    columns = request.args.get("columns")
+
+    snapshot = snapshot_cache.get(date)
+    if snapshot is None:
+        return jsonify({"error": "Item not found"}), 404
+    try:
+        options = snapshot.query(exp_date=request.args.get("exp_date"), call_put=request.args.get("call_put"),
+                                 columns=columns.split(",") if columns else None, **filters)
+    except KeyError as e:
+        return jsonify({"error": f"Unknown column: {e}"}), 400
+
+    options = options.astype(object).where(options.notna(), None)
+    item = {'Date': snapshot.date, 'Futures': snapshot.futures, 'Options': options.to_dict(orient='records')}
+    return build_item_response(serialize_item(item, fmt), fmt, date)
+
+
+@app.route("/get_smile", methods=["GET"])
+def get_smile_route():
+    """
+    Defines the /get_smile route that evaluates the stored SVI smile of one expiration date.
+
+    Returns:
+        Response: A Flask Response object containing the JSON smile and its evaluated strikes and IVs.
+        If a parameter is missing or invalid, or the stored smile is incomplete, returns a JSON
+        with an error message.
+    """
+    date = request.args.get("date")
+    exp_date = request.args.get("exp_date")
+    call_put = request.args.get("call_put", "CALL")
+    if not date or not exp_date:
+        return jsonify({"error": "Date and exp_date parameters are required"}), 400
+    try:
+        points = int(request.args.get("points", SMILE_POINTS))
+    except ValueError:
+        return jsonify({"error": "points must be an integer"}), 400
+    if not 2 <= points <= MAX_SMILE_POINTS:
+        return jsonify({"error": f"points must be between 2 and {MAX_SMILE_POINTS}"}), 400
+
+    item = get_smiles(table, date)
+    if item is None:
+        return jsonify({"error": "Item not found"}), 404
+    smile = next((smile for smile in item.get('Smiles', [])
+                  if smile['EXP_DATE'] == exp_date and smile['CALL_PUT'] == call_put), None)
+    if smile is None:
+        return jsonify({"error": "Smile not found"}), 404
+    missing = [name for name in SVI_PARAMETERS + ('TTM', 'K_MIN', 'K_MAX') if smile.get(name) is None]
+    if missing:
+        return jsonify({"error": f"Smile is incomplete, missing {', '.join(missing)}"}), 422
+
+    futures = float(item['Futures'])
+    k = np.linspace(float(smile['K_MIN']), float(smile['K_MAX']), points)
+    iv = svi_iv(k, smile, float(smile['TTM']))
+    body = {
+        'Date': date,
+        'Futures': futures,
+        'Smile': smile,
+        'STRIKE': (futures * np.exp(k)).round(3).tolist(),
+        'IV': [round(float(value), 3) if np.isfinite(value) else None for value in iv],
+    }
+    return app.response_class(json.dumps(body, separators=(',', ':'), default=decimal_to_float),
+                              status=200, mimetype="application/json")
+
+
+@app.route("/get_items", methods=["GET"])
+def get_items_route():
+    """
+    Defines the /get_items route that streams the items of several dates, resolved from the
+    partition index and fetched with parallel BatchGetItem requests.
+
+    Returns:
+        Response: A Flask Response object streaming one JSON object per line. Dates that could
+        not be fetched are reported in a final {"error": ..., "dates": [...]} line.
+        If neither dates nor a start and end are provided, returns a JSON with an error message.
+    """
+    start, end = request.args.get("start"), request.args.get("end")
+    requested = request.args.get("dates")
+    stored = get_unique_dates(table)
+    if requested:
+        dates = sorted(set(requested.split(",")) & stored)
+    elif start and end:
+        dates = sorted(date for date in stored if start <= date <= end)
     else:
+        return jsonify({"error": "Either dates or start and end parameters are required"}), 400
+
+    def generate():
+        failed = []
+        for items, unprocessed in iter_items(dynamodb, table.name, dates):
+            failed.extend(unprocessed)
+            for item in items:
+                yield json.dumps({"item": item}, separators=(',', ':'), default=decimal_to_float) + "\n"
+        if failed:
+            yield json.dumps({"error": "Items could not be fetched", "dates": failed}) + "\n"
+
+    return app.response_class(stream_with_context(generate()), status=200, mimetype="application/x-ndjson")
+
+
+@app.route("/get_snapshot", methods=["GET"])
+def get_snapshot_route():
+    """
+    Defines the /get_snapshot route that returns an intraday snapshot. The latest one is
+    served from the in-memory replayed state, only applying the snapshots appended since.
+
+    Returns:
+        Response: A Flask Response object containing the snapshot in the negotiated format.
+        If the date parameter is not provided, returns a JSON with an error message.
+    """
+    date = request.args.get("date")
+    if not date:
         return jsonify({"error": "Date parameter is required"}), 400
+    fmt = negotiate_format(request.args.get("format"), request.accept_mimetypes)
+    if fmt is None:
+        return jsonify({"error": "Format not available"}), 406
+
+    time_param = request.args.get("time")
+    if time_param:
+        state = apply_snapshots(query_snapshots(snapshot_table, date, until=time_param))
+        item = state_to_item(date, state) if state['Timestamp'] is not None else None
+    else:
+        item = latest_snapshots.get(snapshot_table, date)
+    if item is None:
+        return jsonify({"error": "Snapshot not found"}), 404
+    return build_item_response(serialize_item(item, fmt), fmt, date)
+
+
+@app.route("/get_snapshots", methods=["GET"])
+def get_snapshots_route():
+    """
+    Defines the /get_snapshots route that streams the intraday snapshots of a date in a time range.
+
+    Returns:
+        Response: A Flask Response object streaming one JSON object per line.
+        If the date parameter is not provided, returns a JSON with an error message.
+    """
+    date = request.args.get("date")
+    if not date:
+        return jsonify({"error": "Date parameter is required"}), 400
+    start, end = request.args.get("start"), request.args.get("end")
+
+    def generate():
+        after = None
+        if start:
+            state = apply_snapshots(query_snapshots(snapshot_table, date, until=start))
+            if state['Timestamp'] is not None:
+                after = state['Timestamp']
+                yield json.dumps({"snapshot": state_to_item(date, state)}, separators=(',', ':'), default=decimal_to_float) + "\n"
+        for delta in query_snapshots(snapshot_table, date, after=after, until=end):
+            yield json.dumps({"delta": delta}, separators=(',', ':'), default=decimal_to_float) + "\n"
+
+    return app.response_class(stream_with_context(generate()), status=200, mimetype="application/x-ndjson")
+
+
+@app.route("/get_aggregates", methods=["GET"])
+def get_aggregates_route():
+    """
+    Defines the /get_aggregates route that returns the history of the per-expiry summaries
+    stored by the IV Lambda, without reading the snapshots themselves.
+
+    Returns:
+        Response: A Flask Response object containing the JSON list of daily summaries.
+        If start or end is not a 'YYYY-MM-DD' date, returns a JSON with an error message.
+    """
+    end = request.args.get("end") or datetime.today().strftime('%Y-%m-%d')
+    start = request.args.get("start")
+    try:
+        end_date = datetime.strptime(end, '%Y-%m-%d')
+        if start:
+            datetime.strptime(start, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"error": "start and end must be dates in the YYYY-MM-DD format"}), 400
+    if not start:
+        start = (end_date - timedelta(days=AGGREGATES_DEFAULT_DAYS)).strftime('%Y-%m-%d')
+    product = request.args.get("product", DEFAULT_PRODUCT)
+    with stage('dynamodb.query_aggregates'):
+        items = query_aggregates(aggregates_table, product, start, end)
+    body = json.dumps({"product": product, "aggregates": items}, separators=(',', ':'), default=decimal_to_float)
+    return app.response_class(body, status=200, mimetype="application/json")
+
 
 if __name__ == '__main__':
     app.run(os.getenv("HOST", "0.0.0.0"), port=os.getenv("PORT", 8080))
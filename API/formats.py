@@ -0,0 +1,179 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIMETYPES = {
+    'json': 'application/json',
+    'columns': 'application/json',
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+TABULAR_FORMATS = ('csv', 'arrow', 'parquet')
+MIN_COMPRESS_SIZE = 1024
+# Content encodings that can be produced, in order of preference.
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def decimal_to_float(obj):
+    """
+    Converts a Decimal object to a float.
+
+    Args:
+        obj (Decimal): The Decimal object to convert.
+
+    Returns:
+        float: The float representation of the Decimal object.
+
+    Raises:
+        TypeError: If the object is not of type Decimal.
+    """
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError("Type not serializable")
+
+
+def negotiate_format(requested, accept_mimetypes):
+    """
+    Picks the response format from the 'format' query parameter or the Accept header.
+
+    Args:
+        requested (str): Value of the 'format' query parameter, or None.
+        accept_mimetypes (werkzeug.datastructures.MIMEAccept): The parsed Accept header.
+
+    Returns:
+        str: One of the keys of MIMETYPES, or None if the requested format is not available.
+    """
+    available = [fmt for fmt in MIMETYPES if fmt not in ('arrow', 'parquet') or pa is not None]
+    if requested:
+        return requested if requested in available else None
+    best = accept_mimetypes.best_match([MIMETYPES[fmt] for fmt in available], default='application/json')
+    return next(fmt for fmt in available if MIMETYPES[fmt] == best)
+
+
+def options_to_columns(options):
+    """
+    Turns a list of option records into column lists, converting Decimals to floats.
+
+    Args:
+        options (list): The 'Options' attribute of an item.
+
+    Returns:
+        dict: Column name to list of values, in first-seen column order.
+    """
+    names = {}
+    for record in options:
+        for name in record:
+            names.setdefault(name, None)
+    columns = {}
+    for name in names:
+        values = [record.get(name) for record in options]
+        if any(isinstance(value, Decimal) for value in values):
+            values = [float(value) if value is not None else None for value in values]
+        columns[name] = values
+    return columns
+
+
+def serialize_item(item, fmt):
+    """
+    Serializes an item in the given format.
+
+    JSON formats keep the {"item": ...} envelope, with 'columns' turning the options list
+    into one list per column. Tabular formats only contain the options table, with the
+    item's 'Date' and 'Futures' repeated as columns.
+
+    Args:
+        item (dict): The DynamoDB item, or None.
+        fmt (str): One of the keys of MIMETYPES.
+
+    Returns:
+        bytes: The serialized body.
+    """
+    if fmt == 'json':
+        return json.dumps({"item": item}, separators=(',', ':'), default=decimal_to_float).encode()
+    if fmt == 'columns':
+        if item is not None:
+            item = dict(item, Options=options_to_columns(item.get('Options', [])))
+        return json.dumps({"item": item}, separators=(',', ':'), default=decimal_to_float).encode()
+
+    options = item.get('Options', [])
+    columns = {'Date': [item['Date']] * len(options), 'Futures': [float(item['Futures'])] * len(options)}
+    columns.update(options_to_columns(options))
+    if fmt == 'csv':
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        writer.writerows(zip(*columns.values()))
+        return buffer.getvalue().encode()
+
+    table = pa.table(columns)
+    sink = io.BytesIO()
+    if fmt == 'arrow':
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        pq.write_table(table, sink, compression='zstd')
+    return sink.getvalue()
+
+
+def compute_etag(body):
+    """
+    Computes a strong ETag from the uncompressed body.
+
+    Args:
+        body (bytes): The serialized body.
+
+    Returns:
+        str: The ETag value, without quotes.
+    """
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+def negotiate_encoding(accept_encodings):
+    """
+    Picks the content encoding from the Accept-Encoding header.
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): The parsed Accept-Encoding header.
+
+    Returns:
+        str: 'br', 'gzip' or None for an uncompressed response.
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """
+    Compresses a body with the given content encoding.
+
+    Args:
+        body (bytes): The serialized body.
+        encoding (str): 'br', 'gzip' or None.
+
+    Returns:
+        bytes: The encoded body.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
@@ -0,0 +1,144 @@
+from datetime import datetime
+from decimal import Decimal
+import numpy as np
+import pandas as pd
+from meff.cache import LRUCache
+
+GROUP_COLUMNS = ['EXP_DATE', 'CALL_PUT']
+
+
+class OptionsSnapshot:
+    """
+    Parsed options of one item, sorted by expiry, call/put and strike so that the rows of
+    one smile are a contiguous block and strike ranges can be found by binary search.
+    """
+
+    def __init__(self, item):
+        self.date = item['Date']
+        self.futures = float(item['Futures'])
+        frame = pd.DataFrame(item.get('Options', []))
+        for column in frame.columns:
+            if frame[column].map(lambda x: isinstance(x, Decimal)).any():
+                frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(float)
+
+        self.groups = None
+        if all(column in frame.columns for column in GROUP_COLUMNS + ['STRIKE']):
+            frame = frame.sort_values(GROUP_COLUMNS + ['STRIKE'], kind='stable').reset_index(drop=True)
+            self.groups = {}
+            for key, positions in frame.groupby(GROUP_COLUMNS, sort=False).indices.items():
+                self.groups[key] = (positions[0], positions[-1] + 1)
+        self.frame = frame
+        self.strikes = frame['STRIKE'].to_numpy(dtype=float) if 'STRIKE' in frame.columns else None
+
+    @property
+    def nbytes(self):
+        """
+        Returns the memory footprint of the parsed options in bytes.
+        """
+        return int(self.frame.memory_usage(deep=True).sum()) + (self.strikes.nbytes if self.strikes is not None else 0)
+
+    def query(self, exp_date=None, call_put=None, strike_min=None, strike_max=None,
+              moneyness_min=None, moneyness_max=None, delta_min=None, delta_max=None, columns=None):
+        """
+        Returns the options matching the given filters.
+
+        Args:
+            exp_date (str, optional): Expiration date ('YYYY-MM-DD').
+            call_put (str, optional): 'CALL' or 'PUT'.
+            strike_min (float, optional): Lowest strike, inclusive.
+            strike_max (float, optional): Highest strike, inclusive.
+            moneyness_min (float, optional): Lowest moneyness, inclusive.
+            moneyness_max (float, optional): Highest moneyness, inclusive.
+            delta_min (float, optional): Lowest delta, inclusive, negative for puts.
+            delta_max (float, optional): Highest delta, inclusive.
+            columns (list, optional): Columns to return, all of them if None.
+
+        Returns:
+            pandas.DataFrame: The matching options.
+
+        Raises:
+            KeyError: If a filtered or projected column is not present in the snapshot.
+        """
+        frame = self.frame
+        if self.groups is not None:
+            ranges = []
+            for (group_exp_date, group_call_put), (start, stop) in self.groups.items():
+                if exp_date is not None and group_exp_date != exp_date:
+                    continue
+                if call_put is not None and group_call_put != call_put:
+                    continue
+                if strike_min is not None:
+                    start = start + np.searchsorted(self.strikes[start:stop], strike_min, side='left')
+                if strike_max is not None:
+                    stop = start + np.searchsorted(self.strikes[start:stop], strike_max, side='right')
+                if start < stop:
+                    ranges.append(np.arange(start, stop))
+            positions = np.concatenate(ranges) if ranges else np.array([], dtype=int)
+            frame = frame.iloc[positions]
+        else:
+            mask = np.ones(len(frame), dtype=bool)
+            if exp_date is not None:
+                mask &= (frame['EXP_DATE'] == exp_date).to_numpy()
+            if call_put is not None:
+                mask &= (frame['CALL_PUT'] == call_put).to_numpy()
+            if strike_min is not None:
+                mask &= self.strikes >= strike_min
+            if strike_max is not None:
+                mask &= self.strikes <= strike_max
+            frame = frame[mask]
+
+        if moneyness_min is not None:
+            frame = frame[frame['MONEYNES'] >= moneyness_min]
+        if moneyness_max is not None:
+            frame = frame[frame['MONEYNES'] <= moneyness_max]
+        if delta_min is not None:
+            frame = frame[frame['DELTA'] >= delta_min]
+        if delta_max is not None:
+            frame = frame[frame['DELTA'] <= delta_max]
+        if columns is not None:
+            frame = frame[columns]
+        return frame
+
+
+class SnapshotCache:
+    """
+    Thread-safe LRU of parsed snapshots keyed by date, bounded by their memory footprint,
+    see cache.LRUCache. Past dates stay until evicted, today's and future dates and missing
+    items expire after today_ttl seconds.
+    """
+
+    def __init__(self, loader, max_bytes, today_ttl):
+        self.loader = loader
+        self.today_ttl = today_ttl
+        self.cache = LRUCache(max_bytes, size=lambda snapshot: snapshot.nbytes if snapshot is not None else 0)
+
+    def load(self, date):
+        """
+        Loads and parses the snapshot of a date, None if there is no item for that date.
+        """
+        item = self.loader(date)
+        return OptionsSnapshot(item) if item else None
+
+    def get(self, date):
+        """
+        Returns the parsed snapshot of a date, loading it on a miss. Concurrent misses for the
+        same date share one load.
+
+        Args:
+            date (str): The date of the item.
+
+        Returns:
+            OptionsSnapshot: The parsed snapshot, or None if there is no item for that date.
+        """
+        def ttl(snapshot):
+            if snapshot is None or date >= datetime.today().strftime('%Y-%m-%d'):
+                return self.today_ttl
+            return None
+
+        return self.cache.get(date, lambda: self.load(date), ttl=ttl)
+
+    def clear(self):
+        """
+        Removes every snapshot from the cache.
+        """
+        self.cache.clear()
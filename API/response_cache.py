@@ -0,0 +1,87 @@
+from datetime import datetime
+from meff.cache import LRUCache
+from formats import ENCODINGS, MIN_COMPRESS_SIZE, compress, compute_etag
+
+
+class EncodedBody:
+    """
+    A serialized response body with its ETag. Compressed encodings are computed on demand,
+    or once for all ENCODINGS with precompress() before the body is cached.
+    """
+
+    def __init__(self, body, found=True):
+        self.body = body
+        self.found = found
+        self.etag = compute_etag(body)
+        self.encoded = {}
+
+    def precompress(self, encodings=ENCODINGS):
+        """
+        Compresses the body with every given encoding, if it is large enough to be compressed.
+
+        Returns:
+            EncodedBody: The body itself.
+        """
+        if len(self.body) >= MIN_COMPRESS_SIZE:
+            for encoding in encodings:
+                self.encoded[encoding] = compress(self.body, encoding)
+        return self
+
+    def encode(self, encoding):
+        """
+        Returns the body in the given content encoding, 'br', 'gzip' or None.
+        """
+        if encoding is None:
+            return self.body
+        encoded = self.encoded.get(encoding)
+        return encoded if encoded is not None else compress(self.body, encoding)
+
+    @property
+    def size(self):
+        return len(self.body) + sum(len(encoded) for encoded in self.encoded.values())
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of encoded response bodies, bounded by their total size in bytes, see
+    cache.LRUCache. Closed dates are kept until evicted, the others expire after today_ttl.
+    """
+
+    def __init__(self, max_bytes, today_ttl):
+        self.today_ttl = today_ttl
+        self.cache = LRUCache(max_bytes, size=lambda body: body.size)
+
+    def ttl(self, date, value):
+        """
+        Returns how long a body stays valid: closed dates never change and are kept until
+        evicted, today's and future dates and missing items expire after today_ttl seconds.
+        """
+        if not value.found or date >= datetime.today().strftime('%Y-%m-%d'):
+            return self.today_ttl
+        return None
+
+    def get(self, key, date, loader):
+        """
+        Returns the cached body of a key, calling the loader on a miss.
+
+        Args:
+            key (hashable): The cache key, e.g. the date, expiry and format of the response.
+            date (str): The date of the item, which sets the TTL of the entry.
+            loader (callable): Function without arguments that returns the EncodedBody to cache.
+
+        Returns:
+            EncodedBody: The cached or freshly loaded body.
+        """
+        return self.cache.get(key, loader, ttl=lambda value: self.ttl(date, value))
+
+    def stats(self):
+        """
+        Returns the number of entries, their size in bytes and the hit and miss counts.
+        """
+        return self.cache.stats()
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        self.cache.clear()
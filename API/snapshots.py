@@ -0,0 +1,78 @@
+import os
+import threading
+from boto3.dynamodb.conditions import Key
+from meff.intraday import apply_snapshots, load_state, query_snapshots
+
+# Intraday snapshots written by lambda_scrap in the 'intraday' mode, see intraday.py.
+LATEST_SNAPSHOT_DATES = int(os.environ.get("LATEST_SNAPSHOT_DATES", 7))
+
+
+def latest_timestamp(table, date):
+    """
+    Reads only the sort key of the newest snapshot of a date.
+
+    Returns:
+        str: The newest 'Timestamp', or None if the date has no snapshots.
+    """
+    response = table.query(
+        KeyConditionExpression=Key('Date').eq(date),
+        ScanIndexForward=False,
+        Limit=1,
+        ProjectionExpression='#t',
+        ExpressionAttributeNames={'#t': 'Timestamp'}
+    )
+    items = response['Items']
+    return items[0]['Timestamp'] if items else None
+
+
+def state_to_item(date, state):
+    """
+    Turns a replayed state into an item shaped like the daily ones, plus its 'Timestamp'.
+    """
+    return {'Date': date, 'Timestamp': state['Timestamp'], 'Futures': state['Futures'],
+            'Options': list(state['Rows'].values())}
+
+
+class LatestSnapshots:
+    """
+    Keeps the replayed latest state of each date in memory. A request only reads the newest
+    sort key, and when new snapshots were appended it applies just those to the cached state.
+    A date missing from memory is rebuilt by intraday.load_state. The lock only guards the
+    dict of states, the table is read outside of it.
+    """
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def get(self, table, date):
+        """
+        Returns the latest state of a date.
+
+        Args:
+            table (boto3.resources.factory.dynamodb.Table): The snapshots table.
+            date (str): The date of the snapshots.
+
+        Returns:
+            dict: The item of the latest snapshot, or None if the date has no snapshots.
+        """
+        newest = latest_timestamp(table, date)
+        if newest is None:
+            return None
+        with self._lock:
+            state = self._states.get(date)
+        if state is not None and state['Timestamp'] == newest:
+            return state_to_item(date, state)
+        if state is None:
+            state = load_state(table, date)
+        else:
+            # apply_snapshots returns a new state, the cached one is not modified.
+            state = apply_snapshots(query_snapshots(table, date, after=state['Timestamp']), state)
+        with self._lock:
+            cached = self._states.get(date)
+            # A concurrent request may have cached a newer state meanwhile.
+            if cached is None or cached['Timestamp'] <= state['Timestamp']:
+                self._states[date] = state
+            while len(self._states) > LATEST_SNAPSHOT_DATES:
+                del self._states[min(self._states)]
+        return state_to_item(date, state)
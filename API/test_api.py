@@ -0,0 +1,275 @@
+import gzip
+import importlib.util
+import json
+import os
+import threading
+from decimal import Decimal
+import pandas as pd
+import snapshots
+from meff.columnar import encode_options
+from meff.intraday import store_snapshot
+from meff.storage import SQLiteResource
+from options_index import OptionsSnapshot, SnapshotCache
+from response_cache import EncodedBody, ResponseCache
+
+# Loaded by path because the dashboard and the Lambdas also have an app.py module.
+spec = importlib.util.spec_from_file_location('api_app', os.path.join(os.path.dirname(__file__), 'app.py'))
+api = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(api)
+
+item = {
+    'Date': '2023-05-10',
+    'Futures': Decimal('9500.00'),
+    'Options': [
+        {'DATA-TIPO': 'OCE20230616', 'STRIKE': Decimal('9500'), 'IV': Decimal('18.3'), 'CALL_PUT': 'CALL'},
+        {'DATA-TIPO': 'OPE20230616', 'STRIKE': Decimal('9500'), 'IV': Decimal('19.1'), 'CALL_PUT': 'PUT'},
+    ] * 20,
+}
+
+
+class FakeTable:
+    name = 'MeffScrapping'
+
+    def get_item(self, Key):
+        if Key['Date'] == api.DATE_INDEX_KEY:
+            return {'Item': {'Date': Key['Date'], 'Dates': {'2023-05-08', '2023-05-09', '2023-05-10'}}}
+        return {'Item': item} if Key['Date'] == item['Date'] else {}
+
+
+class FakeDynamoDB:
+    def __init__(self):
+        self.throttled = True
+
+    def batch_get_item(self, RequestItems):
+        keys = RequestItems['MeffScrapping']['Keys']
+        if self.throttled:
+            self.throttled = False
+            return {'Responses': {'MeffScrapping': []}, 'UnprocessedKeys': RequestItems}
+        return {'Responses': {'MeffScrapping': [dict(item, Date=key['Date']) for key in keys]}}
+
+
+def client():
+    api.table = FakeTable()
+    api.dynamodb = FakeDynamoDB()
+    api.response_cache.clear()
+    return api.app.test_client()
+
+
+def test_get_item_compact_json():
+    response = client().get('/get_item?date=2023-05-10')
+    assert response.status_code == 200
+    assert json.loads(response.data)['item']['Options'][0]['IV'] == 18.3
+
+
+def test_get_item_columns_and_csv():
+    columns = client().get('/get_item?date=2023-05-10&format=columns').get_json()
+    assert columns['item']['Options']['STRIKE'][:2] == [9500.0, 9500.0]
+    csv = client().get('/get_item?date=2023-05-10', headers={'Accept': 'text/csv'})
+    assert csv.mimetype == 'text/csv'
+    assert csv.data.decode().splitlines()[0] == 'Date,Futures,DATA-TIPO,STRIKE,IV,CALL_PUT'
+
+
+def test_get_item_gzip_and_etag():
+    response = client().get('/get_item?date=2023-05-10', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['item']['Date'] == '2023-05-10'
+    cached = client().get('/get_item?date=2023-05-10', headers={'Accept-Encoding': 'gzip', 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    missing = client().get('/get_item?date=2023-05-07')
+    assert missing.get_json() == {'item': None}
+    assert missing.headers['Cache-Control'] == 'no-cache'
+
+
+def test_get_options_filters():
+    response = client().get('/get_options?date=2023-05-10&call_put=PUT&strike_min=9000&strike_max=9500&columns=STRIKE,IV')
+    options = response.get_json()['item']['Options']
+    assert len(options) == 20
+    assert options[0] == {'STRIKE': 9500.0, 'IV': 19.1}
+    assert client().get('/get_options?date=2023-05-10&strike_min=9600').get_json()['item']['Options'] == []
+    assert client().get('/get_options?date=2023-05-10&columns=NOPE').status_code == 400
+
+
+def test_get_items_streams_ndjson():
+    response = client().get('/get_items?start=2023-05-09&end=2023-05-31')
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert response.mimetype == 'application/x-ndjson'
+    assert [line['item']['Date'] for line in lines] == ['2023-05-09', '2023-05-10']
+    assert client().get('/get_items').status_code == 400
+
+
+def test_get_item_decodes_columnar_items():
+    expected = client().get('/get_item?date=2023-05-10').get_json()
+    frame = pd.DataFrame([{name: float(value) if isinstance(value, Decimal) else value
+                               for name, value in option.items()} for option in item['Options']])
+    columnar_item = {'Date': item['Date'], 'Futures': item['Futures'], 'Columns': encode_options(frame)}
+    api.table = FakeTable()
+    api.table.get_item = lambda Key: {'Item': columnar_item}
+    response = api.app.test_client().get('/get_item?date=2023-05-10')
+    assert response.get_json() == expected
+
+
+def test_metrics_disabled_by_default():
+    test_client = client()
+    test_client.get('/get_item?date=2023-05-10')
+    body = test_client.get('/metrics').get_json()
+    assert (body['enabled'], body['stages']) == (False, {})
+    assert body['response_cache']['entries'] == 1
+
+
+def test_metrics_sum_counters_and_count_statuses(monkeypatch):
+    monkeypatch.setattr(api.metrics, 'METRICS_ENABLED', True)
+    monkeypatch.setattr(api.metrics, '_totals', {})
+    api.metrics.record('api.get_item', 2.0, status=200, bytes=100, format='json')
+    api.metrics.record('api.get_item', 4.0, status=404, bytes=20)
+    api.metrics.record('api.get_item', 3.0, status=200, bytes=100)
+    totals = api.metrics.snapshot()['stages']['api.get_item']
+    assert totals['status'] == {'200': 2, '404': 1}
+    assert (totals['count'], totals['bytes'], totals['max_ms'], totals['mean_ms']) == (3, 220, 4.0, 3.0)
+    assert 'format' not in totals
+
+
+def test_get_aggregates_queries_one_product():
+    class FakeAggregatesTable:
+        def query(self, **kwargs):
+            self.kwargs = kwargs
+            return {'Items': [{'Product': 'FIEM_MiniIbex_35', 'Date': '2023-05-10', 'Futures': Decimal('9500.00'),
+                               'Expiries': [{'EXP_DATE': '2023-06-16', 'ATM_IV': Decimal('18.7'), 'RR25': None}]}]}
+
+    api.aggregates_table = FakeAggregatesTable()
+    response = client().get('/get_aggregates?start=2023-01-01&end=2023-06-30')
+    assert response.get_json()['aggregates'][0]['Expiries'] == [{'EXP_DATE': '2023-06-16', 'ATM_IV': 18.7, 'RR25': None}]
+    condition = api.aggregates_table.kwargs['KeyConditionExpression'].get_expression()
+    assert condition['values'][1].get_expression()['values'][1:] == ('2023-01-01', '2023-06-30')
+
+
+def test_get_aggregates_rejects_malformed_dates():
+    for query in ('end=2023-13-01', 'end=yesterday', 'start=2023/01/01&end=2023-06-30'):
+        response = client().get(f'/get_aggregates?{query}')
+        assert response.status_code == 400 and 'error' in response.get_json()
+
+
+def test_get_options_delta_filter():
+    snapshot = OptionsSnapshot({'Date': '2023-05-10', 'Futures': Decimal('9500.00'), 'Options': [
+        {'EXP_DATE': '2023-06-16', 'CALL_PUT': call_put, 'STRIKE': Decimal(strike), 'DELTA': Decimal(delta)}
+        for call_put, strike, delta in [('CALL', '9500', '0.52'), ('CALL', '10000', '0.24'),
+                                        ('PUT', '9000', '-0.26'), ('PUT', '9500', '-0.48')]]})
+    assert snapshot.query(delta_min=-0.3, delta_max=0.3)['STRIKE'].tolist() == [10000.0, 9000.0]
+    assert client().get('/get_options?date=2023-05-10&delta_min=0.2').status_code == 400
+    assert client().get('/get_options?date=2023-05-10&delta_max=x').status_code == 400
+
+
+def test_get_smile_evaluates_stored_fit():
+    smile = {'EXP_DATE': '2023-06-16', 'CALL_PUT': 'CALL', 'TTM': Decimal('0.1'), 'A': Decimal('0.004'),
+             'B': Decimal('0.05'), 'RHO': Decimal('-0.5'), 'M': Decimal('0'), 'SIGMA': Decimal('0.1'),
+             'K_MIN': Decimal('-0.1'), 'K_MAX': Decimal('0.1')}
+
+    class FakeSmilesTable:
+        def get_item(self, Key, ProjectionExpression):
+            return {'Item': {'Futures': Decimal('9500.00'), 'Smiles': [smile]}} if Key['Date'] == '2023-05-10' else {}
+
+    api.table = FakeSmilesTable()
+    test_client = api.app.test_client()
+    body = test_client.get('/get_smile?date=2023-05-10&exp_date=2023-06-16&call_put=CALL&points=3').get_json()
+    assert body['STRIKE'][1] == 9500.0
+    # At k = M the total variance is A + B * SIGMA = 0.009, an IV of 30% over 0.1 years.
+    assert body['IV'][1] == 30.0
+    assert body['IV'][0] > body['IV'][2]
+    assert test_client.get('/get_smile?date=2023-05-10&exp_date=2023-06-16&call_put=PUT').status_code == 404
+    assert test_client.get('/get_smile?date=2023-05-10&exp_date=2023-06-16&points=1').status_code == 400
+
+    # A smile stored without its fitted range can't be evaluated.
+    del smile['K_MAX']
+    smile['K_MIN'] = None
+    response = test_client.get('/get_smile?date=2023-05-10&exp_date=2023-06-16')
+    assert response.status_code == 422 and 'K_MIN, K_MAX' in response.get_json()['error']
+
+
+def test_get_item_responses_are_cached():
+    test_client = client()
+    calls = []
+    get_item = api.table.get_item
+    api.table.get_item = lambda Key: calls.append(Key) or get_item(Key)
+    first = test_client.get('/get_item?date=2023-05-10', headers={'Accept-Encoding': 'gzip'})
+    second = test_client.get('/get_item?date=2023-05-10', headers={'Accept-Encoding': 'gzip'})
+    plain = test_client.get('/get_item?date=2023-05-10')
+    assert len(calls) == 1
+    assert first.data == second.data and gzip.decompress(first.data) == plain.data
+    assert test_client.get('/get_item?date=2023-05-10&format=csv').status_code == 200
+    assert test_client.get('/get_item?date=2023-05-01&format=csv').status_code == 404
+    assert len(calls) == 3
+
+
+def test_response_cache_coalesces_misses_and_expires_today():
+    cache = ResponseCache(max_bytes=10, today_ttl=0)
+    started, release, loads = threading.Event(), threading.Event(), []
+
+    def loader():
+        loads.append(1)
+        started.set()
+        release.wait()
+        return EncodedBody(b'past')
+
+    threads = [threading.Thread(target=cache.get, args=('key', '2000-01-01', loader)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1 and cache.stats()['hits'] == 3
+    cache.get('today', '9999-01-01', lambda: loads.append(1) or EncodedBody(b'today'))
+    cache.get('today', '9999-01-01', lambda: loads.append(1) or EncodedBody(b'today'))
+    assert len(loads) == 3
+    # Bodies are bounded by their total size, the oldest entry is evicted first.
+    cache.get('other', '2000-01-02', lambda: EncodedBody(b'other!'))
+    assert cache.stats()['entries'] == 1 and cache.stats()['bytes'] == 6
+
+
+def test_snapshot_cache_coalesces_loads_and_bounds_bytes():
+    started, release, loads = threading.Event(), threading.Event(), []
+
+    def loader(date):
+        loads.append(date)
+        started.set()
+        release.wait()
+        return dict(item, Date=date)
+
+    size = OptionsSnapshot(item).nbytes
+    cache = SnapshotCache(loader, max_bytes=size, today_ttl=60)
+    threads = [threading.Thread(target=cache.get, args=('2023-05-10',)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads == ['2023-05-10'] and cache.cache.stats()['hits'] == 3
+    # Snapshots are bounded by their memory footprint, the oldest one is evicted first.
+    cache.get('2023-05-11')
+    assert cache.cache.stats()['entries'] == 1 and cache.cache.stats()['bytes'] == size
+    cache.get('2023-05-10')
+    assert loads == ['2023-05-10', '2023-05-11', '2023-05-10']
+
+
+def test_latest_snapshots_read_outside_the_lock_and_stay_bounded(monkeypatch, tmp_path):
+    monkeypatch.setattr(snapshots, 'LATEST_SNAPSHOT_DATES', 2)
+    table = SQLiteResource(str(tmp_path / 'meff.sqlite3')).Table('MeffScrappingSnapshots')
+    latest = snapshots.LatestSnapshots()
+
+    class UnlockedTable:
+        def __getattr__(self, name):
+            assert not latest._lock.locked()
+            return getattr(table, name)
+
+    rows = [{'DATA-TIPO': 'OCE20230616', 'STRIKE': Decimal('9500'), 'ANT': Decimal('121')}]
+    for date in ('2023-05-08', '2023-05-09', '2023-05-10'):
+        store_snapshot(table, date, '09:00:00', Decimal('9500.00'), rows)
+        assert latest.get(UnlockedTable(), date)['Timestamp'] == '09:00:00'
+    # Every insert evicts the oldest dates, not only the updates of a cached one.
+    assert sorted(latest._states) == ['2023-05-09', '2023-05-10']
+
+    store_snapshot(table, '2023-05-10', '09:05:00', Decimal('9510.00'), rows)
+    assert latest.get(UnlockedTable(), '2023-05-10')['Futures'] == Decimal('9510.00')
+    assert latest.get(UnlockedTable(), '2023-05-07') is None
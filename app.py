@@ -1,28 +1,60 @@
 import dash
 from dash import dcc, html
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import plotly.graph_objs as go
 import os
-import boto3
-from aws_handler import get_unique_dates, get_item
+from datetime import datetime, timedelta
+from aws_handler import (get_unique_dates, get_item, get_surface, get_smiles, get_aggregates, table_name,
+                         start_dates_refresher, frame_bytes, DATES_REFRESH_INTERVAL, AGGREGATES_TABLE_NAME)
+from meff.cache import LRUCache
+from meff.metrics import timed
+from meff.storage import dynamodb_resource
+from meff.svi import svi_surface
 import numpy as np
-from scipy.interpolate import griddata
+import pandas as pd
+from scipy.interpolate import griddata, LinearNDInterpolator
 
 aws_access_key_id = os.environ.get("aws_access_key_id")
 aws_secret_access_key = os.environ.get("aws_secret_access_key")
 
-dynamodb = boto3.resource(
-    "dynamodb",
+dynamodb = dynamodb_resource(
     aws_access_key_id=aws_access_key_id,
     aws_secret_access_key=aws_secret_access_key,
     region_name="eu-central-1"
 )
-table = dynamodb.Table('MeffScrapping')
-unique_dates = get_unique_dates(table)
+table = dynamodb.Table(table_name())
+aggregates_table = dynamodb.Table(AGGREGATES_TABLE_NAME)
+# The date list is loaded in the background, the dropdowns are filled by update_date_dropdown.
+start_dates_refresher(table)
+
+# 'fixed' interpolates on a SURFACE_RESOLUTION x SURFACE_RESOLUTION grid reusing one triangulation
+# per (date, call/put); 'exact' keeps one grid node per distinct moneyness and TTM value.
+SURFACE_MODE = os.environ.get("SURFACE_MODE", "fixed")
+# 'svi' evaluates the surfaces from the smiles fitted by the IV Lambda, falling back to the
+# stored grid and then to SURFACE_MODE for snapshots stored without them. 'grid' skips the smiles.
+SURFACE_SOURCE = os.environ.get("SURFACE_SOURCE", "svi")
+SURFACE_RESOLUTION = int(os.environ.get("SURFACE_RESOLUTION", 40))
+SURFACE_MAX_POINTS = int(os.environ.get("SURFACE_MAX_POINTS", 0))
+INTERPOLATOR_CACHE_MAX_BYTES = int(os.environ.get("INTERPOLATOR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Columns of the selected snapshot kept in the browser for the smile graph.
+SNAPSHOT_STORE_COLUMNS = ('EXP_DATE', 'CALL_PUT', 'STRIKE', 'IV')
+SNAPSHOT_STORE_NUMERIC_COLUMNS = ('STRIKE', 'IV')
+SNAPSHOT_STORE_SMILE_COLUMNS = ('EXP_DATE', 'CALL_PUT', 'TTM', 'A', 'B', 'RHO', 'M', 'SIGMA', 'K_MIN', 'K_MAX')
+# Days of history shown by the aggregates panel.
+AGGREGATES_HISTORY_DAYS = int(os.environ.get("AGGREGATES_HISTORY_DAYS", 180))
+AGGREGATE_METRICS = {
+    'ATM_IV': 'ATM Implied Volatility',
+    'RR25': '25-Delta Risk Reversal',
+    'BF25': '25-Delta Butterfly',
+    'SKEW': 'Skew Slope',
+}
 
 app = dash.Dash(__name__)
 
 app.layout = html.Div([
+    dcc.Store(id='snapshot-store'),
+    dcc.Store(id='comparison-snapshot-store'),
     html.Div([
         html.H1('Implied Volatility Dashboard', style={'font-family': 'Verdana', 'color': '#2A3F5F', 'margin-top': '30px', 'textAlign': 'center'}),
         html.Div([
@@ -31,10 +63,11 @@ app.layout = html.Div([
                 html.Label('Select Data Collection Date', style={'font-family': 'Verdana', 'color': '#2A3F5F'}),
                 dcc.Dropdown(
                     id='data-collection-date-dropdown',
-                    options=[{'label': date, 'value': date} for date in unique_dates],
-                    value=list(unique_dates)[-1],
+                    options=[],
+                    value=None,
                     style={'font-family': 'Verdana'}
                 ),
+                dcc.Interval(id='dates-refresh-interval', interval=DATES_REFRESH_INTERVAL * 1000),
                 html.Label('Select Expiration Date', style={'font-family': 'Verdana', 'color': '#2A3F5F'}),
                 dcc.Dropdown(
                     id='exp-date-dropdown',
@@ -53,7 +86,7 @@ app.layout = html.Div([
 
                 dcc.Dropdown(
                     id='comparison-date-dropdown',
-                    options=[{'label': date, 'value': date} for date in unique_dates],
+                    options=[],
                     value=None,
                     style={'font-family': 'Verdana'},
                 ),
@@ -64,10 +97,24 @@ app.layout = html.Div([
         ], style={'padding': '20px'}),
         html.Div([
             dcc.Graph(id='put-volatility-surface-graph', style={'width': '80%', 'height': '80%', 'display': 'inline-block'})
+        ], style={'padding': '20px'}),
+        html.Div([
+            dcc.Graph(id='aggregates-history-graph', style={'width': '80%', 'height': '80%', 'display': 'inline-block'}),
+            html.Div([
+                html.Label('Select History Measure', style={'font-family': 'Verdana', 'color': '#2A3F5F'}),
+                dcc.Dropdown(
+                    id='aggregate-metric-dropdown',
+                    options=[{'label': label, 'value': metric} for metric, label in AGGREGATE_METRICS.items()],
+                    value='ATM_IV',
+                    clearable=False,
+                    style={'font-family': 'Verdana'}
+                ),
+            ], style={'width': '18%', 'display': 'inline-block', 'verticalAlign': 'top', 'padding-left': '20px'})
         ], style={'padding': '20px'})
     ], style={'background-color': '#F3F6FA', 'border-radius': '5px', 'padding': '20px', 'margin': '20px'})
 ])
 
+@timed('dashboard.interpolate_iv')
 def interpolate_iv(options_new, moneyness, ttm):
     """
     Performs interpolation of implied volatility (IV) to create the volatility surface.
@@ -88,72 +135,163 @@ def interpolate_iv(options_new, moneyness, ttm):
     return xi, yi, zi
 
 
-@app.callback(
-    Output('volatility-smile-graph', 'figure'),
-    [Input('exp-date-dropdown', 'value'),
-     Input('data-collection-date-dropdown', 'value'),
-     Input('comparison-mode', 'value'),
-     Input('comparison-date-dropdown', 'value')])
-def update_graph(selected_exp_date, selected_date, comparison_mode, comparison_date):
+def decimate_options(options_new, max_points):
+    """
+    Keeps an evenly spaced subset of the options, ordered by TTM and moneyness, so that
+    triangulating large chains stays bounded.
+
+    Args:
+        options_new (DataFrame): DataFrame with options pricing and volatility.
+        max_points (int): Maximum number of options to keep, 0 to keep them all.
+
+    Returns:
+        DataFrame: The decimated options.
     """
-    Callback for updating the volatility smile graph.
+    if max_points <= 0 or len(options_new) <= max_points:
+        return options_new
+    ordered = options_new.sort_values(['TTM', 'MONEYNES'])
+    positions = np.unique(np.linspace(0, len(ordered) - 1, max_points).round().astype(int))
+    return ordered.iloc[positions]
+
+
+def get_interpolator(selected_date, call_put):
+    """
+    Returns the linear IV interpolator of one option type, building its Delaunay triangulation
+    only once per (date, call/put) point set.
 
     Args:
-        selected_exp_date (str): The selected expiration date.
         selected_date (str): The selected data collection date.
-        comparison_mode (str): The selected comparison mode.
-        comparison_date (str): The selected comparison date.
+        call_put (str): 'CALL' or 'PUT'.
 
     Returns:
-        dict: A dictionary containing the updated data and layout for the graph.
+        tuple: The LinearNDInterpolator and the (min, max) moneyness and TTM bounds, or None
+        if the points do not span a surface.
     """
+    options_new = get_item(table, selected_date)
+    # get_item returns the same DataFrame while the snapshot stays cached, and the entry keeps
+    # a reference to it, so its id identifies the point set.
+    key = (selected_date, call_put, id(options_new))
+    return interpolator_cache.get(key, lambda: (options_new, build_interpolator(options_new, call_put)))[1]
 
-    def get_traces(selected_date, selected_exp_date, trace_color, comparison_label):
-        options_new = get_item(table, selected_date)
-        filtered_options = options_new[options_new['EXP_DATE'] == selected_exp_date]
 
-        call_options = filtered_options[filtered_options['CALL_PUT'] == 'CALL']
-        put_options = filtered_options[filtered_options['CALL_PUT'] == 'PUT']
+def build_interpolator(options_new, call_put):
+    """
+    Triangulates the options of one type, see get_interpolator.
+    """
+    if options_new.empty:
+        return None
+    filtered_options = decimate_options(options_new[options_new['CALL_PUT'] == call_put], SURFACE_MAX_POINTS)
+    x = filtered_options['MONEYNES'].to_numpy(dtype=float)
+    y = filtered_options['TTM'].to_numpy(dtype=float)
+    z = filtered_options['IV'].to_numpy(dtype=float)
+    try:
+        interpolator = LinearNDInterpolator(np.column_stack([x, y]), z)
+    except (ValueError, RuntimeError):
+        return None
+    return interpolator, (x.min(), x.max()), (y.min(), y.max())
+
+
+def interpolator_bytes(entry):
+    """
+    Approximates the memory held by an interpolator_cache entry: the options it was built
+    from, which it keeps alive, and the points, values and triangulation of the interpolator.
+    """
+    options_new, result = entry
+    size = frame_bytes(options_new)
+    if result is not None:
+        interpolator = result[0]
+        size += sum(array.nbytes for array in (interpolator.points, interpolator.values, interpolator.tri.simplices,
+                                                interpolator.tri.neighbors, interpolator.tri.equations))
+    return size
 
-        call_trace = go.Scatter(
-            x=call_options['STRIKE'],
-            y=call_options['IV'],
-            mode='markers+lines',
-            name=f'Call Options (Collection: {comparison_label}, Expiration: {selected_exp_date})',
-            marker=dict(color=trace_color[0], size=10, line=dict(width=2, color='black'))
-        )
 
-        put_trace = go.Scatter(
-            x=put_options['STRIKE'],
-            y=put_options['IV'],
-            mode='markers+lines',
-            name=f'Put Options (Collection: {comparison_label}, Expiration: {selected_exp_date})',
-            marker=dict(color=trace_color[1], size=10, line=dict(width=2, color='black'))
-        )
+interpolator_cache = LRUCache(INTERPOLATOR_CACHE_MAX_BYTES, size=interpolator_bytes)
 
-        return [call_trace, put_trace]
 
-    traces = []
-    traces += get_traces(selected_date, selected_exp_date, ('rgba(0, 180, 0, .8)', 'rgba(180, 0, 180, .8)'), selected_date)
+@timed('dashboard.interpolate_iv_fixed')
+def interpolate_iv_fixed(selected_date, call_put, resolution=SURFACE_RESOLUTION):
+    """
+    Interpolates the IV surface of one option type on a fixed-resolution grid.
 
-    if comparison_mode != 'none' and comparison_date is not None:
-        if comparison_mode == 'collection':
-            traces += get_traces(comparison_date, selected_exp_date, ('rgba(0, 80, 0, .8)', 'rgba(80, 0, 80, .8)'), comparison_date)
-        elif comparison_mode == 'expiration':
-            traces += get_traces(selected_date, comparison_date, ('rgba(0, 80, 0, .8)', 'rgba(80, 0, 80, .8)'), comparison_date)
+    Args:
+        selected_date (str): The selected data collection date.
+        call_put (str): 'CALL' or 'PUT'.
+        resolution (int): Number of grid nodes along each axis.
 
-    layout = go.Layout(
-        title='Volatility Skew calculated for Meff Options',
-        xaxis=dict(title='Strike', titlefont=dict(family='Verdana', color='#2A3F5F'), tickfont=dict(family='Verdana', color='#2A3F5F')),
-        yaxis=dict(title='Implied Volatility', titlefont=dict(family='Verdana', color='#2A3F5F'), tickfont=dict(family='Verdana', color='#2A3F5F')),
-        hovermode='closest',
-        legend=dict(font=dict(family='Verdana', color='#2A3F5F'), x=0.5, y=-0.4, xanchor='center', yanchor='top', orientation='v'),
-        plot_bgcolor='#F3F6FA',
-        titlefont=dict(size=18),
-        margin=dict(t=60, b=120, l=50, r=50)
-    )
+    Returns:
+        moneyness, ttm, iv_matrix (np.arrays): Grid axes and interpolated IV (one row per TTM).
+    """
+    interpolation = get_interpolator(selected_date, call_put)
+    if interpolation is None:
+        return np.array([]), np.array([]), np.empty((0, 0))
+    interpolator, moneyness_bounds, ttm_bounds = interpolation
+    moneyness = np.linspace(*moneyness_bounds, resolution)
+    ttm = np.linspace(*ttm_bounds, resolution)
+    xi, yi = np.meshgrid(moneyness, ttm)
+    return moneyness, ttm, interpolator(xi, yi)
+
+
+def svi_surface_data(selected_date, call_put, resolution=SURFACE_RESOLUTION):
+    """
+    Evaluates the volatility surface of one option type from the SVI smiles fitted by the IV
+    Lambda, on a resolution x resolution grid spanning the quoted moneyness of every expiry.
+
+    Args:
+        selected_date (str): The selected data collection date.
+        call_put (str): 'CALL' or 'PUT'.
+        resolution (int, optional): Number of moneyness and TTM values of the grid.
+
+    Returns:
+        tuple: Moneyness axis, TTM axis and IV matrix (one row per TTM), or None if fewer
+        than two expiries were fitted.
+    """
+    smiles = get_smiles(table, selected_date)
+    smiles = smiles[smiles['CALL_PUT'] == call_put]
+    if len(smiles) < 2:
+        return None
+    sign = 1 if call_put == 'CALL' else -1
+    bounds = np.exp(sign * np.concatenate([smiles['K_MIN'].to_numpy(), smiles['K_MAX'].to_numpy()]))
+    moneyness = np.linspace(bounds.min(), bounds.max(), resolution)
+    surface = svi_surface(smiles.to_dict(orient='records'), call_put, moneyness, resolution)
+    return surface['MONEYNES'], surface['TTM'], surface['IV']
+
+
+def get_surface_data(selected_date, call_put):
+    """
+    Returns the volatility surface of one option type, evaluating the smiles fitted by the IV
+    Lambda, or reading the grid it precomputed, and interpolating from the raw options only
+    for snapshots stored without either.
+
+    Args:
+        selected_date (str): The selected data collection date.
+        call_put (str): 'CALL' or 'PUT'.
+
+    Returns:
+        moneyness, ttm, iv_matrix (np.arrays): Grid axes and interpolated IV (one row per TTM).
+    """
+    if SURFACE_SOURCE == 'svi':
+        surface = svi_surface_data(selected_date, call_put)
+        if surface is not None:
+            return surface
+
+    surface = get_surface(table, selected_date, call_put)
+    if surface is not None:
+        return surface
+
+    if SURFACE_MODE == 'fixed':
+        return interpolate_iv_fixed(selected_date, call_put)
+
+    options_new = get_item(table, selected_date)
+    filtered_options = options_new[options_new['CALL_PUT'] == call_put]
+
+    moneyness = filtered_options['MONEYNES'].unique()
+    ttm = filtered_options['TTM'].unique()
+    moneyness.sort()
+    ttm.sort()
+
+    _, _, iv_matrix = interpolate_iv(filtered_options, moneyness, ttm)
+    return moneyness, ttm, iv_matrix
 
-    return {'data': traces, 'layout': layout}
 
 @app.callback(
     Output('volatility-surface-graph', 'figure'),
@@ -161,6 +299,7 @@ def update_graph(selected_exp_date, selected_date, comparison_mode, comparison_d
 @app.callback(
     Output('call-volatility-surface-graph', 'figure'),
     [Input('data-collection-date-dropdown', 'value')])
+@timed('dashboard.update_call_vol_surface')
 def update_call_vol_surface(selected_date):
     """
     Callback for updating the call volatility surface graph.
@@ -171,20 +310,14 @@ def update_call_vol_surface(selected_date):
     Returns:
         dict: A dictionary containing the updated data and layout for the graph.
     """
-    options_new = get_item(table, selected_date)
-    filtered_options = options_new[options_new['CALL_PUT'] == 'CALL']
-
-    moneyness = filtered_options['MONEYNES'].unique()
-    ttm = filtered_options['TTM'].unique()
-    moneyness.sort()
-    ttm.sort()
-
-    strikes, ttm, iv_matrix = interpolate_iv(filtered_options, moneyness, ttm)
+    if selected_date is None:
+        raise PreventUpdate
+    moneyness, ttm, iv_matrix = get_surface_data(selected_date, 'CALL')
 
     surface_trace = go.Surface(x=moneyness, y=ttm, z=iv_matrix, colorscale='Viridis')
 
     layout = go.Layout(
-        title='Call Volatility Surface calculated for Meff Options',
+        title=dict(text='Call Volatility Surface calculated for Meff Options', font=dict(size=18)),
         scene=dict(
             xaxis_title='Moneyness',
             yaxis_title='Time to Maturity (TTM)',
@@ -192,7 +325,6 @@ def update_call_vol_surface(selected_date):
             aspectmode='cube'
         ),
         plot_bgcolor='#F3F6FA',
-        titlefont=dict(size=18),
         margin=dict(t=60, b=120, l=50, r=50)
     )
 
@@ -201,6 +333,7 @@ def update_call_vol_surface(selected_date):
 @app.callback(
     Output('put-volatility-surface-graph', 'figure'),
     [Input('data-collection-date-dropdown', 'value')])
+@timed('dashboard.update_put_vol_surface')
 def update_put_vol_surface(selected_date):
     """
     Callback for updating the put volatility surface graph.
@@ -211,20 +344,14 @@ def update_put_vol_surface(selected_date):
     Returns:
         dict: A dictionary containing the updated data and layout for the graph.
     """
-    options_new = get_item(table, selected_date)
-    filtered_options = options_new[options_new['CALL_PUT'] == 'PUT']
-
-    moneyness = filtered_options['MONEYNES'].unique()
-    ttm = filtered_options['TTM'].unique()
-    moneyness.sort()
-    ttm.sort()
-
-    strikes, ttm, iv_matrix = interpolate_iv(filtered_options, moneyness, ttm)
+    if selected_date is None:
+        raise PreventUpdate
+    moneyness, ttm, iv_matrix = get_surface_data(selected_date, 'PUT')
 
     surface_trace = go.Surface(x=moneyness, y=ttm, z=iv_matrix, colorscale='Viridis')
 
     layout = go.Layout(
-        title='Put Volatility Surface calculated for Meff Options',
+        title=dict(text='Put Volatility Surface calculated for Meff Options', font=dict(size=18)),
         scene=dict(
             xaxis_title='Moneyness',
             yaxis_title='Time to Maturity (TTM)',
@@ -232,7 +359,6 @@ def update_put_vol_surface(selected_date):
             aspectmode='cube'
         ),
         plot_bgcolor='#F3F6FA',
-        titlefont=dict(size=18),
         margin=dict(t=60, b=120, l=50, r=50)
     )
 
@@ -240,56 +366,171 @@ def update_put_vol_surface(selected_date):
 
 
 @app.callback(
-    [Output('exp-date-dropdown', 'options'),
-     Output('exp-date-dropdown', 'value')],
+    [Output('data-collection-date-dropdown', 'options'),
+     Output('data-collection-date-dropdown', 'value')],
+    [Input('dates-refresh-interval', 'n_intervals')],
+    [State('data-collection-date-dropdown', 'options'),
+     State('data-collection-date-dropdown', 'value')])
+@timed('dashboard.update_date_dropdown')
+def update_date_dropdown(n_intervals, current_options, selected_date):
+    """
+    Callback filling the data collection date dropdown from the cached date list, on page load
+    and then periodically so that new snapshots show up.
+
+    Args:
+        n_intervals (int): Number of times the refresh interval fired.
+        current_options (list): The options currently shown.
+        selected_date (str): The selected data collection date.
+
+    Returns:
+        tuple: The options and value of the dropdown, dash.no_update for those that did not
+        change so that the graphs are not redrawn.
+    """
+    dates = sorted(get_unique_dates(table))
+    options = [{'label': date, 'value': date} for date in dates]
+    if options == current_options:
+        options = dash.no_update
+    if selected_date in dates or not dates:
+        return options, dash.no_update
+    return options, dates[-1]
+
+
+@app.callback(
+    Output('aggregates-history-graph', 'figure'),
+    [Input('aggregate-metric-dropdown', 'value'),
+     Input('dates-refresh-interval', 'n_intervals')])
+@timed('dashboard.update_aggregates_history')
+def update_aggregates_history(metric, n_intervals):
+    """
+    Callback for updating the history graph of one of the per-expiry summaries, with one line
+    per expiration date over the last AGGREGATES_HISTORY_DAYS days.
+
+    Args:
+        metric (str): The selected summary, a key of AGGREGATE_METRICS.
+        n_intervals (int): Number of times the refresh interval fired.
+
+    Returns:
+        dict: A dictionary containing the updated data and layout for the graph.
+    """
+    today = datetime.today()
+    aggregates = get_aggregates(aggregates_table, (today - timedelta(days=AGGREGATES_HISTORY_DAYS)).strftime('%Y-%m-%d'),
+                                today.strftime('%Y-%m-%d'))
+    traces = []
+    for exp_date, history in aggregates.groupby('EXP_DATE', sort=True):
+        history = history.sort_values('Date')
+        traces.append(go.Scatter(x=history['Date'], y=history[metric], mode='lines+markers', name=f'Expiration: {exp_date}'))
+
+    layout = go.Layout(
+        title=dict(text=f'{AGGREGATE_METRICS[metric]} history calculated for Meff Options', font=dict(size=18)),
+        xaxis=dict(title='Data Collection Date'),
+        yaxis=dict(title=AGGREGATE_METRICS[metric]),
+        hovermode='closest',
+        plot_bgcolor='#F3F6FA',
+        margin=dict(t=60, b=120, l=50, r=50)
+    )
+
+    return {'data': traces, 'layout': layout}
+
+
+def snapshot_store_data(selected_date, options_new, smiles=None):
+    """
+    Packs the columns needed by the smile graph into the compact form kept in the browser:
+    one list per column, with the string columns dictionary encoded as in columnar.py.
+
+    Args:
+        selected_date (str): The data collection date of the options.
+        options_new (DataFrame): DataFrame with options pricing and volatility.
+        smiles (DataFrame, optional): The fitted SVI smiles of the date, see aws_handler.fetch_smiles.
+
+    Returns:
+        dict: The 'date', the number of 'rows' and the 'columns'. Numeric columns are lists
+        with None for missing values, string columns hold their distinct 'values' and the
+        'codes' of every row. The 'futures' price and one dict per fitted smile in 'smiles'
+        are added when the snapshot has them.
+    """
+    columns = {}
+    for name in SNAPSHOT_STORE_COLUMNS:
+        series = options_new[name] if name in options_new else pd.Series([None] * len(options_new), dtype=object)
+        if name in SNAPSHOT_STORE_NUMERIC_COLUMNS:
+            values = pd.to_numeric(series, errors='coerce')
+            columns[name] = values.astype(object).where(values.notna(), None).tolist()
+        else:
+            codes, uniques = pd.factorize(series)
+            columns[name] = {'values': [str(value) for value in uniques], 'codes': codes.tolist()}
+    data = {'date': selected_date, 'rows': len(options_new), 'columns': columns}
+    if smiles is not None and not smiles.empty:
+        data['futures'] = float(smiles['Futures'].iloc[0])
+        data['smiles'] = smiles[list(SNAPSHOT_STORE_SMILE_COLUMNS)].to_dict(orient='records')
+    return data
+
+
+@app.callback(
+    Output('snapshot-store', 'data'),
     [Input('data-collection-date-dropdown', 'value')])
-def update_exp_date_dropdown(selected_date):
+@timed('dashboard.update_snapshot_store')
+def update_snapshot_store(selected_date):
     """
-    Callback for updating the expiration date dropdown options.
+    Callback sending the options of the selected data collection date to the browser, where
+    the smile graph and the expiration dropdowns are filtered without further requests.
 
     Args:
         selected_date (str): The selected data collection date.
 
     Returns:
-        tuple: A tuple containing the options and value for the expiration date dropdown.
+        dict: The snapshot in the form returned by snapshot_store_data.
     """
-    options_df = get_item(table, selected_date)
-    unique_exp_dates = options_df['EXP_DATE'].unique()
-    options = [{'label': exp_date, 'value': exp_date} for exp_date in unique_exp_dates]
-    default_value = unique_exp_dates[0] if len(unique_exp_dates) > 0 else None
-    return options, default_value
+    if selected_date is None:
+        raise PreventUpdate
+    return snapshot_store_data(selected_date, get_item(table, selected_date), get_smiles(table, selected_date))
+
 
 @app.callback(
-    [Output('comparison-date-dropdown', 'options'),
-     Output('comparison-date-dropdown', 'value')],
+    Output('comparison-snapshot-store', 'data'),
     [Input('comparison-mode', 'value'),
-     Input('data-collection-date-dropdown', 'value'),
-     Input('exp-date-dropdown', 'value')])
-def update_comparison_date_dropdown(comparison_mode, selected_date, selected_exp_date):
+     Input('comparison-date-dropdown', 'value')])
+@timed('dashboard.update_comparison_snapshot_store')
+def update_comparison_snapshot_store(comparison_mode, comparison_date):
     """
-    Callback for updating the comparison date dropdown options.
+    Callback sending the options of the comparison data collection date to the browser.
 
     Args:
         comparison_mode (str): The selected comparison mode.
-        selected_date (str): The selected data collection date.
-        selected_exp_date (str): The selected expiration date.
+        comparison_date (str): The selected comparison date.
 
     Returns:
-        tuple: A tuple containing the options and value for the comparison date dropdown.
+        dict: The snapshot in the form returned by snapshot_store_data, or None when not
+        comparing data collection dates.
     """
-    if comparison_mode == 'collection':
-        options = [{'label': date, 'value': date} for date in unique_dates if date != selected_date]
-        default_value = options[0]['value'] if len(options) > 0 else None
-    elif comparison_mode == 'expiration':
-        options_df = get_item(table, selected_date)
-        unique_exp_dates = options_df['EXP_DATE'].unique()
-        options = [{'label': exp_date, 'value': exp_date} for exp_date in unique_exp_dates if exp_date != selected_exp_date]
-        default_value = options[0]['value'] if len(options) > 0 else None
-    else:
-        options = []
-        default_value = None
-
-    return options, default_value
+    if comparison_mode != 'collection' or comparison_date is None:
+        return None
+    return snapshot_store_data(comparison_date, get_item(table, comparison_date), get_smiles(table, comparison_date))
+
+
+# The expiration dropdowns and the smile graph are computed in the browser from the stores,
+# see assets/dashboard.js.
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='expDateDropdown'),
+    [Output('exp-date-dropdown', 'options'),
+     Output('exp-date-dropdown', 'value')],
+    [Input('snapshot-store', 'data')])
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='comparisonDateDropdown'),
+    [Output('comparison-date-dropdown', 'options'),
+     Output('comparison-date-dropdown', 'value')],
+    [Input('comparison-mode', 'value'),
+     Input('snapshot-store', 'data'),
+     Input('exp-date-dropdown', 'value')],
+    [State('data-collection-date-dropdown', 'options')])
+
+app.clientside_callback(
+    ClientsideFunction(namespace='dashboard', function_name='smileFigure'),
+    Output('volatility-smile-graph', 'figure'),
+    [Input('exp-date-dropdown', 'value'),
+     Input('comparison-mode', 'value'),
+     Input('comparison-date-dropdown', 'value'),
+     Input('snapshot-store', 'data'),
+     Input('comparison-snapshot-store', 'data')])
 
 if __name__ == '__main__':
     app.run_server(os.getenv("HOST", "0.0.0.0"), port=os.getenv("PORT", 8080))
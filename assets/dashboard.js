@@ -0,0 +1,156 @@
+// Clientside callbacks of the dashboard. They work on the snapshots sent by
+// update_snapshot_store and update_comparison_snapshot_store (see snapshot_store_data in
+// app.py), so that changing the expiration date or the comparison mode needs no request.
+var SVI_CURVE_POINTS = 100;
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    dashboard: {
+        /**
+         * Returns the values of a column of a snapshot, decoding dictionary encoded columns.
+         */
+        column: function (snapshot, name) {
+            var column = snapshot.columns[name];
+            if (Array.isArray(column)) {
+                return column;
+            }
+            return column.codes.map(function (code) {
+                return code < 0 ? null : column.values[code];
+            });
+        },
+
+        /**
+         * Returns the expiration dates of a snapshot in the order they were scraped.
+         */
+        expDates: function (snapshot) {
+            if (!snapshot || !snapshot.rows) {
+                return [];
+            }
+            return snapshot.columns.EXP_DATE.values;
+        },
+
+        expDateDropdown: function (snapshot) {
+            var expDates = window.dash_clientside.dashboard.expDates(snapshot);
+            var options = expDates.map(function (expDate) {
+                return {label: expDate, value: expDate};
+            });
+            return [options, expDates.length > 0 ? expDates[0] : null];
+        },
+
+        comparisonDateDropdown: function (comparisonMode, snapshot, selectedExpDate, dateOptions) {
+            var selectedDate = snapshot ? snapshot.date : null;
+            var options = [];
+            if (comparisonMode === 'collection') {
+                options = (dateOptions || []).filter(function (option) {
+                    return option.value !== selectedDate;
+                });
+            } else if (comparisonMode === 'expiration') {
+                options = window.dash_clientside.dashboard.expDates(snapshot).filter(function (expDate) {
+                    return expDate !== selectedExpDate;
+                }).map(function (expDate) {
+                    return {label: expDate, value: expDate};
+                });
+            }
+            return [options, options.length > 0 ? options[0].value : null];
+        },
+
+        /**
+         * Evaluates the SVI smile fitted by the IV Lambda (see svi.py) on evenly spaced
+         * log-moneyness between its lowest and highest quoted strikes.
+         */
+        sviCurve: function (smile, futures, points) {
+            var strikes = [];
+            var ivs = [];
+            for (var i = 0; i < points; i++) {
+                var k = smile.K_MIN + (smile.K_MAX - smile.K_MIN) * i / (points - 1);
+                var y = k - smile.M;
+                var w = smile.A + smile.B * (smile.RHO * y + Math.sqrt(y * y + smile.SIGMA * smile.SIGMA));
+                strikes.push(futures * Math.exp(k));
+                ivs.push(w > 0 ? Math.sqrt(w / smile.TTM) * 100 : null);
+            }
+            return {x: strikes, y: ivs};
+        },
+
+        /**
+         * Builds the call and put smile traces of one expiration date of a snapshot, followed by
+         * the fitted SVI curves when the snapshot has them.
+         */
+        smileTraces: function (snapshot, selectedExpDate, traceColor, comparisonLabel) {
+            var dashboard = window.dash_clientside.dashboard;
+            var strikes = {CALL: [], PUT: []};
+            var ivs = {CALL: [], PUT: []};
+            if (selectedExpDate && snapshot && snapshot.rows) {
+                var expDates = dashboard.column(snapshot, 'EXP_DATE');
+                var callPut = dashboard.column(snapshot, 'CALL_PUT');
+                var strike = snapshot.columns.STRIKE;
+                var iv = snapshot.columns.IV;
+                for (var i = 0; i < snapshot.rows; i++) {
+                    if (expDates[i] === selectedExpDate && strikes[callPut[i]]) {
+                        strikes[callPut[i]].push(strike[i]);
+                        ivs[callPut[i]].push(iv[i]);
+                    }
+                }
+            }
+            var sides = [['CALL', 'Call', traceColor[0]], ['PUT', 'Put', traceColor[1]]];
+            var traces = sides.map(function (side) {
+                return {
+                    type: 'scatter',
+                    x: strikes[side[0]],
+                    y: ivs[side[0]],
+                    mode: 'markers+lines',
+                    name: side[1] + ' Options (Collection: ' + comparisonLabel + ', Expiration: ' + selectedExpDate + ')',
+                    marker: {color: side[2], size: 10, line: {width: 2, color: 'black'}}
+                };
+            });
+            if (!snapshot || !snapshot.smiles) {
+                return traces;
+            }
+            sides.forEach(function (side) {
+                var smile = snapshot.smiles.find(function (s) {
+                    return s.EXP_DATE === selectedExpDate && s.CALL_PUT === side[0];
+                });
+                if (smile) {
+                    var curve = dashboard.sviCurve(smile, snapshot.futures, SVI_CURVE_POINTS);
+                    traces.push({
+                        type: 'scatter',
+                        x: curve.x,
+                        y: curve.y,
+                        mode: 'lines',
+                        name: side[1] + ' SVI fit (Collection: ' + comparisonLabel + ', Expiration: ' + selectedExpDate + ')',
+                        line: {color: side[2], dash: 'dash', width: 2}
+                    });
+                }
+            });
+            return traces;
+        },
+
+        smileFigure: function (selectedExpDate, comparisonMode, comparisonDate, snapshot, comparisonSnapshot) {
+            var dashboard = window.dash_clientside.dashboard;
+            var selectedDate = snapshot ? snapshot.date : null;
+            var comparisonColor = ['rgba(0, 80, 0, .8)', 'rgba(80, 0, 80, .8)'];
+            var traces = dashboard.smileTraces(snapshot, selectedExpDate,
+                                               ['rgba(0, 180, 0, .8)', 'rgba(180, 0, 180, .8)'], selectedDate);
+
+            if (comparisonMode !== 'none' && comparisonDate !== null && comparisonDate !== undefined) {
+                if (comparisonMode === 'collection') {
+                    traces = traces.concat(dashboard.smileTraces(comparisonSnapshot, selectedExpDate, comparisonColor,
+                                                                 comparisonDate));
+                } else if (comparisonMode === 'expiration') {
+                    traces = traces.concat(dashboard.smileTraces(snapshot, comparisonDate, comparisonColor,
+                                                                 comparisonDate));
+                }
+            }
+
+            var axisFont = {family: 'Verdana', color: '#2A3F5F'};
+            var layout = {
+                title: {text: 'Volatility Skew calculated for Meff Options', font: {size: 18}},
+                xaxis: {title: {text: 'Strike', font: axisFont}, tickfont: axisFont},
+                yaxis: {title: {text: 'Implied Volatility', font: axisFont}, tickfont: axisFont},
+                hovermode: 'closest',
+                legend: {font: axisFont, x: 0.5, y: -0.4, xanchor: 'center', yanchor: 'top', orientation: 'v'},
+                plot_bgcolor: '#F3F6FA',
+                margin: {t: 60, b: 120, l: 50, r: 50}
+            };
+            return {data: traces, layout: layout};
+        }
+    }
+});
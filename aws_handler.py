@@ -1,44 +1,392 @@
 import os
+import threading
+import time
+from datetime import datetime
 import boto3
+import numpy as np
 import pandas as pd
+from meff.columnar import options_frame
+from meff import split_storage
+from meff.split_storage import DEFAULT_PRODUCT, table_name, index_key, query_slices, slices_frame
+from meff.history import AGGREGATES_TABLE_NAME, query_aggregates
+from meff.metrics import stage, timed, capacity_kwargs, consumed_capacity
+from meff.cache import LRUCache
 
-def get_unique_dates(table):
+GET_ITEM_CACHE_MAX_BYTES = int(os.environ.get("GET_ITEM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+GET_ITEM_CACHE_TODAY_TTL = float(os.environ.get("GET_ITEM_CACHE_TODAY_TTL", 60))
+DATE_INDEX_KEY = 'INDEX#DATES'
+DATES_CACHE_TTL = float(os.environ.get("DATES_CACHE_TTL", 300))
+# Period of the background refresh of the date list started by start_dates_refresher.
+DATES_REFRESH_INTERVAL = float(os.environ.get("DATES_REFRESH_INTERVAL", DATES_CACHE_TTL))
+AGGREGATES_COLUMNS = ['Date', 'EXP_DATE', 'TTM', 'ATM_IV', 'RR25', 'BF25', 'SKEW']
+SMILE_COLUMNS = ['EXP_DATE', 'CALL_PUT', 'TTM', 'A', 'B', 'RHO', 'M', 'SIGMA', 'RMSE', 'K_MIN', 'K_MAX']
+
+
+def frame_bytes(frame):
+    """
+    Returns the memory footprint of a DataFrame in bytes, the size of the item_cache entries.
+    """
+    return int(frame.memory_usage(deep=True).sum())
+
+
+item_cache = LRUCache(GET_ITEM_CACHE_MAX_BYTES, size=frame_bytes)
+dates_cache = {'dates': set(), 'fetched_at': None, 'lock': threading.Lock(), 'refresh_lock': threading.Lock()}
+dates_refresher = None
+
+
+def scan_unique_dates(table):
     """
-    Fetches unique dates from the provided DynamoDB table.
+    Fetches the partition keys with a projection-only scan, used when the date index item
+    is missing.
 
     Args:
         table(boto3 table): The DynamoDB table to fetch unique dates from.
 
     Returns:
-        set: A set containing unique dates found in the DynamoDB table.
+        set: A set containing the partition keys of the default product.
     """
     unique_dates = set()
-    response = table.scan()
-    for item in response['Items']:
-        unique_dates.add(item['Date'])
-    while 'LastEvaluatedKey' in response:
-        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
+    scan_kwargs = {'ProjectionExpression': '#d', 'ExpressionAttributeNames': {'#d': 'Date'}}
+    while True:
+        response = table.scan(**scan_kwargs)
         for item in response['Items']:
-            unique_dates.add(item['Date'])
+            # Index items and the '<product>#<date>' keys of other MEFF products contain a '#'.
+            if '#' not in item['Date']:
+                unique_dates.add(item['Date'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
     return unique_dates
 
-def get_item(table, date):
+
+@timed('dynamodb.get_dates')
+def fetch_unique_dates(table):
+    """
+    Fetches the partition keys from the date index item maintained by the scraping Lambda,
+    falling back to a projection-only scan.
+
+    Args:
+        table(boto3 table): The DynamoDB table to fetch unique dates from.
+
+    Returns:
+        set: A set containing the partition keys of the default product.
+    """
+    response = table.get_item(Key=index_key(DATE_INDEX_KEY))
+    item = response.get('Item')
+    if item and item.get('Dates'):
+        return set(item['Dates'])
+    return scan_unique_dates(table)
+
+
+def refresh_unique_dates(table, max_age=0.0):
+    """
+    Fetches the date list into the cache. Only one refresh runs at a time, callers arriving
+    while it runs wait for it and then skip their own fetch.
+
+    Args:
+        table(boto3 table): The DynamoDB table to fetch unique dates from.
+        max_age (float): Skip the fetch if the cached list is younger than this many seconds.
+    """
+    with dates_cache['refresh_lock']:
+        fetched_at = dates_cache['fetched_at']
+        if fetched_at is not None and time.monotonic() - fetched_at < max_age:
+            return
+        dates = fetch_unique_dates(table)
+        with dates_cache['lock']:
+            # Stored dates are never deleted, refreshes only add the new ones.
+            dates_cache['dates'] |= dates
+            dates_cache['fetched_at'] = time.monotonic()
+
+
+def refresh_unique_dates_quietly(table, max_age=0.0):
+    """
+    Runs refresh_unique_dates from a background thread, logging failures and keeping the
+    current list.
+    """
+    try:
+        refresh_unique_dates(table, max_age)
+    except Exception as e:
+        print(f"Error refreshing the date list: {e}")
+
+
+def get_unique_dates(table):
+    """
+    Returns the partition keys of a DynamoDB table that uses "Date" as a partition key.
+
+    Only the first call waits for the list. Afterwards the cached list is returned right away,
+    and once it is older than DATES_CACHE_TTL seconds a refresh is started in the background.
+
+    Args:
+        table(boto3 table): The DynamoDB table to fetch unique dates from.
+
+    Returns:
+        set: A set containing the partition keys of the default product.
+    """
+    with dates_cache['lock']:
+        fetched_at = dates_cache['fetched_at']
+    if fetched_at is None:
+        refresh_unique_dates(table, DATES_CACHE_TTL)
+    elif time.monotonic() - fetched_at >= DATES_CACHE_TTL and not dates_cache['refresh_lock'].locked():
+        threading.Thread(target=refresh_unique_dates_quietly, args=(table, DATES_CACHE_TTL), daemon=True).start()
+    with dates_cache['lock']:
+        return set(dates_cache['dates'])
+
+
+def start_dates_refresher(table, interval=DATES_REFRESH_INTERVAL):
+    """
+    Starts a daemon thread loading the date list and refreshing it every interval seconds,
+    so that the caller does not wait for the first fetch and new dates show up without a restart.
+    Later calls return the already running thread.
+
+    Args:
+        table(boto3 table): The DynamoDB table to fetch unique dates from.
+        interval (float): Seconds between two refreshes.
+
+    Returns:
+        threading.Thread: The refresher thread.
+    """
+    global dates_refresher
+
+    def refresh_periodically():
+        while True:
+            refresh_unique_dates_quietly(table, interval / 2)
+            time.sleep(interval)
+
+    with dates_cache['lock']:
+        if dates_refresher is None:
+            dates_refresher = threading.Thread(target=refresh_periodically, name='dates-refresher', daemon=True)
+            dates_refresher.start()
+        return dates_refresher
+
+
+def snapshot_ttl(date):
+    """
+    Builds the cache TTL rule for data belonging to a snapshot date.
+
+    Args:
+        date (str): The snapshot date.
+
+    Returns:
+        callable: Function returning None (keep until evicted) for loaded past dates and
+        GET_ITEM_CACHE_TODAY_TTL for today, future dates and missing data.
+    """
+    today = datetime.today().strftime('%Y-%m-%d')
+
+    def ttl(frame):
+        if frame.empty or date >= today:
+            return GET_ITEM_CACHE_TODAY_TTL
+        return None
+
+    return ttl
+
+
+def expiry_dates(options):
+    """
+    Returns the 'EXP_DATE' of the options as 'YYYY-MM-DD' strings. Raw items, not enriched yet,
+    don't have that column, their expiry is read from 'DATA-TIPO', e.g. 'OCE20230616'.
+    """
+    if 'EXP_DATE' in options.columns:
+        return options['EXP_DATE']
+    expiry = options['DATA-TIPO'].str[3:11]
+    return expiry.str[:4] + '-' + expiry.str[4:6] + '-' + expiry.str[6:8]
+
+
+def fetch_item(table, date, exp_date=None):
     """
     Fetches an item from the provided DynamoDB table using the given date as the key.
 
     Args:
         table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the item from.
         date (str): The date used as a key to fetch the item.
+        exp_date (str, optional): Only return the options of this expiration date. In the split
+            layout only the slices of that expiry are read.
 
     Returns:
         pandas.DataFrame: A DataFrame containing the fetched item if it exists, otherwise an empty DataFrame.
     """
+    with stage('dynamodb.get_item', layout=split_storage.STORAGE_LAYOUT) as read:
+        if split_storage.STORAGE_LAYOUT == 'split':
+            options = slices_frame(query_slices(table, date, prefix=exp_date))
+            read.set(rows=len(options))
+            return options
+
+        response = table.get_item(
+            Key={
+                'Date': date
+            },
+            **capacity_kwargs()
+        )
+        read.set(capacity=consumed_capacity(response))
+        item = response.get('Item')
+        if item:
+            options = options_frame(item)
+            if exp_date is not None and not options.empty:
+                options = options[expiry_dates(options) == exp_date].reset_index(drop=True)
+            read.set(rows=len(options))
+            return options
+        return pd.DataFrame()
+
+
+def get_item(table, date, exp_date=None):
+    """
+    Fetches an item from the provided DynamoDB table through the process-local cache.
+
+    Past dates never change, so they stay cached until evicted. Today's date, future dates
+    and missing items expire after GET_ITEM_CACHE_TODAY_TTL seconds. The returned DataFrame
+    is shared between callers and must not be modified in place.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the item from.
+        date (str): The date used as a key to fetch the item.
+        exp_date (str, optional): Only return the options of this expiration date.
+
+    Returns:
+        pandas.DataFrame: A DataFrame containing the fetched item if it exists, otherwise an empty DataFrame.
+    """
+    if exp_date is not None and split_storage.STORAGE_LAYOUT != 'split':
+        # A single-item snapshot is read whole anyway, so filter the cached one.
+        options = get_item(table, date)
+        if options.empty:
+            return options
+        return options[expiry_dates(options) == exp_date]
+    return item_cache.get((getattr(table, 'name', id(table)), date, exp_date), lambda: fetch_item(table, date, exp_date),
+                          ttl=snapshot_ttl(date))
+
+
+@timed('dynamodb.get_surfaces')
+def fetch_surfaces(table, date):
+    """
+    Fetches the volatility surfaces precomputed by the IV Lambda for the given date.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the surfaces from.
+        date (str): The date used as a key to fetch the item.
+
+    Returns:
+        pandas.DataFrame: One row per grid point with 'CALL_PUT', 'TTM', 'MONEYNES' and 'IV' columns,
+        empty if the item has no surfaces.
+    """
     response = table.get_item(
-        Key={
-            'Date': date
-        }
+        Key=index_key(date),
+        ProjectionExpression='#s',
+        ExpressionAttributeNames={'#s': 'Surfaces'}
     )
-    item = response.get('Item')
-    if item:
-        return pd.DataFrame(item["Options"])
-    return pd.DataFrame()
\ No newline at end of file
+    surfaces = response.get('Item', {}).get('Surfaces') or {}
+    frames = []
+    for call_put, surface in surfaces.items():
+        moneyness, ttm = np.meshgrid(np.array(surface['MONEYNES'], dtype=float), np.array(surface['TTM'], dtype=float))
+        iv = np.array([[np.nan if x is None else float(x) for x in row] for row in surface['IV']])
+        frames.append(pd.DataFrame({
+            'CALL_PUT': call_put,
+            'TTM': ttm.ravel(),
+            'MONEYNES': moneyness.ravel(),
+            'IV': iv.ravel(),
+        }))
+    if frames:
+        return pd.concat(frames, ignore_index=True)
+    return pd.DataFrame()
+
+
+def get_surface(table, date, call_put):
+    """
+    Fetches a precomputed volatility surface through the process-local cache.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the surface from.
+        date (str): The date used as a key to fetch the item.
+        call_put (str): 'CALL' or 'PUT'.
+
+    Returns:
+        tuple: Moneyness axis, TTM axis and IV matrix (one row per TTM), or None if the
+        surface was not precomputed for this date.
+    """
+    surfaces = item_cache.get((getattr(table, 'name', id(table)), date, 'Surfaces'),
+                              lambda: fetch_surfaces(table, date), ttl=snapshot_ttl(date))
+    if surfaces.empty:
+        return None
+    surface = surfaces[surfaces['CALL_PUT'] == call_put]
+    if surface.empty:
+        return None
+    grid = surface.pivot_table(index='TTM', columns='MONEYNES', values='IV', aggfunc='mean', dropna=False)
+    return grid.columns.to_numpy(), grid.index.to_numpy(), grid.to_numpy()
+
+
+def fetch_smiles(table, date):
+    """
+    Fetches the SVI smiles fitted by the IV Lambda for the given date.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the smiles from.
+        date (str): The date used as a key to fetch the item.
+
+    Returns:
+        pandas.DataFrame: One row per smile with the SMILE_COLUMNS and the 'Futures' price of the
+        snapshot, as floats, empty if the item has no smiles.
+    """
+    response = table.get_item(
+        Key=index_key(date),
+        ProjectionExpression='Futures, #s',
+        ExpressionAttributeNames={'#s': 'Smiles'}
+    )
+    item = response.get('Item', {})
+    smiles = pd.DataFrame(item.get('Smiles') or [], columns=SMILE_COLUMNS)
+    for column in SMILE_COLUMNS[2:]:
+        smiles[column] = pd.to_numeric(smiles[column], errors='coerce')
+    smiles['Futures'] = float(item['Futures']) if 'Futures' in item else np.nan
+    return smiles
+
+
+def get_smiles(table, date):
+    """
+    Fetches the fitted SVI smiles of a date through the process-local cache.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table to fetch the smiles from.
+        date (str): The date used as a key to fetch the item.
+
+    Returns:
+        pandas.DataFrame: As returned by fetch_smiles.
+    """
+    return item_cache.get((getattr(table, 'name', id(table)), date, 'Smiles'),
+                          lambda: fetch_smiles(table, date), ttl=snapshot_ttl(date))
+
+
+def fetch_aggregates(table, start, end, product=DEFAULT_PRODUCT):
+    """
+    Queries the per-expiry summaries of a product between two dates.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The aggregates table.
+        start (str): First date, format 'YYYY-MM-DD'.
+        end (str): Last date, format 'YYYY-MM-DD', inclusive.
+        product (str, optional): The MEFF product.
+
+    Returns:
+        pandas.DataFrame: One row per date and expiry with the AGGREGATES_COLUMNS, as floats.
+    """
+    with stage('dynamodb.query_aggregates') as read:
+        rows = [dict(expiry, Date=item['Date']) for item in query_aggregates(table, product, start, end)
+                for expiry in item.get('Expiries', [])]
+        read.set(rows=len(rows))
+    aggregates = pd.DataFrame(rows, columns=AGGREGATES_COLUMNS)
+    for column in AGGREGATES_COLUMNS[2:]:
+        aggregates[column] = pd.to_numeric(aggregates[column], errors='coerce')
+    return aggregates
+
+
+def get_aggregates(table, start, end, product=DEFAULT_PRODUCT):
+    """
+    Returns the per-expiry summaries of a product through the process-local cache. The
+    latest date may still change, so the result expires after GET_ITEM_CACHE_TODAY_TTL seconds.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The aggregates table.
+        start (str): First date, format 'YYYY-MM-DD'.
+        end (str): Last date, format 'YYYY-MM-DD', inclusive.
+        product (str, optional): The MEFF product.
+
+    Returns:
+        pandas.DataFrame: As returned by fetch_aggregates.
+    """
+    return item_cache.get(('aggregates', product, start, end), lambda: fetch_aggregates(table, start, end, product),
+                          ttl=GET_ITEM_CACHE_TODAY_TTL)
@@ -0,0 +1,60 @@
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+
+
+class LocalTable:
+    """
+    In-memory stand-in for a DynamoDB table with a 'Date' partition key. Items are kept in
+    their wire format and go through the boto3 type serializer and deserializer on every
+    write and read, so that the marshalling cost of the SDK is part of what is measured.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = {}
+
+    def put_item(self, Item, **kwargs):
+        self.items[Item['Date']] = {name: serializer.serialize(value) for name, value in Item.items()}
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        # Extra arguments such as ReturnConsumedCapacity are accepted and ignored.
+        stored = self.items.get(Key['Date'])
+        if stored is None:
+            return {}
+        if ProjectionExpression is not None:
+            names = [(ExpressionAttributeNames or {}).get(name, name) for name in ProjectionExpression.split(',')]
+            stored = {name: value for name, value in stored.items() if name in names}
+        return {'Item': {name: deserializer.deserialize(value) for name, value in stored.items()}}
+
+    def scan(self, **kwargs):
+        return {'Items': [{'Date': key} for key in self.items]}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, **kwargs):
+        # Only the 'ADD Dates :d' update of the date index is supported.
+        item = self.get_item(Key).get('Item', {'Date': Key['Date']})
+        item['Dates'] = set(item.get('Dates', set())) | set(ExpressionAttributeValues[':d'])
+        self.put_item(item)
+        return {}
+
+
+class LocalDynamoDB:
+    """
+    In-memory stand-in for the boto3 DynamoDB service resource.
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def Table(self, name):
+        return self.tables.setdefault(name, LocalTable(name))
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            items = [table.get_item(Key).get('Item') for Key in request['Keys']]
+            responses[name] = [item for item in items if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
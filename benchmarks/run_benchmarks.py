@@ -0,0 +1,270 @@
+"""
+Offline benchmark suite of the scrape, enrich, store and serve stages.
+
+Every stage runs against the recorded MEFF pages of lambda_scrap/fixtures, scaled to several
+chain sizes, and against an in-memory DynamoDB stand-in (see local_dynamodb.py) or the local
+SQLite storage backend (see storage.py, --storage), so no network access is needed. Results are printed as JSON, and can be compared with the output
+of a previous run to catch regressions:
+
+    python benchmarks/run_benchmarks.py --output baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import boto3
+from local_dynamodb import LocalDynamoDB
+from meff import columnar, scrap, svi
+from meff.storage import SQLiteResource
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRAP_DIR = os.path.join(ROOT_DIR, 'lambda_scrap')
+IV_DIR = os.path.join(ROOT_DIR, 'lambda_IV_from_dynamo')
+API_DIR = os.path.join(ROOT_DIR, 'API')
+FIXTURE = os.path.join(SCRAP_DIR, 'fixtures', 'meff_miniibex35.html')
+SIZES = (0.25, 1, 4)
+# Benchmarks slower than the baseline by more than this fraction are reported as regressions.
+REGRESSION_THRESHOLD = 0.2
+
+
+def import_from(directory, name):
+    """
+    Imports a module of one of the deployables. They share module names (app...), so the
+    modules of the directory are dropped from sys.modules first. The modules they share are
+    imported from the installed meff package.
+    """
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.py'):
+            sys.modules.pop(file_name[:-3], None)
+    sys.path.insert(0, directory)
+    try:
+        return importlib.import_module(name)
+    finally:
+        sys.path.remove(directory)
+
+
+def scaled_page(content, factor):
+    """
+    Scales the option chain of a recorded page. Fractions keep an evenly spaced subset of the
+    rows, larger factors repeat the chain with the expiries moved one year further each time.
+    Expiries are moved past the current year so that every option is alive.
+
+    Args:
+        content (bytes): The recorded HTML page.
+        factor (float): The scaling factor of the chain.
+
+    Returns:
+        bytes: The scaled page.
+    """
+    html = content.decode('utf-8')
+    rows = re.findall(r'<tr data-tipo="O[CP]E\d{8}">.*?</tr>\n?', html, flags=re.S)
+    first_year = min(int(re.search(r'O[CP]E(\d{4})', row).group(1)) for row in rows)
+    shift = datetime.today().year + 1 - first_year
+    if factor < 1:
+        scaled = rows[::round(1 / factor)]
+        copies = [(scaled, shift)]
+    else:
+        copies = [(rows, shift + copy) for copy in range(int(factor))]
+    chain = ''.join(re.sub(r'(O[CP]E)(\d{4})', lambda m: f"{m.group(1)}{int(m.group(2)) + years}", row)
+                    for chunk, years in copies for row in chunk)
+    start = html.index(rows[0])
+    end = html.index(rows[-1]) + len(rows[-1])
+    return (html[:start] + chain + html[end:]).encode('utf-8')
+
+
+def measure(function, setup=None, repeat=5):
+    """
+    Times a function, running setup before every call outside of the timed region.
+
+    Returns:
+        dict: 'min_ms' and 'median_ms' of the calls, or 'error' if the function raised.
+    """
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        try:
+            function()
+        except Exception as e:
+            return {'error': f"{type(e).__name__}: {str(e).splitlines()[0] if str(e) else ''}"}
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': round(min(timings), 3), 'median_ms': round(statistics.median(timings), 3)}
+
+
+def run(sizes=SIZES, repeat=5, storage='memory'):
+    """
+    Runs every benchmark at every chain size.
+
+    Args:
+        sizes (tuple): Scaling factors of the recorded chain.
+        repeat (int): Number of timed calls per benchmark, 1 for the QuantLib IV solver.
+        storage (str): 'memory' for the in-memory stand-in, 'sqlite' for a temporary SQLite file.
+
+    Returns:
+        list: One dict per benchmark and size, with the 'benchmark' name, the number of option
+        'rows' and the timings returned by measure.
+    """
+    # The deployables build their boto3 resources at import time, they all get the stand-in.
+    if storage == 'sqlite':
+        local = SQLiteResource(os.path.join(tempfile.mkdtemp(), 'meff.sqlite3'))
+    else:
+        local = LocalDynamoDB()
+    boto3.resource = lambda *args, **kwargs: local
+    boto3.session.Session.resource = lambda self, *args, **kwargs: local
+
+    # One date per chain size, listed in the date index as the scraping Lambda does.
+    dates = [f"2000-01-{index + 1:02d}" for index in range(len(sizes))]
+    table = local.Table('MeffScrapping')
+    table.update_item(Key={'Date': 'INDEX#DATES'}, UpdateExpression='ADD Dates :d',
+                      ExpressionAttributeValues={':d': set(dates)})
+
+    lambda_iv = import_from(IV_DIR, 'lambda_iv_from_dynamo')
+    add_variables = sys.modules['add_variables']
+    dashboard = import_from(ROOT_DIR, 'app')
+    aws_handler = sys.modules['aws_handler']
+    api = import_from(API_DIR, 'app')
+    client = api.app.test_client()
+
+    with open(FIXTURE, 'rb') as f:
+        recorded = f.read()
+
+    results = []
+    for date, factor in zip(dates, sizes):
+        content = scaled_page(recorded, factor)
+        scraper = scrap.MeffScraper(None)
+        scraper.parse(content)
+        scraper.extract_futures()
+        scraper.extract_options()
+        raw, futures = scraper.options, scraper.futuros
+        item = {'Date': date, 'Futures': Decimal(str(futures))}
+        enriched_item, _, _ = lambda_iv.enrich_item(item, raw.copy(), now=datetime.today(), table=table)
+        table.put_item(Item=enriched_item)
+        enriched = columnar.options_frame(enriched_item)
+        enriched = enriched.astype({name: float for name in ('STRIKE', 'ANT', 'IV', 'TTM', 'MONEYNES')})
+        calls = enriched[enriched['CALL_PUT'] == 'CALL']
+
+        def parse(parser):
+            page = scrap.MeffScraper(None, parser=parser)
+            page.parse(content)
+            page.extract_futures()
+            page.extract_options()
+
+        def solve(engine):
+            add_variables.adding_variables(raw.copy(), futures, iv_engine=engine).run()
+
+        def put_get(encoding):
+            stored = dict(item, Date=f"write-{encoding}")
+            if encoding == 'columnar':
+                stored['Columns'] = columnar.encode_options(enriched)
+            else:
+                stored['Options'] = lambda_iv.convert_floats_to_decimals(enriched.copy()).to_dict(orient='records')
+            table.put_item(Item=stored)
+            columnar.options_frame(table.get_item(Key={'Date': stored['Date']})['Item'])
+
+        def clear_dashboard_caches():
+            aws_handler.item_cache.clear()
+            dashboard.interpolator_cache.clear()
+
+        benchmarks = [
+            ('scrape.parse_lxml', lambda: parse('lxml'), None),
+            ('scrape.parse_bs4', lambda: parse('bs4'), None),
+            ('enrich.iv_vectorized', lambda: solve('vectorized'), None),
+            ('enrich.iv_quantlib', lambda: solve('quantlib'), None),
+            ('enrich.item', lambda: lambda_iv.enrich_item(item, raw.copy(), now=datetime.today(), table=table), None),
+            ('enrich.svi_fit', lambda: svi.fit_smiles(enriched, futures), None),
+            ('store.decimal_conversion',
+             lambda: lambda_iv.convert_floats_to_decimals(enriched.copy()).to_dict(orient='records'), None),
+            ('store.columnar_encoding', lambda: columnar.encode_options(enriched), None),
+            ('store.put_get_list', lambda: put_get('list'), None),
+            ('store.put_get_columnar', lambda: put_get('columnar'), None),
+            ('dashboard.interpolate_iv',
+             lambda: dashboard.interpolate_iv(calls, calls['MONEYNES'].unique(), calls['TTM'].unique()), None),
+            ('dashboard.get_item', lambda: aws_handler.get_item(table, date), clear_dashboard_caches),
+            ('dashboard.date_dropdown', lambda: dashboard.update_date_dropdown(0, [], None), None),
+            ('dashboard.snapshot_store', lambda: dashboard.update_snapshot_store(date), clear_dashboard_caches),
+            ('dashboard.call_surface_graph', lambda: dashboard.update_call_vol_surface(date), clear_dashboard_caches),
+            ('api.get_item_json_uncached', lambda: client.get(f'/get_item?date={date}'), api.response_cache.clear),
+            ('api.get_item_json', lambda: client.get(f'/get_item?date={date}'), None),
+            ('api.get_item_csv', lambda: client.get(f'/get_item?date={date}&format=csv'), None),
+            ('api.get_item_gzip', lambda: client.get(f'/get_item?date={date}', headers={'Accept-Encoding': 'gzip'}),
+             None),
+        ]
+        for name, function, setup in benchmarks:
+            result = measure(function, setup, repeat=1 if name == 'enrich.iv_quantlib' else repeat)
+            results.append(dict({'benchmark': name, 'rows': len(raw)}, **result))
+            print(f"{name:<32} {len(raw):>6} rows {result.get('median_ms', result.get('error'))}", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares the median timings with those of a previous run.
+
+    Returns:
+        list: The benchmarks whose median grew by more than threshold, with both timings, and
+        those that failed, with their error.
+    """
+    previous = {(result['benchmark'], result['rows']): result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        before = previous.get((result['benchmark'], result['rows']), {}).get('median_ms')
+        if 'error' in result:
+            regressions.append({'benchmark': result['benchmark'], 'rows': result['rows'],
+                                'baseline_ms': before, 'error': result['error']})
+        elif before and result.get('median_ms') and result['median_ms'] > before * (1 + threshold):
+            regressions.append({'benchmark': result['benchmark'], 'rows': result['rows'],
+                                'baseline_ms': before, 'median_ms': result['median_ms']})
+    return regressions
+
+
+def commit():
+    """
+    Returns the current git commit, or None outside of a git checkout.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=SIZES, help='scaling factors of the chain')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per benchmark')
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='memory', help='storage backend')
+    parser.add_argument('--output', help='write the results to this file instead of stdout')
+    parser.add_argument('--compare', help='results of a previous run, exits with 1 on regressions')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    report = {
+        'commit': commit(),
+        'python': platform.python_version(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+    }
+    # The stages print their own logs, stdout is kept for the JSON report.
+    with contextlib.redirect_stdout(sys.stderr):
+        report['results'] = run(tuple(args.sizes), args.repeat, args.storage)
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report['results'], json.load(f), args.threshold)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    sys.exit(1 if report.get('regressions') else 0)
@@ -2,26 +2,161 @@ import pandas as pd
 import numpy as np
 import datetime
 import calculate_iv as iv
+import calculate_iv_vectorized as iv_vec
+from meff.metrics import stage
+
+# Stored snapshots keep three significant digits (see DYNAMODB_CONTEXT in lambda_iv_from_dynamo),
+# and at most three decimals (see meff.columnar.SCALE).
+STORED_SIGNIFICANT_DIGITS = 3
+STORED_DECIMALS = 3
+
+
+def round_significant(values, digits=STORED_SIGNIFICANT_DIGITS):
+    """
+    Rounds values to a number of significant digits, the way they are stored in DynamoDB.
+
+    Args:
+        values (np.array): Values to round.
+        digits (int): Number of significant digits to keep.
+
+    Returns:
+        np.array: The rounded values.
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        magnitude = np.where(values != 0, np.floor(np.log10(np.abs(values))), 0)
+    scale = 10.0 ** (digits - 1 - np.nan_to_num(magnitude))
+    return np.round(values * scale) / scale
+
+
+def parse_prices(values: pd.Series) -> pd.Series:
+    """
+    Converts prices in the format of the MEFF page, e.g. '9.500,00', to floats. The prices of
+    an already enriched snapshot, stored as numbers, are only cast. Missing quotes such as '-'
+    become NaN.
+
+    Args:
+        values (pd.Series): The prices, as scraped or as stored.
+
+    Returns:
+        pd.Series: The prices as floats.
+    """
+    if values.map(lambda value: isinstance(value, str)).all():
+        values = values.str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
+    return pd.to_numeric(values, errors='coerce').astype(float)
 
 
 class adding_variables:
 
-    def __init__(self, options: pd.DataFrame, futuros: float):
+    def __init__(self, options: pd.DataFrame, futuros: float, iv_engine: str = "vectorized",
+                 previous: pd.DataFrame = None, previous_futures: float = None, reuse: bool = True):
+        if iv_engine not in ("vectorized", "quantlib"):
+            raise ValueError(f"Unknown IV engine: {iv_engine}")
         self.futuros = futuros
         self.options = options
+        self.iv_engine = iv_engine
+        self.previous = previous
+        self.previous_futures = previous_futures
+        self.reuse = reuse
+        self.iv_stats = {'reused': 0, 'warm': 0, 'cold': 0}
 
 
     def run(self):
-        self.options = self.options.loc[~self.options['ANT'].str.contains('–|-', regex=True)].copy()
+        self.options = self.options.assign(ANT=parse_prices(self.options['ANT']),
+                                           STRIKE=parse_prices(self.options['STRIKE']))
+        self.options = self.options.loc[self.options['ANT'].notna()].copy()
         self.options.loc[:, "EXP_DATE"] = self.options["DATA-TIPO"].str[3:11]
         self.options["EXP_DATE"] = pd.to_datetime(self.options["EXP_DATE"], format='%Y%m%d')
-        self.options.loc[:, "DTE"] = (self.options["EXP_DATE"] - pd.Timestamp.today()).dt.days
-        self.options.loc[:, "ANT"] = self.options["ANT"].str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
-        self.options.loc[:, "STRIKE"] = self.options["STRIKE"].str.replace(".", "", regex=False).str.replace(",", ".", regex=False)
-        self.options["ANT"] = pd.to_numeric(self.options["ANT"], errors='coerce')
-        self.options["STRIKE"] = pd.to_numeric(self.options["STRIKE"], errors='coerce')
-        self.options.loc[:, "IV"] = self.options.apply(lambda row: iv.calculate_iv(row, self.futuros), axis=1)
+        # Whole days from today to the expiry, the one time to maturity used by the IV solve, the
+        # Greeks, the surfaces, the smiles and the aggregates.
+        self.options.loc[:, "DTE"] = (self.options["EXP_DATE"] - pd.Timestamp.today().normalize()).dt.days
+        self.options.loc[:, "TTM"] = self.options["DTE"] / 365
+        with stage('enrich.iv', engine=self.iv_engine, rows=len(self.options)) as solve:
+            self.options.loc[:, "IV"] = self.calculate_iv()
+            solve.set(**self.iv_stats)
         self.options["EXP_DATE"] = self.options["EXP_DATE"].dt.strftime('%Y-%m-%d')
         self.options.loc[:, "CALL_PUT"] = np.where(self.options["DATA-TIPO"].str[1] == "C", "CALL", "PUT")
-        self.options.loc[:, "TTM"] = self.options["DTE"] / 365
         self.options.loc[:, "MONEYNES"] = np.where(self.options["CALL_PUT"] == "CALL", self.options["STRIKE"] / self.futuros, self.futuros / self.options["STRIKE"])
+        with stage('enrich.greeks', rows=len(self.options)):
+            self.calculate_greeks()
+
+    def calculate_greeks(self):
+        """
+        Adds the 'DELTA', 'GAMMA', 'VEGA' and 'THETA' columns in one batched pass over the
+        solved IVs, see calculate_iv_vectorized.black76_greeks. They are NaN where the IV is.
+        """
+        greeks = iv_vec.black76_greeks(self.futuros, self.options["STRIKE"].to_numpy(dtype=float),
+                                       self.options["TTM"].to_numpy(dtype=float),
+                                       self.options["IV"].to_numpy(dtype=float) / 100,
+                                       (self.options["CALL_PUT"] == "CALL").to_numpy())
+        for name, values in greeks.items():
+            self.options.loc[:, name] = values
+
+    def previous_quotes(self):
+        """
+        Aligns the premium and the IV of the previous enriched snapshot with the current
+        options by contract, i.e. by 'DATA-TIPO' and strike.
+
+        Returns:
+            pd.DataFrame: The previous 'ANT' and 'IV' as floats, NaN where unknown or when there
+            is no previous snapshot.
+        """
+        n = len(self.options)
+        if self.previous is None or self.previous.empty or 'IV' not in self.previous.columns:
+            return pd.DataFrame({'ANT': np.full(n, np.nan), 'IV': np.full(n, np.nan)})
+        previous = self.previous.reindex(columns=['DATA-TIPO', 'STRIKE', 'ANT', 'IV'])
+        previous['STRIKE'] = pd.to_numeric(previous['STRIKE'], errors='coerce').astype(float)
+        previous = previous.drop_duplicates(['DATA-TIPO', 'STRIKE'], keep=False)
+        current = pd.DataFrame({
+            'DATA-TIPO': self.options['DATA-TIPO'].to_numpy(),
+            'STRIKE': round_significant(self.options['STRIKE'].to_numpy(dtype=float)),
+        })
+        aligned = current.merge(previous, on=['DATA-TIPO', 'STRIKE'], how='left')
+        return pd.DataFrame({name: pd.to_numeric(aligned[name], errors='coerce').astype(float)
+                             for name in ('ANT', 'IV')})
+
+    def unchanged(self, previous_premiums):
+        """
+        Flags the contracts whose premium and underlying are those of the previous snapshot,
+        compared at the precision they are stored with.
+
+        Args:
+            previous_premiums (np.array): The previous premiums aligned with the options, see previous_quotes.
+
+        Returns:
+            np.array: True where the previous IV can be reused as is.
+        """
+        if not self.reuse or self.previous_futures is None:
+            return np.zeros(len(self.options), dtype=bool)
+        if round_significant(self.futuros) != round_significant(self.previous_futures):
+            return np.zeros(len(self.options), dtype=bool)
+        premiums = np.round(round_significant(self.options['ANT'].to_numpy(dtype=float)), STORED_DECIMALS)
+        return np.isclose(premiums, previous_premiums, rtol=1e-9, atol=0)
+
+    def calculate_iv(self):
+        """
+        Solves the implied volatility of every option with the selected engine.
+
+        When a previous snapshot is available, the IV of the contracts whose premium and
+        underlying did not change is reused as is, and the vectorized solver is seeded with the
+        previous IV of the others. The counts of reused IVs and of warm and cold solves are
+        kept in iv_stats.
+
+        Returns:
+            np.array: Implied volatilities in percentage points, NaN for unsolvable quotes.
+        """
+        previous = self.previous_quotes()
+        guess = previous['IV'].to_numpy()
+        reused = np.isfinite(guess) & self.unchanged(previous['ANT'].to_numpy())
+        result = np.where(reused, guess, np.nan)
+        pending = self.options.loc[~reused]
+        if self.iv_engine == "quantlib":
+            if len(pending):
+                result[~reused] = pending.apply(lambda row: iv.calculate_iv(row, self.futuros), axis=1).to_numpy(dtype=float)
+            warm = 0
+        else:
+            result[~reused] = iv_vec.calculate_iv_batch(pending, self.futuros, initial_guess=guess[~reused])
+            warm = int(np.isfinite(guess[~reused]).sum())
+
+        self.iv_stats = {'reused': int(reused.sum()), 'warm': warm, 'cold': int((~reused).sum()) - warm}
+        return result
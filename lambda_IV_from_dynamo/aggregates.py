@@ -0,0 +1,99 @@
+import os
+import numpy as np
+import pandas as pd
+from calculate_iv_vectorized import black76_greeks
+
+# Per-expiry summaries of a snapshot, stored in the aggregates table, see history.py.
+RISK_REVERSAL_DELTA = 0.25
+# The skew slope is fitted on the out-of-the-money options within this log-moneyness of the futures.
+SKEW_LOG_MONEYNESS_RANGE = float(os.environ.get("SKEW_LOG_MONEYNESS_RANGE", 0.1))
+
+
+def interpolate_at(x: np.ndarray, y: np.ndarray, target: float):
+    """
+    Linearly interpolates y at target, without extrapolating.
+
+    Args:
+        x (np.array): Abscissas, in any order.
+        y (np.array): Values at x.
+        target (float): Abscissa to interpolate at.
+
+    Returns:
+        float: The interpolated value, or None if target is outside the range of x.
+    """
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y = x[finite], y[finite]
+    if len(x) == 0 or target < x.min() or target > x.max():
+        return None
+    order = np.argsort(x)
+    return float(np.interp(target, x[order], y[order]))
+
+
+def expiry_aggregates(options: pd.DataFrame, futures: float) -> dict:
+    """
+    Summarizes the smile of one expiration date.
+
+    - ATM_IV: the IV at moneyness 1, averaged over calls and puts.
+    - RR25: the 25-delta call IV minus the 25-delta put IV, with Black-76 deltas.
+    - BF25: the average of the 25-delta call and put IVs minus ATM_IV.
+    - SKEW: the slope of the IV against log(strike / futures) of the out-of-the-money options,
+      in IV points per unit of log-moneyness.
+
+    Args:
+        options (pd.DataFrame): Enriched options of one expiry, with 'STRIKE', 'IV', 'TTM',
+            'CALL_PUT' and 'MONEYNES' columns.
+        futures (float): Futures price.
+
+    Returns:
+        dict: The 'TTM' and the summaries above, None for those that cannot be interpolated.
+    """
+    strike = options['STRIKE'].to_numpy(dtype=float)
+    iv = options['IV'].to_numpy(dtype=float)
+    ttm = options['TTM'].to_numpy(dtype=float)
+    moneyness = options['MONEYNES'].to_numpy(dtype=float)
+    is_call = (options['CALL_PUT'] == 'CALL').to_numpy()
+
+    atm = [interpolate_at(moneyness[side], iv[side], 1.0) for side in (is_call, ~is_call)]
+    atm = [value for value in atm if value is not None]
+    atm_iv = sum(atm) / len(atm) if atm else None
+
+    delta = black76_greeks(futures, strike, ttm, iv / 100, is_call)['DELTA']
+    call_iv = interpolate_at(delta[is_call], iv[is_call], RISK_REVERSAL_DELTA)
+    put_iv = interpolate_at(delta[~is_call], iv[~is_call], -RISK_REVERSAL_DELTA)
+    rr25 = call_iv - put_iv if call_iv is not None and put_iv is not None else None
+    bf25 = (call_iv + put_iv) / 2 - atm_iv if rr25 is not None and atm_iv is not None else None
+
+    log_moneyness = np.log(strike / futures)
+    otm = (np.where(is_call, log_moneyness >= 0, log_moneyness < 0)
+           & (np.abs(log_moneyness) <= SKEW_LOG_MONEYNESS_RANGE) & np.isfinite(iv))
+    skew = None
+    if np.unique(log_moneyness[otm]).size >= 2:
+        skew = float(np.polyfit(log_moneyness[otm], iv[otm], 1)[0])
+
+    return {
+        'TTM': float(np.nanmax(ttm)) if len(ttm) else None,
+        'ATM_IV': atm_iv,
+        'RR25': rr25,
+        'BF25': bf25,
+        'SKEW': skew,
+    }
+
+
+def compute_aggregates(options: pd.DataFrame, futures: float) -> list:
+    """
+    Computes the summaries of every expiration date of a snapshot, see expiry_aggregates.
+
+    Args:
+        options (pd.DataFrame): Enriched options with 'EXP_DATE', 'STRIKE', 'IV', 'TTM',
+            'CALL_PUT' and 'MONEYNES' columns.
+        futures (float): Futures price.
+
+    Returns:
+        list: One dict per expiry with its 'EXP_DATE', sorted by expiry. Expiries already
+        expired are skipped.
+    """
+    if options.empty:
+        return []
+    alive = options[(options['TTM'] > 0) & np.isfinite(options['IV'])]
+    return [dict({'EXP_DATE': exp_date}, **expiry_aggregates(group, futures))
+            for exp_date, group in alive.groupby('EXP_DATE', sort=True)]
@@ -1,9 +1,21 @@
-from lambda_iv_from_dynamo import calculate_variables_and_store
+from lambda_iv_from_dynamo import calculate_variables_and_store, enrich_scrape, MEFF_PRODUCTS, PIPELINE_MODE
+from meff.scraping import run_web_scraping
 
 def lambda_handler():
-    calculate_variables_and_store()
+    if PIPELINE_MODE == 'fused':
+        run_web_scraping(MEFF_PRODUCTS, enrich=enrich_scrape)
+        return "OK"
+
+    failed = []
+    for product in MEFF_PRODUCTS:
+        try:
+            calculate_variables_and_store(product)
+        except Exception as e:
+            print(f"{product}: error: {e!r}")
+            failed.append(product)
+    if failed and len(failed) == len(MEFF_PRODUCTS):
+        raise RuntimeError(f"Every MEFF product failed: {failed}")
     return "OK"
     
 if __name__ == '__main__':
     lambda_handler()
-
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr
+
+SQRT_2PI = np.sqrt(2.0 * np.pi)
+MIN_VOL = 1e-7
+MAX_VOL = 4.0
+
+
+def black76_price(futures, strike, ttm, sigma, is_call):
+    """
+    Undiscounted Black-76 price for arrays of European options on a future.
+
+    Args:
+        futures (float or np.array): Futures price.
+        strike (np.array): Strike prices.
+        ttm (np.array): Times to maturity in years.
+        sigma (np.array): Volatilities (decimal, not percentage).
+        is_call (np.array): Boolean mask, True for calls.
+
+    Returns:
+        np.array: Option prices.
+    """
+    total_vol = sigma * np.sqrt(ttm)
+    d1 = np.log(futures / strike) / total_vol + 0.5 * total_vol
+    d2 = d1 - total_vol
+    call = futures * ndtr(d1) - strike * ndtr(d2)
+    return np.where(is_call, call, call - futures + strike)
+
+
+def black76_greeks(futures, strike, ttm, sigma, is_call):
+    """
+    Undiscounted Black-76 sensitivities for arrays of European options on a future, with
+    the same zero-rate conventions as black76_price.
+
+    Args:
+        futures (float or np.array): Futures price.
+        strike (np.array): Strike prices.
+        ttm (np.array): Times to maturity in years.
+        sigma (np.array): Volatilities (decimal, not percentage).
+        is_call (np.array): Boolean mask, True for calls.
+
+    Returns:
+        dict: 'DELTA' and 'GAMMA' with respect to the futures price, 'VEGA' per IV point
+        and 'THETA' per calendar day. NaN where the volatility or TTM is not positive.
+    """
+    sqrt_ttm = np.sqrt(np.where(ttm > 0, ttm, np.nan))
+    sigma = np.where(sigma > 0, sigma, np.nan)
+    total_vol = sigma * sqrt_ttm
+    d1 = np.log(futures / strike) / total_vol + 0.5 * total_vol
+    density = np.exp(-0.5 * d1 ** 2) / SQRT_2PI
+    return {
+        'DELTA': np.where(is_call, ndtr(d1), ndtr(d1) - 1),
+        'GAMMA': density / (futures * total_vol),
+        'VEGA': futures * density * sqrt_ttm / 100,
+        'THETA': -futures * density * sigma / (2 * sqrt_ttm) / 365,
+    }
+
+
+def implied_volatility(premium, strike, ttm, is_call, futures, initial_guess=None, tol=1e-10, max_iter=50):
+    """
+    Solves Black-76 implied volatilities for whole arrays of quotes at once.
+
+    Puts are mapped to calls through put-call parity, a Corrado-Miller rational
+    approximation provides the starting point and the root is polished with
+    Halley steps kept inside a shrinking bracket, falling back to bisection
+    whenever a step leaves it.
+
+    Args:
+        premium (np.array): Option premiums.
+        strike (np.array): Strike prices.
+        ttm (np.array): Times to maturity in years.
+        is_call (np.array): Boolean mask, True for calls.
+        futures (float): Futures price used as the underlying.
+        initial_guess (np.array, optional): Starting volatilities (decimal). NaN entries
+            fall back to the rational approximation.
+        tol (float): Absolute tolerance on the premium.
+        max_iter (int): Maximum number of iterations.
+
+    Returns:
+        np.array: Implied volatilities (decimal), NaN where the quote cannot be solved.
+    """
+    premium = np.asarray(premium, dtype=float)
+    strike = np.asarray(strike, dtype=float)
+    ttm = np.asarray(ttm, dtype=float)
+    is_call = np.asarray(is_call, dtype=bool)
+    futures = float(futures)
+
+    result = np.full(premium.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sqrt_t = np.sqrt(ttm)
+        call_price = np.where(is_call, premium, premium + futures - strike)
+        intrinsic = np.maximum(futures - strike, 0.0)
+        valid = (np.isfinite(call_price) & np.isfinite(strike) & (strike > 0) & (ttm > 0)
+                 & (call_price > intrinsic) & (call_price < futures))
+    if not valid.any():
+        return result
+
+    idx = np.flatnonzero(valid)
+    c = call_price[idx]
+    k = strike[idx]
+    s = sqrt_t[idx]
+    log_fk = np.log(futures / k)
+
+    lo = MIN_VOL * s
+    hi = MAX_VOL * s
+
+    # Corrado-Miller rational approximation of the total volatility sigma * sqrt(T).
+    half_moneyness = 0.5 * (futures - k)
+    disc = np.maximum((c - half_moneyness) ** 2 - (futures - k) ** 2 / np.pi, 0.0)
+    x = SQRT_2PI / (futures + k) * (c - half_moneyness + np.sqrt(disc))
+    if initial_guess is not None:
+        guess = np.asarray(initial_guess, dtype=float)[idx] * s
+        x = np.where(np.isfinite(guess) & (guess > 0), guess, x)
+    x = np.where(np.isfinite(x) & (x > lo) & (x < hi), x, 0.2 * s)
+    x = np.clip(x, lo, hi)
+
+    active = np.ones(idx.shape, dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        for _ in range(max_iter):
+            d1 = log_fk / x + 0.5 * x
+            d2 = d1 - x
+            diff = futures * ndtr(d1) - k * ndtr(d2) - c
+            vega = futures * np.exp(-0.5 * d1 * d1) / SQRT_2PI
+
+            converged = np.abs(diff) < tol
+            active &= ~converged
+            if not active.any():
+                break
+
+            hi = np.where(active & (diff > 0), x, hi)
+            lo = np.where(active & (diff < 0), x, lo)
+
+            newton = diff / vega
+            halley = newton / (1.0 - 0.5 * newton * d1 * d2 / x)
+            step = np.where(np.isfinite(halley), halley, newton)
+            candidate = x - step
+            inside = np.isfinite(candidate) & (candidate > lo) & (candidate < hi)
+            candidate = np.where(inside, candidate, 0.5 * (lo + hi))
+            x = np.where(active, candidate, x)
+
+    sigma = x / s
+    # Quotes whose price is not reachable inside [MIN_VOL, MAX_VOL] remain unsolved.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = log_fk / x + 0.5 * x
+        residual = futures * ndtr(d1) - k * ndtr(d1 - x) - c
+    solved = np.abs(residual) < max(tol, 1e-6 * futures)
+    result[idx] = np.where(solved, sigma, np.nan)
+    return result
+
+
+def calculate_iv_batch(options: pd.DataFrame, futuros: float, initial_guess=None) -> np.ndarray:
+    """
+    Vectorized counterpart of calculate_iv.calculate_iv over a whole options DataFrame.
+
+    Uses the same conventions as the QuantLib path (zero rates, Actual/365 from today
+    to the expiry date, futures price as underlying) and agrees with it to within
+    QuantLib's own solver accuracy of 1e-4 in volatility, i.e. 0.01 IV points.
+
+    Args:
+        options (pd.DataFrame): Options with 'DATA-TIPO', 'STRIKE', 'ANT' and 'TTM' columns, the
+            TTM being the whole days to the expiry over 365, see adding_variables.run.
+        futuros (float): Futures price.
+        initial_guess (np.array, optional): Starting IVs in percentage points, NaN where unknown.
+
+    Returns:
+        np.array: Implied volatilities in percentage points, NaN for unsolvable quotes.
+    """
+    ttm = options["TTM"].to_numpy(dtype=float)
+    is_call = (options["DATA-TIPO"].str[1] == "C").to_numpy()
+    if initial_guess is not None:
+        initial_guess = np.asarray(initial_guess, dtype=float) / 100
+    iv = implied_volatility(options["ANT"].to_numpy(dtype=float), options["STRIKE"].to_numpy(dtype=float),
+                            ttm, is_call, futuros, initial_guess=initial_guess)
+    return iv * 100
@@ -1,19 +1,42 @@
-import boto3
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from add_variables import adding_variables
+from surfaces import compute_surfaces
+from aggregates import compute_aggregates
+from meff.history import AGGREGATES_TABLE_NAME
+from meff.svi import fit_smiles
+from meff.columnar import OPTIONS_ENCODING, COLUMN_SCALES, SCALE, encode_options, options_frame
+from meff.split_storage import DEFAULT_PRODUCT, table_name, get_item, put_item, product_key
+from meff.metrics import stage
+from meff.storage import dynamodb_resource
 from decimal import Decimal, Context, ROUND_HALF_EVEN
 import math
+import os
+import threading
 
 
 
-dynamodb = boto3.resource('dynamodb', region_name='eu-central-1')
-table = dynamodb.Table('MeffScrapping')
+dynamodb = dynamodb_resource(region_name='eu-central-1')
+table = dynamodb.Table(table_name())
+aggregates_table = dynamodb.Table(AGGREGATES_TABLE_NAME)
+thread_tables = threading.local()
 DYNAMODB_CONTEXT = Context(prec=3, rounding=ROUND_HALF_EVEN)
+# The SVI parameters are not quantized, small values such as A keep 6 significant digits.
+PARAMETER_CONTEXT = Context(prec=6, rounding=ROUND_HALF_EVEN)
+IV_ENGINE = os.environ.get("IV_ENGINE", "vectorized")
+PREVIOUS_SNAPSHOT_LOOKBACK_DAYS = int(os.environ.get("PREVIOUS_SNAPSHOT_LOOKBACK_DAYS", 7))
+# 'two_stage' enriches the raw items stored by lambda_scrap, 'fused' scrapes, enriches and
+# stores each product in one pass, see meff.scraping.run_web_scraping.
+PIPELINE_MODE = os.environ.get("PIPELINE_MODE", "two_stage")
+# Columns of the raw options, those an enriched snapshot is reprocessed from.
+RAW_COLUMNS = ['DATA-TIPO', 'STRIKE', 'ANT']
+# The MEFF products scraped by lambda_scrap, see MEFF_PRODUCTS in meff.scraping.
+MEFF_PRODUCTS = [p.strip() for p in os.environ.get("MEFF_PRODUCTS", DEFAULT_PRODUCT).split(',') if p.strip()]
 
 def convert_floats_to_decimals(df: pd.DataFrame) -> pd.DataFrame:
     """
     Converts all float values in a DataFrame to Decimal values with a precision of 3.
+    Values keep columnar.SCALE decimals, or those of columnar.COLUMN_SCALES for the Greeks.
     
     Args:
         df (pd.DataFrame): The input DataFrame whose float values are to be converted.
@@ -23,44 +46,303 @@ def convert_floats_to_decimals(df: pd.DataFrame) -> pd.DataFrame:
     """
     for column in df.columns:
         if df[column].dtype == 'float64':
-            df[column] = df[column].apply(lambda x: DYNAMODB_CONTEXT.create_decimal_from_float(x).quantize(Decimal(".001"), rounding=ROUND_HALF_EVEN))
+            quantum = Decimal(1).scaleb(-COLUMN_SCALES.get(column, SCALE))
+            df[column] = df[column].apply(lambda x: DYNAMODB_CONTEXT.create_decimal_from_float(x).quantize(quantum, rounding=ROUND_HALF_EVEN))
     return df
 
 
-def calculate_variables_and_store(): 
+def to_decimal(x):
+    """
+    Converts a float to a Decimal with a precision of 3, and NaN, infinite values and None
+    to None since DynamoDB does not accept NaN.
+    """
+    if x is None or math.isnan(x) or math.isinf(x):
+        return None
+    return DYNAMODB_CONTEXT.create_decimal_from_float(float(x)).quantize(Decimal(".001"), rounding=ROUND_HALF_EVEN)
+
+
+def convert_surfaces_to_decimals(surfaces: dict) -> dict:
+    """
+    Converts the grids of the volatility surfaces to nested lists of Decimal values,
+    storing points outside the quoted area as None.
+
+    Args:
+        surfaces (dict): Surfaces as returned by surfaces.compute_surfaces.
+
+    Returns:
+        dict: The surfaces ready to be stored in DynamoDB.
+    """
+    return {
+        call_put: {
+            'MONEYNES': [to_decimal(x) for x in surface['MONEYNES']],
+            'TTM': [to_decimal(x) for x in surface['TTM']],
+            'IV': [[to_decimal(x) for x in row] for row in surface['IV']],
+        }
+        for call_put, surface in surfaces.items()
+    }
+
+
+def convert_smiles_to_decimals(smiles: list) -> list:
+    """
+    Converts the float values of the fitted SVI smiles to Decimal values with 6 significant
+    digits, and NaN and infinite values to None.
+
+    Args:
+        smiles (list): Smiles as returned by svi.fit_smiles.
+
+    Returns:
+        list: The smiles ready to be stored in DynamoDB.
+    """
+    def to_parameter(x):
+        if not isinstance(x, float):
+            return x
+        if math.isnan(x) or math.isinf(x):
+            return None
+        return PARAMETER_CONTEXT.create_decimal_from_float(x)
+
+    return [{name: to_parameter(value) for name, value in smile.items()} for smile in smiles]
+
+
+def aggregates_item(product: str, date: str, futures, expiries: list) -> dict:
+    """
+    Builds the item of the aggregates table of a snapshot.
+
+    Args:
+        product (str): The MEFF product of the snapshot.
+        date (str): The date of the snapshot, format 'YYYY-MM-DD'.
+        futures (Decimal): The futures price, as stored with the snapshot.
+        expiries (list): The summaries returned by aggregates.compute_aggregates.
+
+    Returns:
+        dict: The item, with the summaries converted to Decimals.
+    """
+    return {
+        'Product': product,
+        'Date': date,
+        'Futures': futures,
+        'Expiries': [{name: value if name == 'EXP_DATE' else to_decimal(value) for name, value in expiry.items()}
+                     for expiry in expiries],
+    }
+
+
+def get_aggregates_table():
+    """
+    Returns the aggregates table of the current thread. boto3 resources are not thread-safe,
+    and the fused pipeline enriches its products from worker threads.
+    """
+    if threading.current_thread() is threading.main_thread():
+        return aggregates_table
+    if not hasattr(thread_tables, 'aggregates_table'):
+        thread_tables.aggregates_table = dynamodb_resource(own_session=True, region_name='eu-central-1').Table(
+            AGGREGATES_TABLE_NAME)
+    return thread_tables.aggregates_table
+
+
+def summarize(product: str, date: str, futures, options: pd.DataFrame) -> dict:
+    """
+    Computes the summaries of an enriched snapshot, see aggregates.compute_aggregates.
+
+    Args:
+        product (str): The MEFF product of the snapshot.
+        date (str): The date of the snapshot, format 'YYYY-MM-DD'.
+        futures (Decimal): The futures price, as stored with the snapshot.
+        options (pd.DataFrame): The enriched options.
+
+    Returns:
+        dict: The item of the aggregates table, see aggregates_item.
+    """
+    with stage('enrich.aggregates', rows=len(options)):
+        return aggregates_item(product, date, futures, compute_aggregates(options, float(futures)))
+
+
+def store_aggregates(item: dict, aggregates_table=None):
+    """
+    Stores the summaries of a snapshot in the aggregates table, once the snapshot itself is
+    stored. Failures are only logged: the snapshot is kept, and its summaries can be rebuilt
+    with backfill_aggregates.
+
+    Args:
+        item (dict): The item returned by summarize.
+        aggregates_table (boto3.resources.factory.dynamodb.Table, optional): The aggregates table,
+            the one of the current thread by default.
+
+    Returns:
+        dict: The stored item, or None if it could not be stored.
+    """
+    if aggregates_table is None:
+        aggregates_table = get_aggregates_table()
+    try:
+        with stage('dynamodb.put_aggregates', expiries=len(item['Expiries'])):
+            aggregates_table.put_item(Item=item)
+    except Exception as e:
+        print(f"Error storing the aggregates of {item['Product']} {item['Date']}: {e}")
+        return None
+    return item
+
+
+def get_previous_snapshot(date: datetime, product: str = DEFAULT_PRODUCT, table=table):
+    """
+    Fetches the most recent already enriched item of a product stored on or before the given
+    date. The item of that date itself is enriched when the fused pipeline scrapes the product
+    again during the day.
+
+    Args:
+        date (datetime): The date of the snapshot being processed.
+        product (str, optional): The MEFF product of the snapshot.
+        table (boto3.resources.factory.dynamodb.Table, optional): The table holding the snapshots.
+
+    Returns:
+        dict: The previous item, or None if none is found within PREVIOUS_SNAPSHOT_LOOKBACK_DAYS.
+    """
+    for days in range(0, PREVIOUS_SNAPSHOT_LOOKBACK_DAYS + 1):
+        previous_date = (date - timedelta(days=days)).strftime('%Y-%m-%d')
+        item = get_item(table, product_key(product, previous_date))
+        if item and 'IV' in options_frame(item).columns:
+            return item
+    return None
+
+
+def enrich_item(item: dict, options_data: pd.DataFrame, product: str = DEFAULT_PRODUCT, now: datetime = None,
+                table=table, reuse: bool = True):
+    """
+    Calculates the additional variables of the raw options of a snapshot in memory, and
+    builds the enriched item to store.
+
+    - The previous enriched snapshot is fetched. The IV of the contracts whose premium and
+      underlying did not change since is reused, the solve of the others is warm started.
+    - The adding_variables class calculates the additional variables of the options.
+    - Rows with NaN or infinite values in the 'IV' column are removed.
+    - The call and put volatility surfaces are interpolated once on a fixed grid.
+    - An SVI smile is fitted to the calls and to the puts of every expiry, see svi.fit_smiles.
+    - The per-expiry summaries are computed for the aggregates table, see summarize. They
+      are only stored by the caller once the item is, see store_aggregates.
+    - The options are encoded as Decimals or as a binary column attribute, see OPTIONS_ENCODING.
+
+    Args:
+        item (dict): The raw item, only its 'Date' and 'Futures' are used.
+        options_data (pd.DataFrame): The raw options, as scraped.
+        product (str, optional): The MEFF product of the snapshot.
+        now (datetime, optional): The date of the snapshot, today by default.
+        table (boto3.resources.factory.dynamodb.Table, optional): The table holding the snapshots.
+        reuse (bool, optional): Reuse the IV of unchanged contracts, False to solve them all again.
+
+    Returns:
+        tuple: The enriched item, the aggregates item, and the counts of contracts whose IV was
+        reused, warm-solved or cold-solved.
+    """
+    now = now or datetime.today()
+    futures = float(item['Futures'])
+
+    with stage('enrich.previous_snapshot', product=product):
+        previous = get_previous_snapshot(now, product, table)
+    previous_options = options_frame(previous) if previous is not None else None
+
+    previous_futures = float(previous['Futures']) if previous is not None else None
+    instance = adding_variables(options_data, futures, iv_engine=IV_ENGINE, previous=previous_options,
+                                previous_futures=previous_futures, reuse=reuse)
+    instance.run()
+
+    options = instance.options
+    #delete rows with NaN or Inf values 
+    options = options[~options['IV'].apply(lambda x: math.isnan(x) or math.isinf(x))]
+
+    with stage('enrich.surfaces', rows=len(options)):
+        surfaces = convert_surfaces_to_decimals(compute_surfaces(options))
+    with stage('enrich.svi', rows=len(options)) as fit:
+        smiles = convert_smiles_to_decimals(fit_smiles(options, instance.futuros))
+        fit.set(smiles=len(smiles))
+    futures = DYNAMODB_CONTEXT.create_decimal_from_float(instance.futuros).quantize(Decimal(".01"), rounding=ROUND_HALF_EVEN)
+    # Keys of the other MEFF products are '<product>#<date>'.
+    aggregates = summarize(product, item['Date'].split('#')[-1], futures, options)
+
+    enriched = {
+        'Date': item['Date'],
+        'Futures': futures,
+        'Surfaces': surfaces,
+        'Smiles': smiles
+    }
+    with stage('store.encode', encoding=OPTIONS_ENCODING, rows=len(options)):
+        if OPTIONS_ENCODING == 'columnar':
+            enriched['Columns'] = encode_options(options.reset_index(drop=True))
+        else:
+            enriched['Options'] = convert_floats_to_decimals(options).to_dict(orient='records')
+    return enriched, aggregates, instance.iv_stats
+
+
+def enrich_scrape(item: dict, options_data: pd.DataFrame, product: str, now: datetime, table):
+    """
+    Enriches a scrape of the fused pipeline, see the enrich argument of meff.scraping.scrape_product.
+
+    Returns:
+        tuple: The enriched item, the counts of reused, warm and cold IVs, and a callback storing
+        the aggregates, called by scrape_product once the item is stored.
+    """
+    enriched, aggregates, iv_stats = enrich_item(item, options_data, product, now, table)
+    return enriched, iv_stats, lambda: store_aggregates(aggregates)
+
+
+def calculate_variables_and_store(product: str = DEFAULT_PRODUCT, force: bool = False):
     """
     Fetches options data from a DynamoDB table, calculates additional variables using the adding_variables class,
     cleans the data, and then stores the updated data back in the DynamoDB table.
 
-    This function doesn't require any parameters and doesn't return anything. It performs the following steps:
-    - Fetches the options data for the current date from the DynamoDB table.
-    - If data is found, it uses the adding_variables class to calculate additional variables for the options data.
-    - It then cleans the data by removing any rows with NaN or infinite values in the 'IV' column.
-    - The cleaned data is then converted from float to Decimal.
-    - Finally, the updated data is stored back in the DynamoDB table.
+    This is the second stage of the two-stage pipeline, where lambda_scrap stores the raw
+    options first. It is also used to reprocess a stored snapshot with force, e.g. after a
+    change of the calculations. See enrich_item for the calculation, and PIPELINE_MODE for the
+    fused pipeline that skips the raw write.
+
+    Args:
+        product (str, optional): The MEFF product to enrich.
+        force (bool, optional): Enrich the snapshot again even if it is already enriched,
+            from its stored strikes and premiums. Every IV is solved again, warm started from the
+            stored one. The prices keep 3 significant digits, so the IV of deep in-the-money
+            contracts may no longer be solvable.
+
+    Returns:
+        dict: Counts of contracts whose IV was reused, warm-solved or cold-solved, or None if
+        there is no data for the current date or it was already enriched and force is not set.
     """
-    today = datetime.today().strftime('%Y-%m-%d')
-    response = table.get_item(Key={'Date': today})
-    data = response.get('Item', None)
+    now = datetime.today()
+    key = product_key(product, now.strftime('%Y-%m-%d'))
+    data = get_item(table, key)
 
-    if data is not None:
-        options_data = pd.DataFrame(data['Options'])
-        futures = float(data['Futures'])
+    if data is None:
+        return None
+    options_data = options_frame(data)
+    if options_data.empty:
+        return None
 
-        instance = adding_variables(options_data, futures)
-        instance.run()
+    # The scraper leaves the item untouched when the MEFF page did not change since its last fetch.
+    if 'IV' in options_data.columns:
+        if not force:
+            print(f"Options of {key} are already enriched, nothing to do")
+            return None
+        options_data = options_data[RAW_COLUMNS]
 
-        options = instance.options
-        #delete rows with NaN or Inf values 
-        options = options[~options['IV'].apply(lambda x: math.isnan(x) or math.isinf(x))]
+    item, aggregates, iv_stats = enrich_item(data, options_data, product, now, table, reuse=not force)
+    put_item(table, item)
+    store_aggregates(aggregates)
+    return iv_stats
 
-        options = convert_floats_to_decimals(options)
-        options = options.to_dict(orient='records')
-        futures = DYNAMODB_CONTEXT.create_decimal_from_float(instance.futuros).quantize(Decimal(".01"), rounding=ROUND_HALF_EVEN)
-        
-        item = {
-            'Date': today,
-            'Futures': futures,
-            'Options': options
-        }
-        table.put_item(Item=item)
+
+def backfill_aggregates(dates: list, product: str = DEFAULT_PRODUCT) -> int:
+    """
+    Stores the summaries of snapshots enriched before the aggregates table existed.
+
+    Args:
+        dates (list): The dates of the snapshots, format 'YYYY-MM-DD'.
+        product (str, optional): The MEFF product of the snapshots.
+
+    Returns:
+        int: The number of snapshots whose summaries were stored.
+    """
+    stored = 0
+    for date in dates:
+        data = get_item(table, product_key(product, date))
+        options = options_frame(data) if data else pd.DataFrame()
+        if 'IV' not in options.columns:
+            continue
+        options = options.astype({name: float for name in ('STRIKE', 'IV', 'TTM', 'MONEYNES')})
+        if store_aggregates(summarize(product, date, data['Futures'], options)) is not None:
+            stored += 1
+    return stored
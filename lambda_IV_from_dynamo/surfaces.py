@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.interpolate import griddata
+
+SURFACE_MONEYNESS_MIN = float(os.environ.get("SURFACE_MONEYNESS_MIN", 0.7))
+SURFACE_MONEYNESS_MAX = float(os.environ.get("SURFACE_MONEYNESS_MAX", 1.3))
+SURFACE_MONEYNESS_POINTS = int(os.environ.get("SURFACE_MONEYNESS_POINTS", 31))
+SURFACE_TTM_POINTS = int(os.environ.get("SURFACE_TTM_POINTS", 20))
+
+
+def compute_surface(options: pd.DataFrame, call_put: str, moneyness_grid: np.ndarray, ttm_points: int = SURFACE_TTM_POINTS):
+    """
+    Interpolates the implied volatility of one option type on a moneyness x TTM grid.
+
+    Args:
+        options (pd.DataFrame): Enriched options with 'CALL_PUT', 'MONEYNES', 'TTM' and 'IV' columns.
+        call_put (str): 'CALL' or 'PUT'.
+        moneyness_grid (np.array): Moneyness values of the grid.
+        ttm_points (int): Number of TTM values, spread between the shortest and longest maturity.
+
+    Returns:
+        dict: 'MONEYNES' and 'TTM' grid axes and the 'IV' matrix (one row per TTM, NaN outside
+        the quoted points), or None if the points do not span a surface.
+    """
+    filtered = options[(options['CALL_PUT'] == call_put) & np.isfinite(options['IV'])]
+    if filtered['MONEYNES'].nunique() < 2 or filtered['TTM'].nunique() < 2:
+        return None
+    ttm_grid = np.linspace(filtered['TTM'].min(), filtered['TTM'].max(), ttm_points)
+    xi, yi = np.meshgrid(moneyness_grid, ttm_grid)
+    try:
+        zi = griddata((filtered['MONEYNES'], filtered['TTM']), filtered['IV'], (xi, yi), method='linear')
+    except (ValueError, RuntimeError):
+        return None
+    return {'MONEYNES': moneyness_grid, 'TTM': ttm_grid, 'IV': zi}
+
+
+def compute_surfaces(options: pd.DataFrame) -> dict:
+    """
+    Computes the call and put volatility surfaces of a snapshot on the configured grid.
+
+    Args:
+        options (pd.DataFrame): Enriched options with 'CALL_PUT', 'MONEYNES', 'TTM' and 'IV' columns.
+
+    Returns:
+        dict: The surfaces keyed by 'CALL' and 'PUT', skipping those that cannot be built.
+    """
+    moneyness_grid = np.linspace(SURFACE_MONEYNESS_MIN, SURFACE_MONEYNESS_MAX, SURFACE_MONEYNESS_POINTS)
+    surfaces = {}
+    for call_put in ('CALL', 'PUT'):
+        surface = compute_surface(options, call_put, moneyness_grid)
+        if surface is not None:
+            surfaces[call_put] = surface
+    return surfaces
@@ -0,0 +1,248 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+import numpy as np
+import pandas as pd
+from add_variables import adding_variables, round_significant
+from calculate_iv_vectorized import black76_price, black76_greeks, implied_volatility
+from meff.columnar import encode_options, decode_options, options_frame
+from aggregates import compute_aggregates
+from surfaces import compute_surfaces
+import lambda_iv_from_dynamo
+from lambda_iv_from_dynamo import convert_surfaces_to_decimals
+from meff import svi
+from meff.svi import fit_smiles, svi_iv
+from meff.split_storage import get_item, put_item
+from meff.storage import SQLiteResource
+
+futures = 9500.0
+
+
+def make_options():
+    today = pd.Timestamp.today().normalize()
+    rows = []
+    for days in (10, 45, 120):
+        exp_date = today + pd.Timedelta(days=days)
+        for strike in (8500, 9000, 9500, 10000, 10500):
+            for kind in ("C", "P"):
+                vol = 0.18 + 0.1 * abs(np.log(strike / futures))
+                price = black76_price(futures, np.array([strike]), np.array([days / 365]), vol, np.array([kind == "C"]))[0]
+                rows.append({
+                    'DATA-TIPO': f"O{kind}E{exp_date.strftime('%Y%m%d')}",
+                    'STRIKE': f"{strike:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."),
+                    'ANT': f"{price:.2f}".replace(".", ","),
+                })
+    return pd.DataFrame(rows)
+
+
+def test_implied_volatility_roundtrip():
+    strike = np.array([8000.0, 9500.0, 11000.0, 9500.0])
+    ttm = np.array([0.1, 0.5, 1.0, 0.25])
+    is_call = np.array([True, False, True, True])
+    sigma = np.array([0.35, 0.2, 0.15, 0.6])
+    premium = black76_price(futures, strike, ttm, sigma, is_call)
+    assert np.allclose(implied_volatility(premium, strike, ttm, is_call, futures), sigma, atol=1e-8)
+
+
+def test_unsolvable_quotes_are_nan():
+    strike = np.array([9000.0, 9000.0, 9000.0])
+    ttm = np.array([0.5, 0.0, 0.5])
+    is_call = np.array([True, True, False])
+    premium = np.array([400.0, 600.0, 0.0])
+    assert np.isnan(implied_volatility(premium, strike, ttm, is_call, futures)).all()
+
+
+def test_vectorized_matches_quantlib():
+    vectorized = adding_variables(make_options(), futures, iv_engine="vectorized")
+    vectorized.run()
+    quantlib = adding_variables(make_options(), futures, iv_engine="quantlib")
+    quantlib.run()
+    assert np.allclose(vectorized.options["IV"], quantlib.options["IV"], atol=1e-2, equal_nan=True)
+
+
+def test_previous_snapshot_warm_start():
+    first = adding_variables(make_options(), futures)
+    first.run()
+    assert first.iv_stats == {'reused': 0, 'warm': 0, 'cold': len(first.options)}
+    previous = first.options.copy()
+    previous["IV"] = round_significant(previous["IV"])
+
+    # The underlying moved, every IV is solved again from the previous one.
+    second = adding_variables(make_options(), futures + 100, previous=previous, previous_futures=futures)
+    second.run()
+    assert second.iv_stats == {'reused': 0, 'warm': len(previous), 'cold': 0}
+    cold = adding_variables(make_options(), futures + 100)
+    cold.run()
+    assert np.allclose(second.options["IV"], cold.options["IV"], atol=1e-6, equal_nan=True)
+
+
+def test_unchanged_contracts_reuse_their_iv():
+    first = adding_variables(make_options(), futures)
+    first.run()
+    # As stored, with 3 significant digits.
+    previous = first.options.assign(ANT=round_significant(first.options['ANT']), IV=round_significant(first.options['IV']))
+
+    options = make_options()
+    options.loc[0, 'ANT'] = '999,00'
+    second = adding_variables(options, futures + 1, previous=previous, previous_futures=futures)
+    second.run()
+    solvable = int(np.isfinite(previous['IV']).sum())
+    assert second.iv_stats == {'reused': solvable - 1, 'warm': len(previous) - solvable + 1, 'cold': 0}
+    assert second.options['IV'].iloc[1:].tolist() == previous['IV'].iloc[1:].tolist()
+    assert second.options['IV'].iloc[0] != previous['IV'].iloc[0]
+
+    cold = adding_variables(make_options(), futures, previous=previous, previous_futures=futures, reuse=False)
+    cold.run()
+    assert cold.iv_stats['reused'] == 0
+
+
+def test_columnar_encoding_roundtrip():
+    instance = adding_variables(make_options(), futures)
+    instance.run()
+    options = instance.options
+    decoded = decode_options(encode_options(options))
+    assert list(decoded.columns) == list(options.columns)
+    assert (decoded['DATA-TIPO'] == options['DATA-TIPO']).all() and (decoded['DTE'] == options['DTE']).all()
+    np.testing.assert_array_equal(decoded['IV'], np.round(round_significant(options['IV'].to_numpy()), 3))
+    np.testing.assert_array_equal(decoded['GAMMA'], np.round(round_significant(options['GAMMA'].to_numpy()), 7))
+    low = decode_options(encode_options(pd.DataFrame({'IV': [0.0427, 0.213, np.nan], 'STRIKE': [9000.0, 9050.0, 9100.0]})))
+    np.testing.assert_array_equal(low['IV'], [0.043, 0.213, np.nan])
+    np.testing.assert_array_equal(low['STRIKE'], [9000.0, 9050.0, 9100.0])
+
+
+def test_greeks_match_finite_differences():
+    strike = np.array([8500.0, 9500.0, 10500.0, 9000.0])
+    ttm = np.array([0.1, 0.5, 1.0, 0.25])
+    sigma = np.array([0.25, 0.2, 0.18, 0.22])
+    is_call = np.array([True, False, True, False])
+    greeks = black76_greeks(futures, strike, ttm, sigma, is_call)
+
+    def price(f=futures, t=ttm, s=sigma):
+        return black76_price(f, strike, t, s, is_call)
+
+    h = 1.0
+    np.testing.assert_allclose(greeks['DELTA'], (price(f=futures + h) - price(f=futures - h)) / (2 * h), rtol=1e-5)
+    np.testing.assert_allclose(greeks['GAMMA'], (price(f=futures + h) - 2 * price() + price(f=futures - h)) / h ** 2,
+                               rtol=1e-3)
+    np.testing.assert_allclose(greeks['VEGA'], (price(s=sigma + 1e-4) - price(s=sigma - 1e-4)) / 2e-4 / 100, rtol=1e-5)
+    np.testing.assert_allclose(greeks['THETA'], (price(t=ttm - 1e-5) - price(t=ttm + 1e-5)) / 2e-5 / 365, rtol=1e-4)
+
+    instance = adding_variables(make_options(), futures)
+    instance.run()
+    assert {'DELTA', 'GAMMA', 'VEGA', 'THETA'} <= set(instance.options.columns)
+    assert instance.options['DELTA'].between(-1, 1).all()
+
+
+def make_enriched(iv_of_log_moneyness, exp_date='2030-06-21', ttm=0.25):
+    strikes = np.arange(8000.0, 11050.0, 50.0)
+    rows = []
+    for strike in strikes:
+        for call_put in ('CALL', 'PUT'):
+            rows.append({
+                'EXP_DATE': exp_date, 'CALL_PUT': call_put, 'STRIKE': strike, 'TTM': ttm,
+                'IV': iv_of_log_moneyness(np.log(strike / futures)),
+                'MONEYNES': strike / futures if call_put == 'CALL' else futures / strike,
+            })
+    return pd.DataFrame(rows)
+
+
+def test_aggregates_of_flat_smile():
+    expiry, = compute_aggregates(make_enriched(lambda k: 20.0), futures)
+    assert expiry['EXP_DATE'] == '2030-06-21'
+    assert expiry['ATM_IV'] == pytest.approx(20.0)
+    assert expiry['RR25'] == pytest.approx(0.0, abs=1e-9)
+    assert expiry['BF25'] == pytest.approx(0.0, abs=1e-9)
+    assert expiry['SKEW'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_aggregates_of_skewed_smile():
+    options = pd.concat([make_enriched(lambda k: 20.0 - 30.0 * k + 50.0 * k ** 2),
+                         make_enriched(lambda k: 20.0, exp_date='2020-06-19', ttm=-0.1)])
+    expiry, = compute_aggregates(options, futures)
+    assert expiry['ATM_IV'] == pytest.approx(20.0, abs=0.05)
+    assert expiry['RR25'] < 0
+    assert expiry['BF25'] > 0
+    assert expiry['SKEW'] == pytest.approx(-30.0, abs=1.0)
+    assert compute_aggregates(pd.DataFrame(), futures) == []
+
+
+@pytest.mark.parametrize('refine', [True, False])
+def test_svi_fit_recovers_parameters(monkeypatch, refine):
+    if not refine:
+        monkeypatch.setattr(svi, 'least_squares', None)
+    smile = {'A': 0.002, 'B': 0.04, 'RHO': -0.6, 'M': 0.02, 'SIGMA': 0.08}
+    options = make_enriched(lambda k: float(svi_iv(k, smile, 0.25)))
+    fitted = fit_smiles(options, futures)
+    assert [(s['EXP_DATE'], s['CALL_PUT'], s['POINTS']) for s in fitted] == [('2030-06-21', 'CALL', 61),
+                                                                             ('2030-06-21', 'PUT', 61)]
+    assert fitted[0]['RMSE'] < (1e-3 if refine else 0.05)
+    if refine:
+        assert [fitted[0][name] for name in svi.SVI_PARAMETERS] == pytest.approx(list(smile.values()), abs=1e-4)
+
+
+def test_svi_fit_of_sparse_smiles():
+    options = make_enriched(lambda k: 20.0 - 30.0 * k + 50.0 * k ** 2)
+    fitted = fit_smiles(options.iloc[::12], futures)
+    assert [s['CALL_PUT'] for s in fitted] == ['CALL'] and fitted[0]['RMSE'] < 0.5
+    assert fit_smiles(options.iloc[:4], futures) == []
+
+
+def test_compute_surfaces_on_fixed_grid():
+    # A plane is interpolated exactly inside the convex hull of the quotes.
+    calls = [{'CALL_PUT': 'CALL', 'MONEYNES': m, 'TTM': t, 'IV': 10.0 + 5.0 * m + 20.0 * t}
+             for m in (0.9, 1.0, 1.1) for t in (0.1, 0.5)]
+    puts = [{'CALL_PUT': 'PUT', 'MONEYNES': 1.0, 'TTM': 0.1, 'IV': 20.0}, {'CALL_PUT': 'PUT', 'MONEYNES': 1.0,
+                                                                           'TTM': 0.5, 'IV': np.nan}]
+    surfaces = compute_surfaces(pd.DataFrame(calls + puts))
+    assert list(surfaces) == ['CALL']
+    surface = surfaces['CALL']
+    assert surface['IV'].shape == (len(surface['TTM']), len(surface['MONEYNES'])) == (20, 31)
+    assert surface['TTM'][0] == 0.1 and surface['TTM'][-1] == 0.5
+    inside = (surface['MONEYNES'] >= 0.9 - 1e-9) & (surface['MONEYNES'] <= 1.1 + 1e-9)
+    xi, yi = np.meshgrid(surface['MONEYNES'][inside], surface['TTM'])
+    assert surface['IV'][:, inside] == pytest.approx(10.0 + 5.0 * xi + 20.0 * yi)
+    assert np.isnan(surface['IV'][:, ~inside]).all()
+
+    stored = convert_surfaces_to_decimals(surfaces)['CALL']
+    assert len(stored['IV']) == 20 and len(stored['IV'][0]) == 31
+    assert stored['IV'][0][0] is None
+    column = int(np.argmax(inside))
+    assert float(stored['IV'][0][column]) == pytest.approx(surface['IV'][0, column], abs=5e-3)
+    assert all(isinstance(x, Decimal) for x in stored['MONEYNES'] + stored['TTM'])
+
+
+def test_enriched_snapshot_is_reprocessed_when_forced(monkeypatch, tmp_path):
+    local = SQLiteResource(str(tmp_path / 'meff.sqlite3'))
+    table = local.Table('MeffScrapping')
+    monkeypatch.setattr(lambda_iv_from_dynamo, 'table', table)
+    monkeypatch.setattr(lambda_iv_from_dynamo, 'aggregates_table', local.Table('MeffScrappingAggregates'))
+    date = datetime.today().strftime('%Y-%m-%d')
+    put_item(table, {'Date': date, 'Futures': Decimal('9500.00'), 'Columns': encode_options(make_options())})
+
+    solved = len(make_options())
+    assert lambda_iv_from_dynamo.calculate_variables_and_store() == {'reused': 0, 'warm': 0, 'cold': solved}
+    enriched = options_frame(get_item(table, date))
+    assert lambda_iv_from_dynamo.calculate_variables_and_store() is None
+    # The stored strikes and premiums are numbers, rows without an IV were dropped.
+    # The stored snapshot is the previous one, its IVs seed the solve but are not reused.
+    assert lambda_iv_from_dynamo.calculate_variables_and_store(force=True) == {'reused': 0, 'warm': len(enriched),
+                                                                                 'cold': 0}
+    reprocessed = options_frame(get_item(table, date))
+    # Premiums are stored with 3 significant digits, those rounded below their intrinsic value lose their IV.
+    merged = reprocessed.merge(enriched, on=['DATA-TIPO', 'STRIKE'], suffixes=('', '_ENRICHED'))
+    assert len(merged) == len(reprocessed) >= len(enriched) - 2
+    assert np.allclose(merged['IV'].astype(float), merged['IV_ENRICHED'].astype(float), atol=1)
+
+
+def test_iv_and_greeks_share_one_ttm():
+    instance = adding_variables(make_options(), futures)
+    instance.run()
+    options = instance.options
+    # The premiums of make_options are priced at whole days from today.
+    assert sorted(options['DTE'].unique()) == [10, 45, 120]
+    assert (options['TTM'] == options['DTE'] / 365).all()
+    solved = options[np.isfinite(options['IV'])]
+    repriced = black76_price(futures, solved['STRIKE'].to_numpy(), solved['TTM'].to_numpy(),
+                             solved['IV'].to_numpy() / 100, (solved['CALL_PUT'] == 'CALL').to_numpy())
+    assert repriced == pytest.approx(solved['ANT'].to_numpy(), abs=1e-3)
+    assert np.isfinite(solved[['DELTA', 'GAMMA', 'VEGA', 'THETA']].to_numpy()).all()
@@ -1,4 +1,4 @@
-from lambda_scrap import run_web_scraping
+from meff.scraping import run_web_scraping
 
 def lambda_handler():
     run_web_scraping()
@@ -0,0 +1,56 @@
+import glob
+import os
+import timeit
+from meff.scrap import MeffScraper
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def parse_fixture(content, parser):
+    """
+    Runs the parse and extract stages of MeffScraper on a saved page.
+
+    Args:
+        content (bytes): The HTML of the page.
+        parser (str): 'lxml' or 'bs4'.
+
+    Returns:
+        MeffScraper: The scraper with futuros and options extracted.
+    """
+    scraper = MeffScraper(None, parser=parser)
+    scraper.parse(content)
+    scraper.extract_futures()
+    scraper.extract_options()
+    return scraper
+
+
+def benchmark(repeat=5, number=3):
+    """
+    Times both parser backends on every saved MEFF page in the fixtures directory and checks
+    that they produce the same futures price and options table.
+
+    Args:
+        repeat (int): Number of timing repetitions, the best one is reported.
+        number (int): Number of parses per repetition.
+
+    Returns:
+        list: One dict per fixture and backend with the best time per parse in milliseconds.
+    """
+    results = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            content = f.read()
+        reference = parse_fixture(content, 'bs4')
+        for parser in ('bs4', 'lxml'):
+            scraper = parse_fixture(content, parser)
+            assert scraper.futuros == reference.futuros
+            assert scraper.options.equals(reference.options)
+            best = min(timeit.repeat(lambda: parse_fixture(content, parser), repeat=repeat, number=number)) / number
+            results.append({'fixture': os.path.basename(path), 'parser': parser,
+                            'rows': len(scraper.options), 'ms': round(best * 1000, 2)})
+    return results
+
+
+if __name__ == '__main__':
+    for result in benchmark():
+        print(f"{result['fixture']:<30} {result['parser']:<5} {result['rows']:>6} rows {result['ms']:>9.2f} ms")
@@ -0,0 +1,102 @@
+import argparse
+import os
+import pandas as pd
+from meff.columnar import options_frame
+from meff.split_storage import table_name, get_item, index_key
+from meff.storage import KEY_SCHEMAS, SQLiteResource, dynamodb_resource
+
+DATE_INDEX_KEY = 'INDEX#DATES'
+
+
+def copy_tables(source, target, tables=tuple(KEY_SCHEMAS)):
+    """
+    Copies every item of the given tables from one storage backend to another, e.g. from
+    DynamoDB to a local SQLite file to run backfills and benchmarks against production data.
+
+    Args:
+        source (boto3.resources.factory.dynamodb.ServiceResource): The resource to read from.
+        target (boto3.resources.factory.dynamodb.ServiceResource): The resource to write to.
+        tables (tuple, optional): The names of the tables to copy, those missing in the source are skipped.
+
+    Returns:
+        dict: The number of items copied per table.
+    """
+    existing = source.meta.client.list_tables()['TableNames']
+    copied = {}
+    for name in (name for name in tables if name in existing):
+        copied[name] = 0
+        scan_kwargs = {}
+        with target.Table(name).batch_writer() as batch:
+            while True:
+                response = source.Table(name).scan(**scan_kwargs)
+                for item in response['Items']:
+                    batch.put_item(Item=item)
+                copied[name] += len(response['Items'])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return copied
+
+
+def numeric_columns(options: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the columns of Decimals read from the 'list' encoding to floats.
+    """
+    for column in options.columns:
+        if options[column].dtype == object:
+            numeric = pd.to_numeric(options[column], errors='coerce')
+            if numeric.notna().sum() == options[column].notna().sum():
+                options[column] = numeric
+    return options
+
+
+def export_parquet(table, directory, start=None, end=None):
+    """
+    Writes the options of every indexed date to Parquet files partitioned by date, as
+    directory/Date=YYYY-MM-DD/options.parquet. The dataset can then be queried at disk speed,
+    e.g. pd.read_parquet(directory, filters=[('Date', '>=', '2023-05-01'), ('EXP_DATE', '=', '2023-06-16')]).
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The table returned by dynamodb.Table(table_name()).
+        directory (str): The root directory of the dataset.
+        start (str, optional): First date to export, format 'YYYY-MM-DD'.
+        end (str, optional): Last date to export, inclusive.
+
+    Returns:
+        int: The number of dates written.
+    """
+    index = table.get_item(Key=index_key(DATE_INDEX_KEY)).get('Item', {})
+    dates = sorted(date for date in index.get('Dates', set())
+                   if (start is None or date >= start) and (end is None or date <= end))
+    written = 0
+    for date in dates:
+        item = get_item(table, date)
+        if item is None:
+            continue
+        options = numeric_columns(options_frame(item))
+        options['Futures'] = float(item['Futures'])
+        partition = os.path.join(directory, f"Date={date}")
+        os.makedirs(partition, exist_ok=True)
+        options.to_parquet(os.path.join(partition, 'options.parquet'), index=False)
+        written += 1
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Copies the tables to a local SQLite file, or exports the '
+                                                 'options to a Parquet dataset partitioned by date.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    to_sqlite = subparsers.add_parser('sqlite', help='copy every table from DynamoDB to a SQLite file')
+    to_sqlite.add_argument('path')
+    to_parquet = subparsers.add_parser('parquet', help='export the options of the configured backend')
+    to_parquet.add_argument('directory')
+    to_parquet.add_argument('--start')
+    to_parquet.add_argument('--end')
+    args = parser.parse_args()
+
+    if args.command == 'sqlite':
+        source = dynamodb_resource(region_name='eu-central-1')
+        print(f"Copied {copy_tables(source, SQLiteResource(args.path))} items to {args.path}")
+    else:
+        table = dynamodb_resource(region_name='eu-central-1').Table(table_name())
+        print(f"Exported {export_parquet(table, args.directory, args.start, args.end)} dates to {args.directory}")
@@ -0,0 +1,71 @@
+from meff.storage import dynamodb_resource
+from meff.split_storage import TABLE_NAME, SPLIT_TABLE_NAME, META_SLICE, write_split_item
+
+DATE_INDEX_KEY = 'INDEX#DATES'
+
+
+def create_split_table(dynamodb):
+    """
+    Creates the split table, with 'Date' as partition key and 'Slice' as sort key, if it
+    doesn't exist yet.
+
+    Args:
+        dynamodb (boto3.resources.factory.dynamodb.ServiceResource): The DynamoDB resource.
+
+    Returns:
+        boto3.resources.factory.dynamodb.Table: The split table.
+    """
+    existing = dynamodb.meta.client.list_tables()['TableNames']
+    if SPLIT_TABLE_NAME not in existing:
+        table = dynamodb.create_table(
+            TableName=SPLIT_TABLE_NAME,
+            KeySchema=[{'AttributeName': 'Date', 'KeyType': 'HASH'},
+                       {'AttributeName': 'Slice', 'KeyType': 'RANGE'}],
+            AttributeDefinitions=[{'AttributeName': 'Date', 'AttributeType': 'S'},
+                                  {'AttributeName': 'Slice', 'AttributeType': 'S'}],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        table.wait_until_exists()
+    return dynamodb.Table(SPLIT_TABLE_NAME)
+
+
+def migrate(dynamodb=None):
+    """
+    Copies every snapshot of the single-item table into the split table, one slice at a
+    time, and rebuilds the date index there. Slices already migrated with the same content
+    are not rewritten, so the backfill can be run again safely.
+
+    Args:
+        dynamodb (boto3.resources.factory.dynamodb.ServiceResource, optional): The DynamoDB resource.
+
+    Returns:
+        int: The number of dates migrated.
+    """
+    dynamodb = dynamodb or dynamodb_resource(region_name='eu-central-1')
+    source = dynamodb.Table(TABLE_NAME)
+    target = create_split_table(dynamodb)
+
+    dates = set()
+    scan_kwargs = {}
+    while True:
+        response = source.scan(**scan_kwargs)
+        for item in response['Items']:
+            if item['Date'] == DATE_INDEX_KEY:
+                continue
+            write_split_item(target, item)
+            dates.add(item['Date'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if dates:
+        target.update_item(
+            Key={'Date': DATE_INDEX_KEY, 'Slice': META_SLICE},
+            UpdateExpression='ADD Dates :d',
+            ExpressionAttributeValues={':d': dates}
+        )
+    return len(dates)
+
+
+if __name__ == '__main__':
+    print(f"Migrated {migrate()} dates to {SPLIT_TABLE_NAME}")
@@ -0,0 +1,80 @@
+import os
+import threading
+from meff import scrap, scraping
+from meff.scrap import MeffScraper
+from meff.storage import SQLiteResource
+
+fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'meff_miniibex35.html')
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, content, etag):
+        self.content = content
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers, timeout):
+        self.requests.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            return FakeResponse(304)
+        return FakeResponse(200, self.content, {'ETag': self.etag})
+
+
+def test_conditional_fetch(monkeypatch):
+    with open(fixture, 'rb') as f:
+        session = FakeSession(f.read(), '"v1"')
+    monkeypatch.setattr(scrap, '_session', session)
+
+    first = MeffScraper(None)
+    first.run()
+    assert not first.not_modified and len(first.options) == 884
+
+    second = MeffScraper(None, validators=first.validators)
+    second.run()
+    assert second.not_modified and second.options is None
+    assert session.requests[1] == {'If-None-Match': '"v1"'}
+
+    # A server without validators still short-circuits on the content hash.
+    session.etag = '"v2"'
+    third = MeffScraper(None, validators={'Hash': first.validators['Hash']})
+    third.run()
+    assert third.not_modified and third.options is None
+
+
+def test_run_web_scraping_returns_iv_stats(monkeypatch, tmp_path):
+    with open(fixture, 'rb') as f:
+        monkeypatch.setattr(scrap, '_session', FakeSession(f.read(), '"v1"'))
+    local = SQLiteResource(str(tmp_path / 'meff.sqlite3'))
+    monkeypatch.setattr(scraping, 'dynamodb_resource', lambda **kwargs: local)
+    stored = []
+
+    def enrich(item, options, product, now, table):
+        return dict(item, Rows=len(options)), {'warm': 0, 'cold': len(options)}, lambda: stored.append(product)
+
+    results = scraping.run_web_scraping(['FIEM_MiniIbex_35'], enrich=enrich)
+    assert results == {'FIEM_MiniIbex_35': {'outcome': 'enriched', 'iv_stats': {'warm': 0, 'cold': 884}}}
+    assert stored == ['FIEM_MiniIbex_35']
+    results = scraping.run_web_scraping(['FIEM_MiniIbex_35'], enrich=enrich)
+    assert results == {'FIEM_MiniIbex_35': {'outcome': 'unchanged', 'iv_stats': None}}
+
+
+def test_get_session_is_built_once(monkeypatch):
+    monkeypatch.setattr(scrap, '_session', None)
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(scrap.get_session())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, sessions))) == 1
+    assert sessions[0].get_adapter('https://www.meff.es').max_retries.total == scrap.MAX_RETRIES
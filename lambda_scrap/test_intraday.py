@@ -0,0 +1,48 @@
+from decimal import Decimal
+from meff.intraday import apply_snapshots, compact_state, load_state, query_snapshots, state_key, store_snapshot
+from meff.storage import SQLiteResource
+
+
+def row(data_tipo, strike, ant):
+    return {'DATA-TIPO': data_tipo, 'STRIKE': Decimal(strike), 'ANT': Decimal(ant)}
+
+
+def test_store_snapshot_stores_deltas(tmp_path):
+    table = SQLiteResource(str(tmp_path / 'meff.sqlite3')).Table('MeffScrappingSnapshots')
+    opening = [row('OCE20230616', '9500', '121'), row('OPE20230616', '9500', '98.2'), row('OCE20230721', '9600', '87')]
+    first = store_snapshot(table, '2023-05-10', '09:00:00', Decimal('9500.00'), opening)
+    assert len(first['Changed']) == 3 and first['Removed'] == []
+    assert store_snapshot(table, '2023-05-10', '09:05:00', Decimal('9500.00'), opening) is None
+
+    moved = [row('OCE20230616', '9500', '125'), row('OPE20230616', '9500', '98.2')]
+    second = store_snapshot(table, '2023-05-10', '09:10:00', Decimal('9510.00'), moved)
+    assert second['Changed'] == [moved[0]] and second['Removed'] == ['OCE20230721|9600']
+
+    snapshots = query_snapshots(table, '2023-05-10')
+    assert [s['Timestamp'] for s in snapshots] == ['09:00:00', '09:10:00']
+    replayed = apply_snapshots(snapshots)
+    assert replayed['Timestamp'] == '09:10:00' and replayed['Futures'] == Decimal('9510.00')
+    assert list(replayed['Rows'].values()) == moved
+    # Replaying the deltas after a state gives the same result as replaying the whole day.
+    assert apply_snapshots(snapshots[1:], apply_snapshots(snapshots[:1])) == replayed
+    assert apply_snapshots(query_snapshots(table, '2023-05-10', until='09:05:00'))['Rows'] == apply_snapshots(
+        snapshots[:1])['Rows']
+    assert load_state(table, '2023-05-10') == replayed
+
+
+def test_compacted_state_catches_up_later_snapshots(tmp_path):
+    table = SQLiteResource(str(tmp_path / 'meff.sqlite3')).Table('MeffScrappingSnapshots')
+    opening = [row('OCE20230616', '9500', '121'), row('OPE20230616', '9500', '98.2')]
+    store_snapshot(table, '2023-05-10', '09:00:00', Decimal('9500.00'), opening)
+    store_snapshot(table, '2023-05-10', '09:05:00', Decimal('9500.00'), [opening[0], row('OPE20230616', '9500', '99')])
+    # Only the deltas are written during the day.
+    assert table.get_item(Key=state_key('2023-05-10')) == {}
+    assert compact_state(table, '2023-05-10') and not compact_state(table, '2023-05-10')
+    assert not compact_state(table, '2023-05-11')
+    assert table.get_item(Key=state_key('2023-05-10'))['Item']['Through'] == '09:05:00'
+
+    # A snapshot appended after the compaction is applied on top of the stored state.
+    third = store_snapshot(table, '2023-05-10', '18:00:00', Decimal('9500.00'), opening)
+    assert third['Changed'] == [opening[1]]
+    assert load_state(table, '2023-05-10') == apply_snapshots(query_snapshots(table, '2023-05-10'))
+    assert list(load_state(table, '2023-05-10')['Rows'].values()) == opening
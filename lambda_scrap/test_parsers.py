@@ -0,0 +1,25 @@
+import os
+import pandas as pd
+from meff.scrap import MeffScraper
+
+fixture = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'meff_miniibex35.html')
+
+
+def parse(parser):
+    scraper = MeffScraper(None, parser=parser)
+    with open(fixture, 'rb') as f:
+        scraper.parse(f.read())
+    scraper.extract_futures()
+    scraper.extract_options()
+    return scraper
+
+
+def test_lxml_matches_bs4():
+    lxml_scraper = parse('lxml')
+    bs4_scraper = parse('bs4')
+    assert lxml_scraper.futuros == bs4_scraper.futuros == 9512.3
+    assert lxml_scraper.options.equals(bs4_scraper.options)
+    assert lxml_scraper.options['DATA-TIPO'].iloc[0].startswith('OPE')
+    # The prices stay strings in the page's format, adding_variables converts them.
+    assert all(pd.api.types.is_string_dtype(dtype) for dtype in lxml_scraper.options.dtypes)
+    assert lxml_scraper.options['STRIKE'].str.fullmatch(r'[\d.]+,\d{2}').all()
@@ -1,6 +1,6 @@
 import os
 import pandas as pd
-from scrap import MeffScraper
+from meff.scrap import MeffScraper
 
 url = 'https://www.meff.es/esp/Derivados-Financieros/Ficha/FIEM_MiniIbex_35'
 
@@ -0,0 +1,97 @@
+import json
+import os
+from decimal import Decimal
+import pandas as pd
+import pytest
+from boto3.dynamodb.conditions import Attr
+from meff import scraping, split_storage
+from meff.columnar import encode_options, options_frame
+from export_storage import copy_tables, export_parquet
+from meff.storage import SQLiteResource
+
+options = pd.DataFrame({
+    'DATA-TIPO': ['OCE20230616', 'OPE20230616', 'OCE20230721'],
+    'STRIKE': [9500.0, 9500.0, 9600.0],
+    'ANT': [121.0, 98.2, 87.0],
+})
+
+
+def test_split_layout_roundtrip(monkeypatch, tmp_path):
+    monkeypatch.setattr(split_storage, 'STORAGE_LAYOUT', 'split')
+    table = SQLiteResource(str(tmp_path / 'meff.sqlite3')).Table('MeffScrappingSlices')
+    item = {'Date': '2023-05-10', 'Futures': Decimal('9500.00'), 'Columns': encode_options(options)}
+    split_storage.put_item(table, item)
+    assert [s['Slice'] for s in split_storage.query_slices(table, '2023-05-10', prefix='2023-06-16')] == [
+        '2023-06-16#CALL', '2023-06-16#PUT']
+    stored = split_storage.get_item(table, '2023-05-10')
+    assert stored['Futures'] == Decimal('9500.00')
+    assert options_frame(stored).sort_values('DATA-TIPO')['ANT'].tolist() == [121.0, 87.0, 98.2]
+
+    # Rewriting the snapshot without an expiry deletes its slice.
+    split_storage.put_item(table, dict(item, Columns=encode_options(options.iloc[:2])))
+    assert len(split_storage.query_slices(table, '2023-05-10')) == 3
+
+
+def test_items_are_stored_as_json(tmp_path):
+    local = SQLiteResource(str(tmp_path / 'meff.sqlite3'))
+    item = {'Date': '2023-05-10', 'Columns': b'OPC1\x00', 'Strikes': {Decimal('9500'), Decimal('9600')},
+            'Smiles': [{'EXP_DATE': '2023-06-16', 'A': Decimal('0.0123'), 'Raw': b'\xff'}], 'Empty': None}
+    local.Table('MeffScrapping').put_item(Item=item)
+    row, = local.connection().execute("SELECT item FROM items").fetchone()
+    assert json.loads(row)['Columns'] == {'B': 'T1BDMQA='}
+    stored = local.Table('MeffScrapping').get_item(Key={'Date': '2023-05-10'})['Item']
+    assert bytes(stored['Columns']) == item['Columns'] and bytes(stored['Smiles'][0]['Raw']) == b'\xff'
+    assert stored['Strikes'] == item['Strikes'] and stored['Smiles'][0]['A'] == Decimal('0.0123')
+    assert stored['Empty'] is None
+
+
+def test_date_index_and_parquet_export(tmp_path):
+    local = SQLiteResource(str(tmp_path / 'meff.sqlite3'))
+    table = local.Table('MeffScrapping')
+    for date in ('2023-05-09', '2023-05-10'):
+        table.put_item(Item={'Date': date, 'Futures': Decimal('9500.00'), 'Columns': encode_options(options)})
+        scraping.add_to_date_index(table, date)
+    assert table.get_item(Key={'Date': 'INDEX#DATES'})['Item']['Dates'] == {'2023-05-09', '2023-05-10'}
+
+    copy = SQLiteResource(str(tmp_path / 'copy.sqlite3'))
+    assert copy_tables(local, copy) == {'MeffScrapping': 3}
+    directory = str(tmp_path / 'options')
+    assert export_parquet(copy.Table('MeffScrapping'), directory, start='2023-05-10') == 1
+    assert os.listdir(directory) == ['Date=2023-05-10']
+    exported = pd.read_parquet(directory, filters=[('STRIKE', '>', 9500)])
+    assert exported[['STRIKE', 'Futures']].values.tolist() == [[9600.0, 9500.0]]
+    assert exported['Date'].astype(str).tolist() == ['2023-05-10']
+
+
+def test_sqlite_rejects_what_it_does_not_implement(tmp_path):
+    table = SQLiteResource(str(tmp_path / 'meff.sqlite3')).Table('MeffScrapping')
+    with table.batch_writer() as batch:
+        for day in range(1, 6):
+            batch.put_item(Item={'Date': f'2023-05-0{day}', 'Futures': Decimal(9500 + day)})
+
+    # Scans are paginated like DynamoDB ones.
+    pages, scan_kwargs = [], {'Limit': 2}
+    while True:
+        response = table.scan(**scan_kwargs)
+        pages.append([item['Date'] for item in response['Items']])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    assert pages == [['2023-05-01', '2023-05-02'], ['2023-05-03', '2023-05-04'], ['2023-05-05']]
+
+    with pytest.raises(NotImplementedError):
+        table.scan(FilterExpression=Attr('Futures').gt(9502))
+    with pytest.raises(NotImplementedError):
+        table.put_item(Item={'Date': '2023-05-01'}, ConditionExpression=Attr('Date').not_exists())
+    with pytest.raises(NotImplementedError):
+        table.update_item(Key={'Date': '2023-05-01'}, UpdateExpression='REMOVE Futures')
+    with pytest.raises(ValueError):
+        table.update_item(Key={'Date': '2023-05-01'}, UpdateExpression='SET Futures = Futures + :f',
+                          ExpressionAttributeValues={':f': Decimal(1)})
+    assert table.get_item(Key={'Date': '2023-05-01'}, ReturnConsumedCapacity='TOTAL')['Item']['Futures'] == 9501
+
+    response = table.update_item(Key={'Date': '2023-05-01'}, UpdateExpression='SET #f = :f ADD Dates :d',
+                                 ExpressionAttributeNames={'#f': 'Futures'},
+                                 ExpressionAttributeValues={':f': Decimal(9600), ':d': {'2023-05-01'}},
+                                 ReturnValues='ALL_NEW')
+    assert response['Attributes'] == {'Date': '2023-05-01', 'Futures': 9600, 'Dates': {'2023-05-01'}}
@@ -0,0 +1,6 @@
+"""
+Modules shared by the dashboard, the API and the Lambdas: the MEFF scraper, run by the
+scraping Lambda and by the fused pipeline of the IV Lambda, the DynamoDB storage layouts and
+encodings, the intraday snapshots, the SVI smiles, the aggregates history, the caches and
+the metrics. Installed in the image of each of them, see setup.py.
+"""
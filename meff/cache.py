@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+
+# This module is shared by the dashboard and the API.
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by the total size of its values, as measured by the size
+    function, e.g. their memory footprint in bytes.
+
+    Entries can carry an expiry time, and concurrent misses for the same key are coalesced
+    so that only one caller runs the loader while the others wait for its result. None is
+    cached like any other value.
+    """
+
+    def __init__(self, max_bytes, size):
+        self.max_bytes = max_bytes
+        self.size = size
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, size, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._entries[key]
+            self.current_bytes -= size
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key, value, ttl):
+        size = self.size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (value, size, expires_at)
+        self.current_bytes += size
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def get(self, key, loader, ttl=None):
+        """
+        Returns the cached value for a key, calling the loader on a miss.
+
+        Args:
+            key (hashable): The cache key.
+            loader (callable): Function without arguments that returns the value to cache.
+            ttl (float or callable, optional): Seconds the entry stays valid, None to keep it until evicted.
+                A callable receives the loaded value and returns the TTL.
+
+        Returns:
+            object: The cached or freshly loaded value.
+        """
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    self.hits += 1
+                    return value
+                event = self._inflight.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._inflight[key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            value = loader()
+            with self._lock:
+                self._store(key, value, ttl(value) if callable(ttl) else ttl)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def stats(self):
+        """
+        Returns the number of entries, their total size and the hit and miss counts.
+        """
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.current_bytes, 'hits': self.hits,
+                    'misses': self.misses}
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
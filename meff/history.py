@@ -0,0 +1,30 @@
+import os
+from boto3.dynamodb.conditions import Key
+
+# Per-snapshot summaries written by the IV Lambda, one item per (Product, Date), so that the
+# history of a product is read with a single Query instead of loading every daily item.
+# This module is shared by the IV Lambda, the API and the dashboard.
+AGGREGATES_TABLE_NAME = os.environ.get("AGGREGATES_TABLE_NAME", "MeffScrappingAggregates")
+
+
+def query_aggregates(table, product, start, end):
+    """
+    Queries the summaries of a product between two dates.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The aggregates table.
+        product (str): The MEFF product.
+        start (str): First date, format 'YYYY-MM-DD'.
+        end (str): Last date, format 'YYYY-MM-DD', inclusive.
+
+    Returns:
+        list: The aggregates items sorted by 'Date'.
+    """
+    query_kwargs = {'KeyConditionExpression': Key('Product').eq(product) & Key('Date').between(start, end)}
+    items = []
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
@@ -0,0 +1,158 @@
+import os
+from boto3.dynamodb.conditions import Key
+
+# Intraday snapshots are stored in their own table, with 'Date' as partition key and the
+# scrape time ('HH:MM:SS') as 'Timestamp' sort key. The first snapshot of a date holds every
+# row, the following ones only the rows that changed and the contracts that disappeared.
+# This module is shared by the scraper, which writes the snapshots, and the API, which reads them.
+SNAPSHOT_TABLE_NAME = os.environ.get("SNAPSHOT_TABLE_NAME", "MeffScrappingSnapshots")
+# Only the deltas are written while the market is open, the state a new snapshot is diffed
+# against is rebuilt from them. Once the day is over its replayed state is compacted into a
+# single item under its own partition, so that the day is read back without replaying it.
+STATE_KEY_PREFIX = 'STATE#'
+STATE_TIMESTAMP = 'LATEST'
+
+
+def contract_key(row: dict) -> str:
+    """
+    Identifies an option contract by its 'DATA-TIPO' (type and expiry) and strike.
+    """
+    return f"{row['DATA-TIPO']}|{row['STRIKE']}"
+
+
+def apply_snapshots(snapshots: list, state: dict = None) -> dict:
+    """
+    Replays snapshots in timestamp order on top of a state.
+
+    Args:
+        snapshots (list): Snapshot items sorted by 'Timestamp'.
+        state (dict, optional): State to start from, as returned by a previous call.
+
+    Returns:
+        dict: 'Timestamp' and 'Futures' of the last snapshot and 'Rows', the option rows by contract key.
+    """
+    state = dict(state or {'Timestamp': None, 'Futures': None, 'Rows': {}})
+    rows = dict(state['Rows'])
+    for snapshot in snapshots:
+        for key in snapshot.get('Removed', []):
+            rows.pop(key, None)
+        for row in snapshot.get('Changed', []):
+            rows[contract_key(row)] = row
+        state['Timestamp'] = snapshot['Timestamp']
+        state['Futures'] = snapshot['Futures']
+    state['Rows'] = rows
+    return state
+
+
+def query_snapshots(table, date: str, after: str = None, until: str = None) -> list:
+    """
+    Queries the snapshots of a date, optionally only those after and/or until a timestamp.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The snapshots table.
+        date (str): The date of the snapshots.
+        after (str, optional): Exclusive lower bound on 'Timestamp'.
+        until (str, optional): Inclusive upper bound on 'Timestamp'.
+
+    Returns:
+        list: The snapshot items sorted by 'Timestamp'.
+    """
+    condition = Key('Date').eq(date)
+    if after is not None and until is not None:
+        # between is inclusive on both ends, the lower bound is excluded below.
+        condition = condition & Key('Timestamp').between(after, until)
+    elif after is not None:
+        condition = condition & Key('Timestamp').gt(after)
+    elif until is not None:
+        condition = condition & Key('Timestamp').lte(until)
+    query_kwargs = {'KeyConditionExpression': condition}
+    snapshots = []
+    while True:
+        response = table.query(**query_kwargs)
+        snapshots.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return [snapshot for snapshot in snapshots if after is None or snapshot['Timestamp'] > after]
+
+
+def state_key(date: str) -> dict:
+    """
+    Returns the key of the item holding the latest state of a date.
+    """
+    return {'Date': f"{STATE_KEY_PREFIX}{date}", 'Timestamp': STATE_TIMESTAMP}
+
+
+def load_state(table, date: str) -> dict:
+    """
+    Rebuilds the latest state of a date. A date compacted by compact_state starts from its
+    stored state and only applies the snapshots appended after it, if any, the others are
+    replayed from their first snapshot.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The snapshots table.
+        date (str): The date of the snapshots.
+
+    Returns:
+        dict: The state, in the form returned by apply_snapshots.
+    """
+    stored = table.get_item(Key=state_key(date)).get('Item')
+    if stored is None:
+        return apply_snapshots(query_snapshots(table, date))
+    state = {'Timestamp': stored['Through'], 'Futures': stored['Futures'],
+             'Rows': {contract_key(row): row for row in stored['Options']}}
+    return apply_snapshots(query_snapshots(table, date, after=state['Timestamp']), state)
+
+
+def store_snapshot(table, date: str, timestamp: str, futures, rows: list) -> dict:
+    """
+    Appends a snapshot for a date, storing only the rows that changed since the previous one.
+    Nothing is written when neither the rows nor the futures price changed.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The snapshots table.
+        date (str): The date of the snapshot.
+        timestamp (str): The scrape time ('HH:MM:SS').
+        futures (Decimal): The futures price.
+        rows (list): Every option row of the scrape.
+
+    Returns:
+        dict: The stored snapshot item, or None if nothing changed.
+    """
+    previous = load_state(table, date)
+    current = {contract_key(row): row for row in rows}
+    changed = [row for key, row in current.items() if previous['Rows'].get(key) != row]
+    removed = [key for key in previous['Rows'] if key not in current]
+    if not changed and not removed and previous['Futures'] == futures:
+        return None
+    snapshot = {
+        'Date': date,
+        'Timestamp': timestamp,
+        'Futures': futures,
+        'Changed': changed,
+        'Removed': removed,
+    }
+    table.put_item(Item=snapshot)
+    return snapshot
+
+
+def compact_state(table, date: str) -> bool:
+    """
+    Stores the replayed state of a date as a single item, once its last snapshot was written.
+    Nothing is written when the date is already compacted or has no snapshots.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The snapshots table.
+        date (str): The date of the snapshots.
+
+    Returns:
+        bool: Whether the state was written.
+    """
+    if table.get_item(Key=state_key(date)).get('Item') is not None:
+        return False
+    state = apply_snapshots(query_snapshots(table, date))
+    if state['Timestamp'] is None:
+        return False
+    table.put_item(Item=dict(state_key(date), Through=state['Timestamp'], Futures=state['Futures'],
+                             Options=list(state['Rows'].values())))
+    return True
@@ -0,0 +1,170 @@
+import functools
+import json
+import os
+import threading
+import time
+
+# When enabled, every stage logs one JSON line with its duration and counters and is added
+# to the in-process totals returned by snapshot(). When disabled, stage() returns a shared
+# no-op object and timed() leaves the function untouched.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "false").lower() == "true"
+
+# Numeric fields summed in the totals of a stage. Other numeric fields, such as the HTTP
+# status, are labels: those of LABELS are counted per value, e.g. {'200': 12, '404': 1}.
+COUNTERS = ('rows', 'bytes', 'capacity', 'slices', 'expiries', 'smiles', 'reused', 'warm', 'cold')
+LABELS = ('status', 'outcome', 'error')
+
+_totals = {}
+_lock = threading.Lock()
+
+
+class Stage:
+    """
+    Times a block of code. Counters such as 'rows', 'bytes' or 'capacity' and labels can
+    be added with set() while it runs, see COUNTERS and LABELS for how they are totalled.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.start = None
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        record(self.name, duration_ms, **self.fields)
+        return False
+
+
+class NullStage:
+    """
+    The stage returned when metrics are disabled, it does nothing.
+    """
+
+    def set(self, **fields):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+def stage(name, **fields):
+    """
+    Returns a context manager timing a stage.
+
+    Args:
+        name (str): The name of the stage, e.g. 'scrape.fetch'.
+        **fields: Initial counters or labels of the stage.
+
+    Returns:
+        Stage: The stage, or NULL_STAGE if metrics are disabled.
+    """
+    if not METRICS_ENABLED:
+        return NULL_STAGE
+    return Stage(name, fields)
+
+
+def timed(name):
+    """
+    Decorator timing every call of a function as a stage.
+    """
+    def decorator(function):
+        if not METRICS_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Stage(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record(name, duration_ms, **fields):
+    """
+    Logs a stage as a JSON line and adds it to the totals.
+    """
+    if not METRICS_ENABLED:
+        return
+    print(json.dumps(dict({'metric': name, 'duration_ms': round(duration_ms, 3)}, **fields), default=str))
+    with _lock:
+        totals = _totals.setdefault(name, {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        totals['count'] += 1
+        totals['total_ms'] += duration_ms
+        totals['max_ms'] = max(totals['max_ms'], duration_ms)
+        for field, value in fields.items():
+            if field in COUNTERS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[field] = totals.get(field, 0) + value
+            elif field in LABELS:
+                counts = totals.setdefault(field, {})
+                counts[str(value)] = counts.get(str(value), 0) + 1
+
+
+def consumed_capacity(response):
+    """
+    Returns the capacity units consumed by a DynamoDB call made with capacity_kwargs().
+    """
+    capacity = response.get('ConsumedCapacity') or {}
+    if isinstance(capacity, list):
+        return sum(float(c.get('CapacityUnits', 0)) for c in capacity)
+    return float(capacity.get('CapacityUnits', 0))
+
+
+def capacity_kwargs():
+    """
+    Returns the arguments asking DynamoDB for the consumed capacity, only when metrics are enabled.
+    """
+    return {'ReturnConsumedCapacity': 'TOTAL'} if METRICS_ENABLED else {}
+
+
+def item_bytes(value):
+    """
+    Approximates the DynamoDB size of an item or attribute value: the UTF-8 length of strings
+    and attribute names, the length of binaries, about one byte per two digits of numbers and
+    three bytes of overhead per list or map.
+    """
+    if isinstance(value, dict):
+        return 3 + sum(len(str(name).encode()) + item_bytes(element) for name, element in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return 3 + sum(item_bytes(element) for element in value)
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if hasattr(value, 'value') and isinstance(value.value, bytes):
+        return len(value.value)
+    if value is None or isinstance(value, bool):
+        return 1
+    return len(str(value)) // 2 + 1
+
+
+def snapshot():
+    """
+    Returns the totals of every stage since the process started.
+
+    Returns:
+        dict: Per stage 'count', 'total_ms', 'max_ms', 'mean_ms', the summed counters and the
+        counts of each label value.
+    """
+    with _lock:
+        stages = {name: {field: dict(value) if isinstance(value, dict) else value for field, value in totals.items()}
+                  for name, totals in _totals.items()}
+    for totals in stages.values():
+        totals['mean_ms'] = round(totals['total_ms'] / totals['count'], 3)
+        totals['total_ms'] = round(totals['total_ms'], 3)
+        totals['max_ms'] = round(totals['max_ms'], 3)
+    return {'enabled': METRICS_ENABLED, 'stages': stages}
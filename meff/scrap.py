@@ -0,0 +1,193 @@
+import hashlib
+import os
+import threading
+import requests
+from io import StringIO
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup
+import lxml.html
+import pandas as pd
+from meff.metrics import stage
+
+FUTURES_TABLE_ID = 'Contenido_Contenido_tblFuturos'
+OPTION_PREFIXES = ('OPE', 'OCE')
+CONNECT_TIMEOUT = float(os.environ.get("MEFF_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("MEFF_READ_TIMEOUT", 20))
+MAX_RETRIES = int(os.environ.get("MEFF_MAX_RETRIES", 3))
+# One pooled connection per concurrently scraped product.
+POOL_SIZE = int(os.environ.get("SCRAPE_WORKERS", 4))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    Returns the process-wide HTTP session, so that warm Lambda invocations reuse its pooled
+    connections. Failed connections and 429/5xx responses are retried with exponential backoff.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=MAX_RETRIES, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=('GET',), raise_on_status=False)
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(max_retries=retry, pool_maxsize=POOL_SIZE))
+                session.mount('http://', HTTPAdapter(max_retries=retry, pool_maxsize=POOL_SIZE))
+                session.headers.update({'Accept-Encoding': 'gzip, deflate, br'})
+                # Published only once configured, the scrapes of other threads may read it unlocked.
+                _session = session
+    return _session
+
+
+class MeffScraper:
+    def __init__(self, url, parser='lxml', validators=None):
+        if parser not in ('lxml', 'bs4'):
+            raise ValueError(f"Unknown parser: {parser}")
+        self.url = url
+        self.parser = parser
+        self.validators = validators or {}
+        self.not_modified = False
+        self.response = None
+        self.soup = None
+        self.tree = None
+        self.futuros = None
+        self.options = None
+
+    def fetch_data(self):
+        """
+        Fetch the webpage content.
+
+        The request is conditional on the 'ETag' and 'LastModified' validators of a previous
+        fetch, and the page is only parsed if the server reports a change and its content
+        'Hash' differs. Otherwise not_modified is set.
+        """
+        headers = {}
+        if self.validators.get('ETag'):
+            headers['If-None-Match'] = self.validators['ETag']
+        if self.validators.get('LastModified'):
+            headers['If-Modified-Since'] = self.validators['LastModified']
+        with stage('scrape.fetch', url=self.url) as fetch:
+            self.response = get_session().get(self.url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            fetch.set(status=self.response.status_code, bytes=len(self.response.content))
+        if self.response.status_code == 304:
+            self.not_modified = True
+            return
+        self.response.raise_for_status()
+
+        content_hash = hashlib.sha256(self.response.content).hexdigest()
+        self.not_modified = content_hash == self.validators.get('Hash')
+        self.validators = {
+            'Hash': content_hash,
+            'ETag': self.response.headers.get('ETag'),
+            'LastModified': self.response.headers.get('Last-Modified'),
+        }
+        if not self.not_modified:
+            self.parse(self.response.content)
+
+    def parse(self, content):
+        """
+        Build the document tree of the selected parser backend.
+
+        Args:
+            content (bytes): The HTML of the page.
+        """
+        with stage('scrape.parse', parser=self.parser, bytes=len(content)):
+            if self.parser == 'lxml':
+                self.tree = lxml.html.fromstring(content)
+            else:
+                self.soup = BeautifulSoup(content, 'html.parser')
+
+    def extract_futures(self):
+        """
+        Extract futures data from the webpage content.
+        """
+        if self.parser == 'lxml':
+            self.futuros = self._extract_futures_lxml()
+            return
+        fut_table = self.soup.find('table', {'id': FUTURES_TABLE_ID})
+        self.futuros = pd.read_html(StringIO(str(fut_table)))[0]
+        self.futuros.columns = self.futuros.columns.droplevel(1)
+        self.futuros = self.futuros.iloc[0,-1]
+        self.futuros = float(self.futuros.replace('.', '').replace(',', '.'))
+
+    def _extract_futures_lxml(self):
+        """
+        Read the last cell of the first body row of the futures table with XPath.
+
+        Returns:
+            float: The futures price.
+        """
+        cells = self.tree.xpath(f"(//table[@id='{FUTURES_TABLE_ID}']//tr[td])[1]/td[last()]")
+        return float(cells[0].text_content().strip().replace('.', '').replace(',', '.'))
+
+    def extract_options(self):
+        """
+        Extract options data from the webpage content.
+
+        'STRIKE' and 'ANT' are kept as the strings of the page, e.g. '9.500,00' and '-' for a
+        missing premium, as stored in the raw items. They are converted to numbers by
+        adding_variables in the IV lambda.
+        """
+        if self.parser == 'lxml':
+            self.options = self._extract_options_lxml()
+            return
+        trs_ope = self.soup.find_all('tr', attrs={'data-tipo': lambda x: x and x.startswith('OPE')})
+        trs_oce = self.soup.find_all('tr', attrs={'data-tipo': lambda x: x and x.startswith('OCE')})
+        trs = trs_ope + trs_oce
+        rows = []
+
+        for tr in trs:
+            tds = tr.find_all('td')
+            data_tipo = tr['data-tipo']
+            row = {
+                'DATA-TIPO': data_tipo,
+                'STRIKE': tds[0].text,
+                'ANT': tds[-1].text,
+            }
+            rows.append(row)
+
+        self.options = pd.DataFrame(rows)
+
+    def _extract_options_lxml(self):
+        """
+        Collect the option rows selected by one XPath query into column lists, reading the
+        cells of each row from its children. Puts come before calls, in page order, as in the
+        BeautifulSoup backend.
+
+        Returns:
+            pd.DataFrame: The 'DATA-TIPO', 'STRIKE' and 'ANT' columns as strings, like the
+            BeautifulSoup backend.
+        """
+        columns = {prefix: ([], [], []) for prefix in OPTION_PREFIXES}
+        for tr in self.tree.xpath("//tr[starts-with(@data-tipo, 'OPE') or starts-with(@data-tipo, 'OCE')]"):
+            data_tipo = tr.get('data-tipo')
+            tds = tr.findall('td')
+            data_tipos, strikes, premiums = columns[data_tipo[:3]]
+            data_tipos.append(data_tipo)
+            strikes.append(tds[0].text_content())
+            premiums.append(tds[-1].text_content())
+        if not any(columns[prefix][0] for prefix in OPTION_PREFIXES):
+            return pd.DataFrame()
+        return pd.DataFrame({
+            'DATA-TIPO': columns['OPE'][0] + columns['OCE'][0],
+            'STRIKE': columns['OPE'][1] + columns['OCE'][1],
+            'ANT': columns['OPE'][2] + columns['OCE'][2],
+        })
+
+    def run(self):
+        """
+        Execute the scraping process, stopping after the fetch if the page did not change.
+        """
+        self.fetch_data()
+        if self.not_modified:
+            return
+        with stage('scrape.extract', parser=self.parser) as extract:
+            self.extract_futures()
+            self.extract_options()
+            extract.set(rows=len(self.options))
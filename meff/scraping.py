@@ -0,0 +1,236 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from meff.scrap import MeffScraper
+from meff.split_storage import DEFAULT_PRODUCT, table_name, put_item, index_key, product_key
+from meff.intraday import SNAPSHOT_TABLE_NAME, compact_state, store_snapshot
+from meff.columnar import OPTIONS_ENCODING, encode_options
+from meff.metrics import stage
+from meff.storage import dynamodb_resource
+import os
+from decimal import Decimal, Context, ROUND_HALF_EVEN
+import pandas as pd
+
+DYNAMODB_CONTEXT = Context(prec=3, rounding=ROUND_HALF_EVEN)
+DATE_INDEX_KEY = 'INDEX#DATES'
+# 'daily' overwrites the item of the day, 'intraday' appends a timestamped snapshot holding only the changed rows.
+# Intraday snapshots hold the raw quotes only: no daily item, date index entry, IV, surface or
+# smile is written for them, so the IV lambda and the dashboard keep reading the daily items.
+SNAPSHOT_MODE = os.environ.get("SNAPSHOT_MODE", "daily")
+# Intraday scrapes from this time on ('HH:MM:SS') compact the snapshots of the day into a single state item.
+SNAPSHOT_COMPACT_TIME = os.environ.get("SNAPSHOT_COMPACT_TIME", "17:45:00")
+MEFF_PARSER = os.environ.get("MEFF_PARSER", "lxml")
+MEFF_URL = "https://www.meff.es/esp/Derivados-Financieros/Ficha/{product}"
+# Comma separated MEFF option products, scraped concurrently by up to SCRAPE_WORKERS threads.
+MEFF_PRODUCTS = [p.strip() for p in os.environ.get("MEFF_PRODUCTS", DEFAULT_PRODUCT).split(',') if p.strip()]
+SCRAPE_WORKERS = int(os.environ.get("SCRAPE_WORKERS", 4))
+
+def convert_floats_to_decimals(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts all float values in the DataFrame to rounded decimal values.
+
+    Args:
+        df (pandas.DataFrame): The DataFrame to convert.
+
+    Returns:
+        pandas.DataFrame: The DataFrame with float values converted to decimals.
+    """
+    for column in df.columns:
+        if df[column].dtype == 'float64':
+            df[column] = df[column].apply(lambda x: DYNAMODB_CONTEXT.create_decimal_from_float(x).quantize(Decimal(".01"), rounding=ROUND_HALF_EVEN))
+    return df
+
+
+def backfill_date_index(table, product=DEFAULT_PRODUCT):
+    """
+    Rebuilds the date index item of a product from a projection-only scan of the table.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table holding the snapshots.
+        product (str, optional): The MEFF product whose dates are indexed.
+    """
+    prefix = product_key(product, '')
+    dates = set()
+    scan_kwargs = {'ProjectionExpression': '#d', 'ExpressionAttributeNames': {'#d': 'Date'}}
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response['Items']:
+            if item['Date'].startswith(prefix) and '#' not in item['Date'][len(prefix):]:
+                dates.add(item['Date'][len(prefix):])
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    if dates:
+        table.update_item(
+            Key=index_key(product_key(product, DATE_INDEX_KEY)),
+            UpdateExpression='ADD Dates :d',
+            ExpressionAttributeValues={':d': dates}
+        )
+
+
+def add_to_date_index(table, date, product=DEFAULT_PRODUCT):
+    """
+    Adds a date to the index item listing every stored partition key of a product, so that
+    readers don't need to scan the table. The index is backfilled the first time it is created.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table holding the snapshots.
+        date (str): The date to add.
+        product (str, optional): The MEFF product the date was scraped for.
+    """
+    response = table.update_item(
+        Key=index_key(product_key(product, DATE_INDEX_KEY)),
+        UpdateExpression='ADD Dates :d',
+        ExpressionAttributeValues={':d': {date}},
+        ReturnValues='UPDATED_OLD'
+    )
+    if 'Dates' not in response.get('Attributes', {}):
+        backfill_date_index(table, product)
+
+
+def get_page_validators(table, date, product=DEFAULT_PRODUCT):
+    """
+    Reads the validators of the last fetch of a MEFF page, stored in the date index item of its product.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The DynamoDB table holding the snapshots.
+        date (str): The date of the scrape. Validators of another date are ignored, so that
+            every date gets its snapshot even if the page did not change overnight.
+        product (str, optional): The MEFF product of the page.
+
+    Returns:
+        dict: 'Hash', 'ETag' and 'LastModified' of the last fetch, or None.
+    """
+    response = table.get_item(Key=index_key(product_key(product, DATE_INDEX_KEY)), ProjectionExpression='#p',
+                              ExpressionAttributeNames={'#p': 'Page'})
+    page = response.get('Item', {}).get('Page')
+    if not page or page.get('Date') != date:
+        return None
+    return page
+
+
+def store_page_validators(table, date, validators, product=DEFAULT_PRODUCT):
+    """
+    Stores the validators of the last fetch of a MEFF page in the date index item of its product.
+    """
+    table.update_item(
+        Key=index_key(product_key(product, DATE_INDEX_KEY)),
+        UpdateExpression='SET Page = :p',
+        ExpressionAttributeValues={':p': dict(validators, Date=date)}
+    )
+
+
+def scrape_product(product, now, enrich=None):
+    """
+    Scrapes the page of one MEFF product and stores it under the product's key namespace.
+
+    Args:
+        product (str): The MEFF product, e.g. 'FIEM_MiniIbex_35'.
+        now (datetime): The time of the scrape.
+        enrich (callable, optional): Called as enrich(item, options, product, now, table) with
+            the raw item ('Date' and 'Futures') and the scraped options DataFrame, it returns
+            the item to store, its stats, and a callback run once the item is stored. The options
+            are then enriched in memory and written once, instead of being stored raw for the IV
+            lambda. Not used in the intraday mode, whose snapshots are stored without IV.
+
+    Returns:
+        tuple: The outcome, 'stored', 'enriched', or 'unchanged' if the page did not change since its
+        last fetch of the day, and the stats returned by enrich, None when the scrape was not enriched.
+    """
+    # boto3 resources are not thread-safe, every scrape gets its own session.
+    dynamodb = dynamodb_resource(own_session=True, region_name='eu-central-1')
+    today = now.strftime('%Y-%m-%d')
+    table = dynamodb.Table(table_name())
+
+    meff_scraper = MeffScraper(MEFF_URL.format(product=product), parser=MEFF_PARSER,
+                               validators=get_page_validators(table, today, product))
+    meff_scraper.run()
+    if meff_scraper.not_modified:
+        return 'unchanged', None
+
+    futures = DYNAMODB_CONTEXT.create_decimal_from_float(meff_scraper.futuros).quantize(Decimal(".01"), rounding=ROUND_HALF_EVEN)
+
+    stats = None
+    if SNAPSHOT_MODE == 'intraday':
+        options = convert_floats_to_decimals(meff_scraper.options)
+        options = options.to_dict(orient='records')
+        snapshot_table = dynamodb.Table(SNAPSHOT_TABLE_NAME)
+        timestamp = now.strftime('%H:%M:%S')
+        with stage('dynamodb.store_snapshot', product=product, rows=len(options)):
+            store_snapshot(snapshot_table, product_key(product, today), timestamp, futures, options)
+        if timestamp >= SNAPSHOT_COMPACT_TIME:
+            with stage('dynamodb.compact_state', product=product) as compaction:
+                compacted = compact_state(snapshot_table, product_key(product, today))
+                compaction.set(outcome='compacted' if compacted else 'skipped')
+    else:
+        item = {
+            'Date': product_key(product, today),
+            'Futures': futures
+        }
+        stored = None
+        if enrich is not None:
+            item, stats, stored = enrich(item, meff_scraper.options, product, now, table)
+        else:
+            with stage('store.encode', encoding=OPTIONS_ENCODING, rows=len(meff_scraper.options)):
+                if OPTIONS_ENCODING == 'columnar':
+                    item['Columns'] = encode_options(meff_scraper.options)
+                else:
+                    item['Options'] = convert_floats_to_decimals(meff_scraper.options).to_dict(orient='records')
+        put_item(table, item)
+        if stored is not None:
+            stored()
+        add_to_date_index(table, today, product)
+    store_page_validators(table, today, meff_scraper.validators, product)
+    return ('enriched' if stats is not None else 'stored'), stats
+
+
+def timed_scrape(product, now, enrich=None):
+    """
+    Runs scrape_product as a stage labelled with the product, its outcome and the IV stats of
+    an enriched scrape.
+    """
+    with stage('pipeline.product', product=product) as pipeline:
+        outcome, stats = scrape_product(product, now, enrich)
+        pipeline.set(outcome=outcome, **(stats or {}))
+        return outcome, stats
+
+
+def run_web_scraping(products=None, enrich=None):
+    """
+    Scrapes the Meff website for financial derivatives data, cleans the data, 
+    and stores it in a DynamoDB table.
+
+    Every product of MEFF_PRODUCTS is scraped concurrently in a bounded thread pool. For each
+    one the page is fetched, parsed and stored under the product's key namespace, and its date
+    is added to the product's date index item. The page is fetched conditionally on the
+    validators of the previous fetch of the day, and when it did not change the parsing and
+    the write are skipped altogether.
+    In the intraday snapshot mode, the scrape is instead appended as a timestamped snapshot
+    of the day that only holds the rows that changed since the previous one, and the first scrape
+    from SNAPSHOT_COMPACT_TIME on compacts the day into a single state item. Those snapshots
+    are not enriched, the IV is only calculated for the daily items.
+
+    Args:
+        products (list, optional): The MEFF products to scrape, MEFF_PRODUCTS by default.
+        enrich (callable, optional): Enriches each scrape in memory before its single write,
+            see scrape_product. Used by the fused pipeline of the IV lambda.
+
+    Returns:
+        dict: The result of each product, with its 'outcome', 'stored', 'enriched', 'unchanged' or 'error',
+        and either the 'iv_stats' of an enriched scrape, e.g. {'reused': 640, 'warm': 172, 'cold': 72}, or the 'error'
+        that made it fail. A failing product does not stop the others, only the failure of all of them is raised.
+    """
+    products = products or MEFF_PRODUCTS
+    now = datetime.today()
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(SCRAPE_WORKERS, len(products)))) as executor:
+        futures = {product: executor.submit(timed_scrape, product, now, enrich) for product in products}
+        for product, future in futures.items():
+            try:
+                outcome, stats = future.result()
+                results[product] = {'outcome': outcome, 'iv_stats': stats}
+            except Exception as e:
+                results[product] = {'outcome': 'error', 'error': repr(e)}
+            print(f"{product}: {results[product]}")
+    if all(result['outcome'] == 'error' for result in results.values()):
+        raise RuntimeError(f"Every MEFF product failed: {results}")
+    return results
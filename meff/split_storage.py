@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+from boto3.dynamodb.conditions import Key
+from meff.columnar import encode_options, decode_options, concat_options, options_frame
+from meff.metrics import METRICS_ENABLED, stage, capacity_kwargs, consumed_capacity, item_bytes
+
+# 'single' keeps one item per date in MeffScrapping, 'split' stores one item per
+# (date, expiry, call/put) slice in SPLIT_TABLE_NAME, with 'Date' as partition key and
+# 'Slice' as sort key.
+STORAGE_LAYOUT = os.environ.get("STORAGE_LAYOUT", "single")
+TABLE_NAME = 'MeffScrapping'
+SPLIT_TABLE_NAME = os.environ.get("SPLIT_TABLE_NAME", "MeffScrappingSlices")
+META_SLICE = 'META'
+# Items of the default product keep the bare date as key, those of the other MEFF products
+# are namespaced as '<product>#<date>'.
+# This module is shared by the Lambdas, which write the snapshots, and by the API and the
+# dashboard, which read them.
+DEFAULT_PRODUCT = 'FIEM_MiniIbex_35'
+
+
+def table_name():
+    """
+    Returns the name of the table used by the configured storage layout.
+    """
+    return SPLIT_TABLE_NAME if STORAGE_LAYOUT == 'split' else TABLE_NAME
+
+
+def product_key(product: str, key: str) -> str:
+    """
+    Namespaces a partition key (a date or the date index key) by MEFF product.
+
+    Args:
+        product (str): The MEFF product, e.g. 'FIEM_MiniIbex_35'.
+        key (str): The key within the product, e.g. '2023-06-16'.
+
+    Returns:
+        str: The key itself for DEFAULT_PRODUCT, '<product>#<key>' otherwise.
+    """
+    return key if product == DEFAULT_PRODUCT else f"{product}#{key}"
+
+
+def slice_key(data_tipo: str) -> str:
+    """
+    Builds the sort key of the slice an option belongs to, from its 'DATA-TIPO'.
+
+    Args:
+        data_tipo (str): The MEFF contract type, e.g. 'OCE20230616'.
+
+    Returns:
+        str: The slice key, e.g. '2023-06-16#CALL', so that one expiry can be queried with begins_with.
+    """
+    exp_date = f"{data_tipo[3:7]}-{data_tipo[7:9]}-{data_tipo[9:11]}"
+    return f"{exp_date}#{'CALL' if data_tipo[1] == 'C' else 'PUT'}"
+
+
+def content_hash(attributes: dict) -> str:
+    """
+    Hashes the attributes of a slice, used to skip rewriting unchanged slices.
+    """
+    return hashlib.sha1(json.dumps(attributes, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def split_item(item: dict) -> list:
+    """
+    Splits a single-item snapshot into slice items.
+
+    Args:
+        item (dict): Item with 'Date', 'Options' or 'Columns' and any other per-date attributes
+            ('Futures', 'Surfaces').
+
+    Returns:
+        list: One item per slice with its options, in the encoding of the item, plus the META
+        item holding the per-date attributes.
+    """
+    meta = {name: value for name, value in item.items() if name not in ('Date', 'Options', 'Columns')}
+    items = [dict(meta, Date=item['Date'], Slice=META_SLICE, Hash=content_hash(meta))]
+    if 'Columns' in item:
+        options = decode_options(item['Columns'])
+        if options.empty:
+            return items
+        for key, group in options.groupby(options['DATA-TIPO'].map(slice_key), sort=False):
+            blob = encode_options(group.reset_index(drop=True))
+            items.append({'Date': item['Date'], 'Slice': key, 'Columns': blob,
+                          'Hash': hashlib.sha1(blob).hexdigest()})
+        return items
+
+    slices = {}
+    for option in item['Options']:
+        slices.setdefault(slice_key(option['DATA-TIPO']), []).append(option)
+    for key, options in slices.items():
+        items.append({'Date': item['Date'], 'Slice': key, 'Options': options, 'Hash': content_hash(options)})
+    return items
+
+
+def merge_slices(slices: list) -> dict:
+    """
+    Rebuilds a single-item snapshot from its slice items.
+
+    Args:
+        slices (list): Slice items of one date, as returned by a query.
+
+    Returns:
+        dict: The item with 'Date', 'Options' (or 'Columns' if the slices are columnar) and the
+        per-date attributes, or None if there are no slices.
+    """
+    if not slices:
+        return None
+    item = {'Date': slices[0]['Date'], 'Options': []}
+    frames = []
+    for slice_item in sorted(slices, key=lambda s: s['Slice']):
+        if slice_item['Slice'] == META_SLICE:
+            item.update({name: value for name, value in slice_item.items() if name not in ('Slice', 'Hash')})
+        elif 'Columns' in slice_item:
+            frames.append(decode_options(slice_item['Columns']))
+        else:
+            item['Options'].extend(slice_item.get('Options', []))
+    if frames:
+        del item['Options']
+        item['Columns'] = encode_options(concat_options(frames))
+    return item
+
+
+def slices_frame(slices: list):
+    """
+    Concatenates the options of slice items into one DataFrame, skipping the META item.
+
+    Args:
+        slices (list): Slice items, as returned by query_slices.
+
+    Returns:
+        pd.DataFrame: The options of the slices, empty if there are none.
+    """
+    return concat_options([options_frame(s) for s in slices if s['Slice'] != META_SLICE])
+
+
+def query_slices(table, date: str, prefix: str = None, projection: str = None) -> list:
+    """
+    Queries the slice items of a date, optionally only those whose key starts with a prefix.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The split table.
+        date (str): The date of the snapshot.
+        prefix (str, optional): Slice key prefix, e.g. an expiration date.
+        projection (str, optional): Comma separated attributes to return.
+
+    Returns:
+        list: The slice items.
+    """
+    condition = Key('Date').eq(date)
+    if prefix is not None:
+        condition = condition & Key('Slice').begins_with(prefix)
+    query_kwargs = {'KeyConditionExpression': condition}
+    if projection is not None:
+        names = projection.split(',')
+        query_kwargs['ProjectionExpression'] = ','.join(f'#p{i}' for i in range(len(names)))
+        query_kwargs['ExpressionAttributeNames'] = {f'#p{i}': name for i, name in enumerate(names)}
+    items = []
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response['Items'])
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def write_split_item(table, item: dict) -> int:
+    """
+    Stores a snapshot in the split table, writing only the slices whose content changed
+    and deleting the slices that no longer exist.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The split table.
+        item (dict): Single-item snapshot with 'Date', 'Options' or 'Columns' and the per-date attributes.
+
+    Returns:
+        int: The number of slice items written.
+    """
+    existing = {s['Slice']: s.get('Hash') for s in query_slices(table, item['Date'], projection='Slice,Hash')}
+    written = 0
+    with table.batch_writer() as batch:
+        for slice_item in split_item(item):
+            if existing.pop(slice_item['Slice'], None) != slice_item['Hash']:
+                batch.put_item(Item=slice_item)
+                written += 1
+        for stale in existing:
+            batch.delete_item(Key={'Date': item['Date'], 'Slice': stale})
+    return written
+
+
+def get_item(table, date: str, exp_date: str = None) -> dict:
+    """
+    Fetches the snapshot of a date in the configured storage layout.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The table returned by dynamodb.Table(table_name()).
+        date (str): The date of the snapshot.
+        exp_date (str, optional): In the split layout, only read the slices of this expiration
+            date and the META item. The single layout item is always read whole.
+
+    Returns:
+        dict: The item with 'Date', 'Options' or 'Columns' and the per-date attributes, or None if not found.
+    """
+    with stage('dynamodb.get_item', layout=STORAGE_LAYOUT) as read:
+        if STORAGE_LAYOUT == 'split':
+            slices = query_slices(table, date, prefix=exp_date)
+            if slices and exp_date is not None:
+                slices.append(table.get_item(Key=index_key(date)).get('Item', {'Date': date, 'Slice': META_SLICE}))
+            return merge_slices(slices)
+        response = table.get_item(Key={'Date': date}, **capacity_kwargs())
+        read.set(capacity=consumed_capacity(response))
+        return response.get('Item')
+
+
+def put_item(table, item: dict):
+    """
+    Stores a snapshot in the configured storage layout.
+
+    Args:
+        table (boto3.resources.factory.dynamodb.Table): The table returned by dynamodb.Table(table_name()).
+        item (dict): Single-item snapshot with 'Date', 'Options' or 'Columns' and the per-date attributes.
+    """
+    with stage('dynamodb.put_item', layout=STORAGE_LAYOUT) as write:
+        if METRICS_ENABLED:
+            write.set(bytes=item_bytes(item))
+        if STORAGE_LAYOUT == 'split':
+            write.set(slices=write_split_item(table, item))
+        else:
+            response = table.put_item(Item=item, **capacity_kwargs())
+            write.set(capacity=consumed_capacity(response))
+
+
+def index_key(date: str) -> dict:
+    """
+    Returns the primary key of the item holding the per-date attributes of a date, or of
+    the date index item, in the configured storage layout.
+    """
+    if STORAGE_LAYOUT == 'split':
+        return {'Date': date, 'Slice': META_SLICE}
+    return {'Date': date}
@@ -0,0 +1,409 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+from types import SimpleNamespace
+import boto3
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+# 'dynamodb' stores the tables in DynamoDB, 'sqlite' in the local SQLite file STORAGE_PATH, to
+# run backfills, benchmarks and historical queries on a laptop or a batch node at disk speed.
+# Both are used through the boto3 DynamoDB resource interface, see dynamodb_resource.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "dynamodb")
+STORAGE_PATH = os.environ.get("STORAGE_PATH", "meff.sqlite3")
+# (partition key, sort key) of the tables of the project, registered on first use in SQLite.
+KEY_SCHEMAS = {
+    'MeffScrapping': ('Date', None),
+    os.environ.get("SPLIT_TABLE_NAME", "MeffScrappingSlices"): ('Date', 'Slice'),
+    os.environ.get("SNAPSHOT_TABLE_NAME", "MeffScrappingSnapshots"): ('Date', 'Timestamp'),
+    os.environ.get("AGGREGATES_TABLE_NAME", "MeffScrappingAggregates"): ('Product', 'Date'),
+}
+# Upper bound of every string starting with a given prefix, for begins_with conditions.
+PREFIX_END = '\U0010ffff'
+# Arguments of the boto3 table methods that don't change the result and are accepted by
+# SQLiteTable without effect. Any other one, e.g. a FilterExpression, raises NotImplementedError.
+IGNORED_ARGUMENTS = ('ReturnConsumedCapacity', 'ConsistentRead')
+# The clauses of an update expression supported by SQLiteTable.update_item.
+UPDATE_CLAUSE = re.compile(r'\b(SET|ADD|REMOVE|DELETE)\b')
+SET_ACTION = re.compile(r'\s*(#?\w+)\s*=\s*(:\w+)\s*')
+ADD_ACTION = re.compile(r'\s*(#?\w+)\s+(:\w+)\s*')
+
+serializer = TypeSerializer()
+deserializer = TypeDeserializer()
+_resources = {}
+_resources_lock = threading.Lock()
+
+
+def wire_to_json(value):
+    """
+    Makes a value of the DynamoDB wire format JSON serializable, binaries become base64 strings.
+    """
+    (kind, data), = value.items()
+    if kind == 'B':
+        return {kind: base64.b64encode(bytes(data)).decode('ascii')}
+    if kind == 'BS':
+        return {kind: [base64.b64encode(bytes(member)).decode('ascii') for member in data]}
+    if kind == 'M':
+        return {kind: {name: wire_to_json(member) for name, member in data.items()}}
+    if kind == 'L':
+        return {kind: [wire_to_json(member) for member in data]}
+    return value
+
+
+def json_to_wire(value):
+    """
+    Reverses wire_to_json.
+    """
+    (kind, data), = value.items()
+    if kind == 'B':
+        return {kind: base64.b64decode(data)}
+    if kind == 'BS':
+        return {kind: [base64.b64decode(member) for member in data]}
+    if kind == 'M':
+        return {kind: {name: json_to_wire(member) for name, member in data.items()}}
+    if kind == 'L':
+        return {kind: [json_to_wire(member) for member in data]}
+    return value
+
+
+def dynamodb_resource(own_session=False, **kwargs):
+    """
+    Returns the DynamoDB service resource of the configured STORAGE_BACKEND.
+
+    Args:
+        own_session (bool, optional): Build the boto3 resource from a new session, as boto3
+            resources are not thread-safe. The SQLite resource is shared by every thread.
+        **kwargs: Arguments of boto3.resource, such as region_name or credentials.
+
+    Returns:
+        boto3.resources.factory.dynamodb.ServiceResource or SQLiteResource: The resource.
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        with _resources_lock:
+            if STORAGE_PATH not in _resources:
+                _resources[STORAGE_PATH] = SQLiteResource(STORAGE_PATH)
+            return _resources[STORAGE_PATH]
+    if own_session:
+        return boto3.session.Session().resource('dynamodb', **kwargs)
+    return boto3.resource('dynamodb', **kwargs)
+
+
+def projected_names(projection, attribute_names):
+    """
+    Resolves the top-level attribute names of a ProjectionExpression.
+    """
+    if projection is None:
+        return None
+    return {(attribute_names or {}).get(name.strip(), name.strip()) for name in projection.split(',')}
+
+
+def reject_unsupported(method, arguments):
+    """
+    Raises NotImplementedError for the arguments of a boto3 table method that SQLiteTable
+    doesn't implement, instead of silently returning a result that ignores them.
+    """
+    unsupported = sorted(name for name in arguments if name not in IGNORED_ARGUMENTS)
+    if unsupported:
+        raise NotImplementedError(f"{method} does not support {', '.join(unsupported)} in SQLite")
+
+
+def update_actions(expression, attribute_names, values):
+    """
+    Parses an update expression made of 'SET name = :value, ...' and 'ADD name :value, ...' clauses.
+
+    Returns:
+        list: The (action, attribute name, value) of every assignment.
+    """
+    parts = UPDATE_CLAUSE.split(expression)
+    if parts[0].strip():
+        raise ValueError(f"Unsupported update expression: {expression}")
+    actions = []
+    for action, clause in zip(parts[1::2], parts[2::2]):
+        pattern = {'SET': SET_ACTION, 'ADD': ADD_ACTION}.get(action)
+        if pattern is None:
+            raise NotImplementedError(f"{action} clauses are not supported in SQLite")
+        for assignment in clause.split(','):
+            match = pattern.fullmatch(assignment)
+            if match is None:
+                raise ValueError(f"Unsupported {action} action: {assignment.strip()}")
+            name, value = match.groups()
+            if name.startswith('#') and name not in attribute_names:
+                raise ValueError(f"{name} is not in ExpressionAttributeNames")
+            if value not in values:
+                raise ValueError(f"{value} is not in ExpressionAttributeValues")
+            actions.append((action, attribute_names.get(name, name), values[value]))
+    if not actions:
+        raise ValueError(f"Unsupported update expression: {expression}")
+    return actions
+
+
+def key_condition(condition, hash_key, range_key):
+    """
+    Translates a boto3 key condition, e.g. Key('Date').eq(date) & Key('Slice').begins_with(prefix),
+    into an SQL condition on the 'pk' and 'sk' columns.
+
+    Returns:
+        tuple: The SQL condition and its parameters.
+    """
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        left, left_parameters = key_condition(values[0], hash_key, range_key)
+        right, right_parameters = key_condition(values[1], hash_key, range_key)
+        return f"{left} AND {right}", left_parameters + right_parameters
+
+    name = values[0].name
+    if name not in (hash_key, range_key):
+        raise ValueError(f"{name} is not a key attribute")
+    column = 'pk' if name == hash_key else 'sk'
+    if operator in ('=', '<', '<=', '>', '>='):
+        return f"{column} {operator} ?", [values[1]]
+    if operator == 'BETWEEN':
+        return f"{column} BETWEEN ? AND ?", [values[1], values[2]]
+    if operator == 'begins_with':
+        return f"{column} >= ? AND {column} < ?", [values[1], values[1] + PREFIX_END]
+    raise ValueError(f"Unsupported key condition: {operator}")
+
+
+class SQLiteResource:
+    """
+    Local stand-in for the boto3 DynamoDB service resource, storing every table in one SQLite
+    file. Items are kept as JSON of the DynamoDB wire format, one row per (table, partition key,
+    sort key), so that the primary key index serves the date and date/expiry lookups of the
+    project. Binary attributes are base64 encoded, see wire_to_json.
+    Only the subset of the DynamoDB API used by the project is implemented, the other
+    arguments raise NotImplementedError instead of being ignored.
+
+    Every thread gets its own connection, the file is opened in WAL mode so that readers
+    don't block the writer.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self.connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS key_schemas "
+                           "(table_name TEXT PRIMARY KEY, hash_key TEXT NOT NULL, range_key TEXT)")
+        connection.execute("CREATE TABLE IF NOT EXISTS items (table_name TEXT NOT NULL, pk TEXT NOT NULL, "
+                           "sk TEXT NOT NULL, item TEXT NOT NULL, PRIMARY KEY (table_name, pk, sk)) WITHOUT ROWID")
+        # create_split_table lists the tables through dynamodb.meta.client.
+        self.meta = SimpleNamespace(client=self)
+
+    def connection(self):
+        """
+        Returns the SQLite connection of the current thread, in autocommit mode.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def key_schema(self, name):
+        row = self.connection().execute("SELECT hash_key, range_key FROM key_schemas WHERE table_name = ?",
+                                        (name,)).fetchone()
+        if row is not None:
+            return row
+        if name not in KEY_SCHEMAS:
+            raise ValueError(f"Unknown table: {name}")
+        self.register(name, *KEY_SCHEMAS[name])
+        return KEY_SCHEMAS[name]
+
+    def register(self, name, hash_key, range_key=None):
+        self.connection().execute("INSERT OR IGNORE INTO key_schemas VALUES (?, ?, ?)", (name, hash_key, range_key))
+
+    def Table(self, name):
+        return SQLiteTable(self, name)
+
+    def create_table(self, TableName, KeySchema, **kwargs):
+        keys = {key['KeyType']: key['AttributeName'] for key in KeySchema}
+        self.register(TableName, keys['HASH'], keys.get('RANGE'))
+        return self.Table(TableName)
+
+    def list_tables(self, **kwargs):
+        rows = self.connection().execute("SELECT table_name FROM key_schemas ORDER BY table_name").fetchall()
+        return {'TableNames': [row[0] for row in rows]}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        reject_unsupported('batch_get_item', kwargs)
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            items = [table.get_item(Key=key, ProjectionExpression=request.get('ProjectionExpression'),
+                                    ExpressionAttributeNames=request.get('ExpressionAttributeNames')).get('Item')
+                     for key in request['Keys']]
+            responses[name] = [item for item in items if item is not None]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+
+class SQLiteTable:
+    """
+    A table of a SQLiteResource, with the get_item, put_item, update_item, delete_item, query,
+    scan and batch_writer methods of boto3 tables.
+    """
+
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = name
+        self.hash_key, self.range_key = resource.key_schema(name)
+
+    def _key(self, key):
+        return str(key[self.hash_key]), str(key[self.range_key]) if self.range_key else ''
+
+    def _encode(self, item):
+        # The serializer rejects what DynamoDB would, e.g. floats.
+        return json.dumps({name: wire_to_json(serializer.serialize(value)) for name, value in item.items()},
+                          separators=(',', ':'))
+
+    @staticmethod
+    def _decode(text, names=None):
+        stored = json.loads(text)
+        return {name: deserializer.deserialize(json_to_wire(value)) for name, value in stored.items()
+                if names is None or name in names}
+
+    def _read(self, connection, key, names=None):
+        row = connection.execute("SELECT item FROM items WHERE table_name = ? AND pk = ? AND sk = ?",
+                                 (self.name, *self._key(key))).fetchone()
+        return self._decode(row[0], names) if row is not None else None
+
+    def _write(self, connection, item):
+        connection.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                           (self.name, *self._key(item), self._encode(item)))
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        reject_unsupported('get_item', kwargs)
+        item = self._read(self.resource.connection(), Key, projected_names(ProjectionExpression,
+                                                                           ExpressionAttributeNames))
+        return {'Item': item} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        reject_unsupported('put_item', kwargs)
+        self._write(self.resource.connection(), Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        reject_unsupported('delete_item', kwargs)
+        self.resource.connection().execute("DELETE FROM items WHERE table_name = ? AND pk = ? AND sk = ?",
+                                           (self.name, *self._key(Key)))
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None, ExpressionAttributeNames=None,
+                    ReturnValues='NONE', **kwargs):
+        """
+        Applies 'SET name = :value, ...' and 'ADD name :value, ...' clauses, ADD being the
+        union of sets or the sum of numbers, atomically. Other expressions, such as REMOVE
+        clauses or functions, raise an error.
+        """
+        reject_unsupported('update_item', kwargs)
+        if ReturnValues not in ('NONE', 'UPDATED_OLD', 'ALL_NEW'):
+            raise NotImplementedError(f"ReturnValues={ReturnValues} is not supported in SQLite")
+        actions = update_actions(UpdateExpression, ExpressionAttributeNames or {}, ExpressionAttributeValues or {})
+        connection = self.resource.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            item = self._read(connection, Key) or dict(Key)
+            old = {}
+            for action, name, value in actions:
+                if name in item:
+                    old[name] = item[name]
+                if action == 'ADD' and name in item:
+                    value = item[name] | value if isinstance(value, set) else item[name] + value
+                item[name] = value
+            self._write(connection, item)
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        if ReturnValues == 'UPDATED_OLD':
+            return {'Attributes': old}
+        if ReturnValues == 'ALL_NEW':
+            return {'Attributes': item}
+        return {}
+
+    def query(self, KeyConditionExpression, ScanIndexForward=True, Limit=None, ExclusiveStartKey=None,
+              ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        reject_unsupported('query', kwargs)
+        condition, parameters = key_condition(KeyConditionExpression, self.hash_key, self.range_key)
+        order = 'ASC' if ScanIndexForward else 'DESC'
+        if ExclusiveStartKey is not None:
+            condition += f" AND sk {'>' if ScanIndexForward else '<'} ?"
+            parameters.append(self._key(ExclusiveStartKey)[1])
+        sql = f"SELECT item FROM items WHERE table_name = ? AND {condition} ORDER BY pk {order}, sk {order}"
+        if Limit is not None:
+            sql += f" LIMIT {int(Limit)}"
+        names = projected_names(ProjectionExpression, ExpressionAttributeNames)
+        rows = self.resource.connection().execute(sql, [self.name] + parameters).fetchall()
+        response = {'Items': [self._decode(row[0], names) for row in rows]}
+        if Limit is not None and len(rows) == Limit:
+            last = self._decode(rows[-1][0], {self.hash_key, self.range_key})
+            response['LastEvaluatedKey'] = last
+        return response
+
+    def scan(self, Limit=None, ExclusiveStartKey=None, ProjectionExpression=None, ExpressionAttributeNames=None,
+             **kwargs):
+        """
+        Returns the items in key order, a page of Limit items at a time after ExclusiveStartKey.
+        """
+        reject_unsupported('scan', kwargs)
+        condition, parameters = "table_name = ?", [self.name]
+        if ExclusiveStartKey is not None:
+            pk, sk = self._key(ExclusiveStartKey)
+            condition += " AND (pk > ? OR (pk = ? AND sk > ?))"
+            parameters += [pk, pk, sk]
+        sql = f"SELECT item FROM items WHERE {condition} ORDER BY pk, sk"
+        if Limit is not None:
+            sql += f" LIMIT {int(Limit)}"
+        names = projected_names(ProjectionExpression, ExpressionAttributeNames)
+        rows = self.resource.connection().execute(sql, parameters).fetchall()
+        response = {'Items': [self._decode(row[0], names) for row in rows]}
+        if Limit is not None and len(rows) == Limit:
+            response['LastEvaluatedKey'] = self._decode(rows[-1][0], {self.hash_key, self.range_key})
+        return response
+
+    def batch_writer(self, **kwargs):
+        reject_unsupported('batch_writer', kwargs)
+        return SQLiteBatchWriter(self)
+
+    def wait_until_exists(self):
+        pass
+
+
+class SQLiteBatchWriter:
+    """
+    Collects the puts and deletes of a batch_writer() block and applies them in one transaction.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.operations = []
+
+    def put_item(self, Item):
+        self.operations.append(('put', Item))
+
+    def delete_item(self, Key):
+        self.operations.append(('delete', Key))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            return False
+        connection = self.table.resource.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            for operation, value in self.operations:
+                if operation == 'put':
+                    self.table._write(connection, value)
+                else:
+                    connection.execute("DELETE FROM items WHERE table_name = ? AND pk = ? AND sk = ?",
+                                       (self.table.name, *self.table._key(value)))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return False
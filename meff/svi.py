@@ -0,0 +1,208 @@
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    from scipy.optimize import least_squares
+except ImportError:
+    least_squares = None
+
+# Raw SVI parameterization of the total implied variance w = IV^2 * TTM of one smile, as a
+# function of the log-moneyness k = log(strike / futures):
+#     w(k) = A + B * (RHO * (k - M) + sqrt((k - M)^2 + SIGMA^2))
+SVI_PARAMETERS = ('A', 'B', 'RHO', 'M', 'SIGMA')
+SVI_MIN_POINTS = int(os.environ.get("SVI_MIN_POINTS", 5))
+# Number of M and SIGMA values tried by the grid search, SVI_GRID_SIZE^2 candidates per smile.
+SVI_GRID_SIZE = int(os.environ.get("SVI_GRID_SIZE", 24))
+# The refinement starts from the best grid candidate, it usually converges in about ten evaluations.
+SVI_MAX_EVALUATIONS = int(os.environ.get("SVI_MAX_EVALUATIONS", 50))
+MIN_SIGMA = 1e-3
+MAX_SIGMA = 2.0
+MAX_RHO = 0.999
+
+
+def svi_total_variance(k, smile: dict) -> np.ndarray:
+    """
+    Evaluates the total implied variance of a fitted smile.
+
+    Args:
+        k (float or np.array): Log-moneyness, log(strike / futures).
+        smile (dict): The SVI_PARAMETERS of the smile, as floats or Decimals.
+
+    Returns:
+        np.array: The total variance IV^2 * TTM, IV as a decimal.
+    """
+    a, b, rho, m, sigma = (float(smile[name]) for name in SVI_PARAMETERS)
+    y = np.asarray(k, dtype=float) - m
+    return a + b * (rho * y + np.sqrt(y * y + sigma * sigma))
+
+
+def svi_iv(k, smile: dict, ttm: float) -> np.ndarray:
+    """
+    Evaluates the implied volatility of a fitted smile.
+
+    Args:
+        k (float or np.array): Log-moneyness, log(strike / futures).
+        smile (dict): The SVI_PARAMETERS of the smile, as floats or Decimals.
+        ttm (float): Time to maturity in years.
+
+    Returns:
+        np.array: Implied volatilities in percentage points, NaN where the variance is not positive.
+    """
+    w = svi_total_variance(k, smile)
+    with np.errstate(invalid='ignore'):
+        return np.where(w > 0, np.sqrt(np.maximum(w, 0) / float(ttm)) * 100, np.nan)
+
+
+def fit_linear(k: np.ndarray, w: np.ndarray, m: np.ndarray, sigma: np.ndarray):
+    """
+    For fixed M and SIGMA the total variance is linear in A, B * RHO and B, so the best smile
+    of every (M, SIGMA) candidate is a 3 x 3 least-squares problem. They are all solved at once.
+    Solutions with B < 0 or |RHO| > MAX_RHO are clipped to those bounds, and their A solved again.
+
+    Args:
+        k (np.array): Log-moneyness of the quotes.
+        w (np.array): Total variance of the quotes.
+        m (np.array): M of every candidate.
+        sigma (np.array): SIGMA of every candidate.
+
+    Returns:
+        tuple: The (candidates, 5) array of parameters and the sum of squared residuals of
+        every candidate.
+    """
+    y = k[None, :] - m[:, None]
+    z = np.sqrt(y * y + sigma[:, None] ** 2)
+    basis = np.stack([np.ones_like(y), y, z], axis=2)
+    normal = basis.transpose(0, 2, 1) @ basis
+    # A tiny ridge keeps the normal equations solvable when y and z are collinear (SIGMA -> 0).
+    normal += 1e-10 * np.trace(normal, axis1=1, axis2=2)[:, None, None] * np.eye(3)
+    coefficients = np.linalg.solve(normal, (basis.transpose(0, 2, 1) @ w)[..., None])[..., 0]
+    _, b_rho, b = coefficients.T
+    rho = np.clip(np.divide(b_rho, b, out=np.zeros_like(b), where=b > 0), -MAX_RHO, MAX_RHO)
+    b = np.maximum(b, 0)
+    wings = b[:, None] * (rho[:, None] * y + z)
+    # With an intercept, the least-squares A is the mean residual, unchanged for unclipped solutions.
+    a = (w[None, :] - wings).mean(axis=1)
+    residuals = a[:, None] + wings - w[None, :]
+    return np.column_stack([a, b, rho, m, sigma]), (residuals ** 2).sum(axis=1)
+
+
+def fit_svi(k: np.ndarray, w: np.ndarray) -> dict:
+    """
+    Fits the SVI parameters of one smile to its total variances.
+
+    A vectorized grid search over M and SIGMA, with the other parameters solved exactly for
+    each candidate (see fit_linear), gives the starting point of a bounded least-squares
+    refinement of all five parameters. The refinement is skipped when scipy is not installed.
+
+    Args:
+        k (np.array): Log-moneyness of the quotes.
+        w (np.array): Total variance of the quotes.
+
+    Returns:
+        dict: The SVI_PARAMETERS as floats, or None if the quotes cannot be fitted.
+    """
+    m_grid = np.linspace(k.min(), k.max(), SVI_GRID_SIZE)
+    sigma_grid = np.geomspace(MIN_SIGMA * 10, MAX_SIGMA / 2, SVI_GRID_SIZE)
+    m, sigma = (grid.ravel() for grid in np.meshgrid(m_grid, sigma_grid))
+    candidates, sse = fit_linear(k, w, m, sigma)
+    if not np.isfinite(sse).any():
+        return None
+    best = candidates[np.nanargmin(sse)]
+
+    if least_squares is not None:
+        span = k.max() - k.min()
+        lower = np.array([-np.inf, 0.0, -MAX_RHO, k.min() - span, MIN_SIGMA])
+        upper = np.array([np.inf, np.inf, MAX_RHO, k.max() + span, MAX_SIGMA])
+
+        def residuals(x):
+            return svi_total_variance(k, dict(zip(SVI_PARAMETERS, x))) - w
+
+        def jacobian(x):
+            _, b, rho, m, sigma = x
+            y = k - m
+            z = np.sqrt(y * y + sigma * sigma)
+            return np.column_stack([np.ones_like(k), rho * y + z, b * y, -b * (rho + y / z), b * sigma / z])
+
+        try:
+            result = least_squares(residuals, np.clip(best, lower, upper), jac=jacobian, bounds=(lower, upper),
+                                   max_nfev=SVI_MAX_EVALUATIONS)
+            if 2 * result.cost < np.nanmin(sse):
+                best = result.x
+        except ValueError:
+            pass
+    return dict(zip(SVI_PARAMETERS, (float(x) for x in best)))
+
+
+def fit_smiles(options: pd.DataFrame, futures: float) -> list:
+    """
+    Fits an SVI smile to the calls and to the puts of every expiration date of a snapshot.
+
+    Args:
+        options (pd.DataFrame): Enriched options with 'EXP_DATE', 'CALL_PUT', 'STRIKE', 'TTM'
+            and 'IV' columns.
+        futures (float): Futures price.
+
+    Returns:
+        list: One dict per fitted smile, sorted by expiry and call/put, with its 'EXP_DATE',
+        'CALL_PUT', 'TTM', the SVI_PARAMETERS, the 'RMSE' of the fit in IV points, the number
+        of 'POINTS' fitted and the fitted log-moneyness range 'K_MIN' to 'K_MAX'. Smiles with
+        fewer than SVI_MIN_POINTS quotes are skipped.
+    """
+    if options.empty:
+        return []
+    alive = options[(options['TTM'] > 0) & np.isfinite(options['IV']) & (options['IV'] > 0)]
+    smiles = []
+    for (exp_date, call_put), group in alive.groupby(['EXP_DATE', 'CALL_PUT'], sort=True):
+        if len(group) < SVI_MIN_POINTS:
+            continue
+        k = np.log(group['STRIKE'].to_numpy(dtype=float) / futures)
+        iv = group['IV'].to_numpy(dtype=float)
+        ttm = float(group['TTM'].max())
+        smile = fit_svi(k, (iv / 100) ** 2 * ttm)
+        if smile is None:
+            continue
+        error = svi_iv(k, smile, ttm) - iv
+        smile.update({
+            'EXP_DATE': exp_date,
+            'CALL_PUT': call_put,
+            'TTM': ttm,
+            'RMSE': float(np.sqrt(np.nanmean(error ** 2))) if np.isfinite(error).any() else None,
+            'POINTS': len(group),
+            'K_MIN': float(k.min()),
+            'K_MAX': float(k.max()),
+        })
+        smiles.append(smile)
+    return smiles
+
+
+def svi_surface(smiles: list, call_put: str, moneyness: np.ndarray, ttm_points: int) -> dict:
+    """
+    Evaluates the volatility surface of one option type from its fitted smiles. Between two
+    expiries the total variance is interpolated linearly in TTM at constant log-moneyness.
+
+    Args:
+        smiles (list): Smiles as returned by fit_smiles, with floats or Decimals.
+        call_put (str): 'CALL' or 'PUT'.
+        moneyness (np.array): Moneyness values of the grid, strike / futures for calls and
+            futures / strike for puts as in the 'MONEYNES' column.
+        ttm_points (int): Number of TTM values, spread between the shortest and longest maturity.
+
+    Returns:
+        dict: 'MONEYNES' and 'TTM' grid axes and the 'IV' matrix (one row per TTM), or None
+        if fewer than two expiries were fitted.
+    """
+    fitted = sorted((smile for smile in smiles if smile['CALL_PUT'] == call_put), key=lambda smile: float(smile['TTM']))
+    if len(fitted) < 2:
+        return None
+    moneyness = np.asarray(moneyness, dtype=float)
+    k = np.log(moneyness) if call_put == 'CALL' else -np.log(moneyness)
+    expiries = np.array([float(smile['TTM']) for smile in fitted])
+    variance = np.array([svi_total_variance(k, smile) for smile in fitted])
+    ttm = np.linspace(expiries[0], expiries[-1], ttm_points)
+    upper = np.clip(np.searchsorted(expiries, ttm, side='right'), 1, len(expiries) - 1)
+    weight = ((ttm - expiries[upper - 1]) / (expiries[upper] - expiries[upper - 1]))[:, None]
+    total = variance[upper - 1] * (1 - weight) + variance[upper] * weight
+    with np.errstate(invalid='ignore'):
+        iv = np.where(total > 0, np.sqrt(np.maximum(total, 0) / ttm[:, None]) * 100, np.nan)
+    return {'MONEYNES': moneyness, 'TTM': ttm, 'IV': iv}
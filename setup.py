@@ -0,0 +1,11 @@
+from setuptools import setup
+
+# The meff package is installed in the image of every deployable, which are built from the
+# repository root, and locally with 'pip install -e .' to run the tests. The dependencies of
+# each deployable are pinned in its own requirements.txt.
+setup(
+    name='meff',
+    version='1.0.0',
+    packages=['meff'],
+    python_requires='>=3.8',
+)
@@ -1,5 +1,65 @@
+from decimal import Decimal
+import pandas as pd
+import numpy as np
+import pytest
 import app
+from meff.svi import svi_iv
 
 def test_app_creation():
     assert hasattr(app, 'app'), "app object should be created in app.py"
-    assert app.app is not None, "app object should not be None"
\ No newline at end of file
+    assert app.app is not None, "app object should not be None"
+
+def test_snapshot_store_data():
+    options = pd.DataFrame({'EXP_DATE': ['2023-06-16', '2023-06-16', '2023-07-21'], 'CALL_PUT': ['CALL', 'PUT', 'CALL'],
+                            'STRIKE': [Decimal('9500'), Decimal('9500'), Decimal('9600')],
+                            'IV': [Decimal('20.1'), None, Decimal('19')]})
+    data = app.snapshot_store_data('2023-05-10', options)
+    assert data == {'date': '2023-05-10', 'rows': 3, 'columns': {
+        'EXP_DATE': {'values': ['2023-06-16', '2023-07-21'], 'codes': [0, 0, 1]},
+        'CALL_PUT': {'values': ['CALL', 'PUT'], 'codes': [0, 1, 0]},
+        'STRIKE': [9500.0, 9500.0, 9600.0],
+        'IV': [20.1, None, 19.0],
+    }}
+    assert app.snapshot_store_data('2023-05-11', pd.DataFrame())['rows'] == 0
+
+
+def test_svi_surface_data(monkeypatch):
+    smiles = pd.DataFrame({'EXP_DATE': ['2023-06-16', '2023-09-15'], 'CALL_PUT': ['CALL', 'CALL'], 'TTM': [0.1, 0.35],
+                           'A': [0.004, 0.014], 'B': [0.05, 0.05], 'RHO': [-0.5, -0.5], 'M': [0.0, 0.0],
+                           'SIGMA': [0.1, 0.1], 'K_MIN': [-0.1, -0.2], 'K_MAX': [0.1, 0.2], 'Futures': [9500.0, 9500.0]})
+    monkeypatch.setattr(app, 'get_smiles', lambda table, date: smiles)
+    moneyness, ttm, iv = app.svi_surface_data('2023-05-10', 'CALL', resolution=5)
+    assert iv.shape == (5, 5) and not pd.isna(iv).any()
+    assert moneyness[0] == pytest.approx(0.8187, abs=1e-4) and ttm[-1] == 0.35
+    # The first and last TTM rows are the fitted smiles themselves.
+    assert iv[0] == pytest.approx(svi_iv(np.log(moneyness), smiles.iloc[0], 0.1))
+    assert iv[-1] == pytest.approx(svi_iv(np.log(moneyness), smiles.iloc[1], 0.35))
+    assert app.svi_surface_data('2023-05-10', 'PUT') is None
+    data = app.snapshot_store_data('2023-05-10', pd.DataFrame(), smiles)
+    assert data['futures'] == 9500.0 and data['smiles'][0]['SIGMA'] == 0.1
+
+
+def test_interpolate_iv_fixed_reuses_the_triangulation(monkeypatch):
+    options = pd.DataFrame([{'CALL_PUT': call_put, 'MONEYNES': m, 'TTM': t, 'IV': 10.0 + 5.0 * m + 20.0 * t}
+                            for call_put in ('CALL', 'PUT') for m in (0.9, 1.0, 1.1) for t in (0.1, 0.3, 0.5)])
+    # One point outside the hull of the others, so that the bounding grid has corners outside the hull.
+    options = pd.concat([options, pd.DataFrame([{'CALL_PUT': 'CALL', 'MONEYNES': 1.3, 'TTM': 0.3, 'IV': 20.0}])],
+                        ignore_index=True)
+    snapshot = {'2023-05-10': options}
+    monkeypatch.setattr(app, 'get_item', lambda table, date: snapshot[date])
+    builds = []
+    interpolator = app.LinearNDInterpolator
+    monkeypatch.setattr(app, 'LinearNDInterpolator', lambda *args: builds.append(1) or interpolator(*args))
+    app.interpolator_cache.clear()
+
+    moneyness, ttm, iv = app.interpolate_iv_fixed('2023-05-10', 'CALL', resolution=9)
+    assert iv.shape == (9, 9) and moneyness[-1] == 1.3 and ttm[0] == 0.1
+    assert iv[4, :4] == pytest.approx(10.0 + 5.0 * moneyness[:4] + 20.0 * 0.3)
+    assert np.isnan(iv[0, -1]) and np.isnan(iv[-1, -1])
+    app.interpolate_iv_fixed('2023-05-10', 'CALL', resolution=20)
+    assert len(builds) == 1
+
+    app.interpolate_iv_fixed('2023-05-10', 'PUT')
+    snapshot['2023-05-10'] = options.copy()
+    app.interpolate_iv_fixed('2023-05-10', 'CALL')
+    assert len(builds) == 3
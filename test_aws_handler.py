@@ -0,0 +1,133 @@
+from decimal import Decimal
+import threading
+import time
+import aws_handler
+
+
+class FakeTable:
+    name = 'FakeTable'
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+
+    def get_item(self, Key):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'Item': {'Date': Key['Date'], 'Options': [{'STRIKE': 9500, 'IV': 20.1}]}}
+
+
+def test_get_item_is_cached():
+    aws_handler.item_cache.clear()
+    table = FakeTable()
+    first = aws_handler.get_item(table, '2023-05-10')
+    second = aws_handler.get_item(table, '2023-05-10')
+    assert first is second
+    assert table.calls == 1
+
+
+def test_raw_items_are_filtered_by_expiry():
+    aws_handler.item_cache.clear()
+
+    class RawTable(FakeTable):
+        def get_item(self, Key):
+            return {'Item': {'Date': Key['Date'], 'Options': [
+                {'DATA-TIPO': 'OCE20230616', 'STRIKE': '9.500,00', 'ANT': '121,00'},
+                {'DATA-TIPO': 'OPE20230721', 'STRIKE': '9.500,00', 'ANT': '98,20'}]}}
+
+    options = aws_handler.get_item(RawTable(), '2023-05-12', exp_date='2023-06-16')
+    assert options['DATA-TIPO'].tolist() == ['OCE20230616']
+
+
+def test_concurrent_misses_are_coalesced():
+    aws_handler.item_cache.clear()
+    table = FakeTable(delay=0.2)
+    threads = [threading.Thread(target=aws_handler.get_item, args=(table, '2023-05-11')) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert table.calls == 1
+
+
+def test_cache_is_bounded():
+    cache = aws_handler.LRUCache(max_bytes=1, size=aws_handler.frame_bytes)
+    table = FakeTable()
+    cache.get('key', lambda: aws_handler.fetch_item(table, '2023-05-12'))
+    cache.get('key', lambda: aws_handler.fetch_item(table, '2023-05-12'))
+    assert table.calls == 2
+    assert cache.current_bytes == 0
+
+
+class FakeIndexTable:
+    def __init__(self, dates, delay=0.0):
+        self.dates = dates
+        self.delay = delay
+        self.calls = 0
+
+    def get_item(self, Key):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {'Item': {'Date': Key['Date'], 'Dates': set(self.dates)}}
+
+
+def reset_dates_cache():
+    aws_handler.dates_cache['dates'] = set()
+    aws_handler.dates_cache['fetched_at'] = None
+
+
+def test_first_dates_load_is_shared():
+    reset_dates_cache()
+    table = FakeIndexTable({'2023-05-10'}, delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(aws_handler.get_unique_dates(table))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [{'2023-05-10'}] * 5
+    assert table.calls == 1
+
+
+def test_stale_dates_are_refreshed_in_background():
+    reset_dates_cache()
+    table = FakeIndexTable({'2023-05-10'}, delay=0.2)
+    aws_handler.get_unique_dates(table)
+    aws_handler.dates_cache['fetched_at'] -= aws_handler.DATES_CACHE_TTL
+    table.dates = {'2023-05-10', '2023-05-11'}
+    start = time.monotonic()
+    assert aws_handler.get_unique_dates(table) == {'2023-05-10'}
+    assert time.monotonic() - start < 0.1
+    time.sleep(0.4)
+    assert aws_handler.get_unique_dates(table) == {'2023-05-10', '2023-05-11'}
+    assert table.calls == 2
+
+
+def test_fetch_aggregates_flattens_expiries():
+    class FakeAggregatesTable:
+        def query(self, **kwargs):
+            return {'Items': [{'Product': 'FIEM_MiniIbex_35', 'Date': '2023-05-10', 'Expiries': [
+                {'EXP_DATE': '2023-06-16', 'TTM': Decimal('0.1'), 'ATM_IV': Decimal('18.7'), 'RR25': None,
+                 'BF25': None, 'SKEW': Decimal('-35.2')}]}]}
+
+    aggregates = aws_handler.fetch_aggregates(FakeAggregatesTable(), '2023-01-01', '2023-06-30')
+    assert list(aggregates.columns) == aws_handler.AGGREGATES_COLUMNS
+    assert aggregates['ATM_IV'].tolist() == [18.7]
+    assert aggregates['RR25'].isna().all()
+
+
+def test_fetch_smiles_reads_meta_attributes():
+    class FakeSmilesTable:
+        def get_item(self, **kwargs):
+            self.kwargs = kwargs
+            return {'Item': {'Futures': Decimal('9500.00'), 'Smiles': [
+                {'EXP_DATE': '2023-06-16', 'CALL_PUT': 'CALL', 'TTM': Decimal('0.1'), 'A': Decimal('0.004'),
+                 'B': Decimal('0.05'), 'RHO': Decimal('-0.5'), 'M': Decimal('0'), 'SIGMA': Decimal('0.1'),
+                 'RMSE': Decimal('0.2'), 'POINTS': 12, 'K_MIN': Decimal('-0.1'), 'K_MAX': Decimal('0.1')}]}}
+
+    table = FakeSmilesTable()
+    smiles = aws_handler.fetch_smiles(table, '2023-05-10')
+    assert table.kwargs['ExpressionAttributeNames'] == {'#s': 'Smiles'}
+    assert smiles[['A', 'SIGMA', 'Futures']].values.tolist() == [[0.004, 0.1, 9500.0]]
+    table.get_item = lambda **kwargs: {}
+    assert aws_handler.fetch_smiles(table, '2023-05-11').empty